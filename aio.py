@@ -0,0 +1,108 @@
+import os
+import asyncio
+import threading
+import httplib2
+from googleapiclient.errors import HttpError
+from spotipy import SpotifyException
+
+# --- Configuration ---
+ASYNC_IO = os.getenv("ASYNC_IO", "0") == "1" # Run outbound Spotify/YouTube I/O on one shared event loop
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "100")) # Open connections across all hosts
+ASYNC_HTTP_TIMEOUT = float(os.getenv("ASYNC_HTTP_TIMEOUT", "10"))
+SPOTIFY_API_BASE = "https://api.spotify.com/v1"
+YOUTUBE_SEARCH_URL = "https://www.googleapis.com/youtube/v3/search"
+SPOTIFY_RETRY_STATUSES = (429, 500, 502, 503, 504) # Same as the sync session's retry policy
+SPOTIFY_RETRIES = 3
+SPOTIFY_BACKOFF = 0.3
+
+_loop = None
+_loop_lock = threading.Lock()
+_client = None
+_transport = None # Replaced by offline benchmarks (an httpx.MockTransport)
+
+
+def available():
+    """True if httpx (the async HTTP client) is installed."""
+    try:
+        import httpx # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_loop():
+    """The process-wide event loop, started in a daemon thread on first use."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='async-io', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def submit(coro):
+    """Schedules a coroutine on the shared loop; returns a concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run(coro, timeout=None):
+    """Runs a coroutine on the shared loop and waits for its result from a sync thread."""
+    return submit(coro).result(timeout)
+
+
+def use_transport(transport):
+    """Routes all async HTTP calls through transport (e.g. fakes for benchmarks)."""
+    global _transport, _client
+    _transport = transport; _client = None
+
+
+def http_client():
+    """Shared httpx.AsyncClient (one connection pool for every user's calls). Use from the loop only."""
+    global _client
+    if _client is None:
+        import httpx
+        _client = httpx.AsyncClient(timeout=ASYNC_HTTP_TIMEOUT, transport=_transport,
+                                    limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=ASYNC_MAX_CONNECTIONS))
+    return _client
+
+
+class AsyncSpotify:
+    """
+    The few Spotify Web API calls of the playlist path, over the shared async client.
+    Responses have the same shape as spotipy's and errors raise SpotifyException,
+    so callers handle both clients the same way.
+    """
+
+    def __init__(self, access_token):
+        self.access_token = access_token
+
+    async def _get(self, path, **params):
+        params = {key: value for key, value in params.items() if value is not None}
+        for attempt in range(SPOTIFY_RETRIES + 1):
+            response = await http_client().get(f"{SPOTIFY_API_BASE}/{path}", params=params,
+                                               headers={'Authorization': f"Bearer {self.access_token}"})
+            if response.status_code < 400: return response.json()
+            if response.status_code not in SPOTIFY_RETRY_STATUSES or attempt == SPOTIFY_RETRIES: break
+            retry_after = response.headers.get('Retry-After')
+            await asyncio.sleep(float(retry_after) if retry_after and retry_after.isdigit() else SPOTIFY_BACKOFF * 2 ** attempt)
+        try: message = response.json().get('error', {}).get('message', response.text)
+        except ValueError: message = response.text
+        raise SpotifyException(response.status_code, -1, f"{response.url}:\n {message}", headers=dict(response.headers))
+
+    async def playlist(self, playlist_id, fields=None):
+        return await self._get(f"playlists/{playlist_id}", fields=fields)
+
+    async def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, additional_types=('track',)):
+        return await self._get(f"playlists/{playlist_id}/tracks", fields=fields, limit=limit, offset=offset,
+                               additional_types=','.join(additional_types))
+
+
+async def youtube_search(api_key, query, max_results=1):
+    """search().list over the shared async client. Error statuses raise HttpError like googleapiclient does."""
+    response = await http_client().get(YOUTUBE_SEARCH_URL, params={'q': query, 'part': 'id,snippet', 'maxResults': max_results,
+                                                                   'type': 'video', 'videoEmbeddable': 'true', 'key': api_key})
+    if response.status_code >= 400:
+        raise HttpError(httplib2.Response({'status': response.status_code}), response.content, uri=str(response.url))
+    return response.json()
@@ -1,17 +1,35 @@
 import os
 import time
 import pandas as pd # Import pandas
-from flask import Flask, redirect, request, session, render_template, url_for, jsonify
+from flask import Flask, Response, make_response, redirect, request, session, render_template, url_for, jsonify
 import spotipy
-from spotipy import Spotify
 from spotipy.oauth2 import SpotifyOAuth
-from googleapiclient.discovery import build
+from spotipy.cache_handler import MemoryCacheHandler
 from googleapiclient.errors import HttpError
 from dotenv import load_dotenv
 import datetime
 import random
 import math # Import math for ceiling function
 import numpy as np # Import numpy for NaN comparison
+from concurrent.futures import ThreadPoolExecutor
+from catalog import CatalogManager, CATALOG_FORMAT
+from video_cache import VideoCache, MISS
+from resolver import RateLimiter, resolve_tracks, resolve_tracks_async
+from jobs import JobRegistry, stream_events
+from playlist_cache import PlaylistTrackCache
+from quota import QuotaLedger, YOUTUBE_SEARCH_COST
+from clients import youtube_service, spotify_client, spotify_session
+from mood_inference import MoodPredictor
+from similarity import SIMILARITY_MAX_SEEDS
+import metrics
+from token_store import TokenManager, create_token_store
+import aio
+import asyncio
+from metrics import span, timed
+from warm_pool import WarmPool, WARM_POOL_ENABLED
+from mix_store import MixStore, new_mix_id
+from werkzeug.http import is_resource_modified
+from standardize import canonical_key, canonical_keys
 
 # --- CONFIGURATION ---
 load_dotenv()
@@ -29,103 +47,303 @@ YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 # Scopes needed for Spotify OAuth (Required for login flow and reading playlists)
 SCOPE = "playlist-read-private user-library-read"
 
+# Playlist paging: max page size allowed by the playlist items endpoint, and concurrent page fetches
+SPOTIFY_PAGE_SIZE = 100
+SPOTIFY_PAGE_WORKERS = int(os.getenv("SPOTIFY_PAGE_WORKERS", "4"))
+
+# /play_playlist resolves videos in windows as the player advances, not the whole playlist up front
+PLAYLIST_WINDOW = int(os.getenv("PLAYLIST_WINDOW", "10")) # Tracks resolved per window
+PLAYLIST_PREFETCH = int(os.getenv("PLAYLIST_PREFETCH", "3")) # The player fetches the next window this many tracks ahead
+PLAYLIST_WINDOW_MAX = 50 # Largest window a client may ask for
+
 # Available Moods for Mood Generation feature
 AVAILABLE_MOODS = ["Happy", "Sad", "Calm", "Energetic"]
 
+# How the catalog share of a mood playlist is picked: uniformly at random, or
+# the tracks whose audio features are closest to the user's playlist
+SELECTION_STRATEGIES = ["random", "similar"]
+
 # --- CSV Dataset Path ---
 EXTERNAL_CSV_PATH = 'standardized_song_list.csv' # Use the standardized CSV
+EXTERNAL_CATALOG_PATH = 'standardized_song_list.bin' # Compiled catalog (CATALOG_FORMAT=mmap)
+CATALOG_PATH = EXTERNAL_CATALOG_PATH if CATALOG_FORMAT == 'mmap' else EXTERNAL_CSV_PATH
+
+# Resident song catalog, built once per process and hot-reloaded when the file changes
+catalog_manager = CatalogManager(CATALOG_PATH, mode=CATALOG_FORMAT)
+if os.path.exists(CATALOG_PATH): catalog_manager.reload()
+
+# Persistent track_id -> YouTube video cache (SQLite file shared by all workers)
+video_cache = VideoCache()
+# Process-wide pacing for live YouTube searches (cache hits are not rate limited)
+youtube_rate_limiter = RateLimiter()
+# Cross-worker daily quota budget and 403 circuit breaker
+quota_ledger = QuotaLedger()
+# Processed playlist tracks, reused while the playlist's snapshot_id is unchanged
+playlist_cache = PlaylistTrackCache()
+# Mood model for user-playlist tracks that are not in the catalog
+mood_predictor = MoodPredictor()
+# Per-mood pools of catalog tracks with pre-resolved videos, refilled off-peak
+warm_pool = WarmPool()
+# Finished /generate results, served again by /mix/<id> without re-generating
+mix_store = MixStore()
+# Background /generate jobs; their events go to the mix store, so the SSE stream can be served by any worker
+generation_jobs = JobRegistry(sink=mix_store.append_event)
+MIX_CACHE_MAX_AGE = int(os.getenv("MIX_CACHE_MAX_AGE", "300")) # Seconds browsers may reuse a finished mix page before revalidating
+# Outbound Spotify/YouTube I/O of /generate and /play_playlist on one shared event loop (ASYNC_IO=1, needs httpx)
+ASYNC_ENABLED = aio.ASYNC_IO and aio.available()
+if aio.ASYNC_IO and not ASYNC_ENABLED: print("Warning: ASYNC_IO=1 but httpx is not installed. Using the sync I/O path.")
+
+
+# --- REQUEST TIMING ---
+@app.before_request
+def start_server_timing():
+    metrics.start_request_timing()
+
+@app.after_request
+def add_server_timing(response):
+    """Reports the spans that ran on the request thread in a Server-Timing header."""
+    server_timing = metrics.finish_request_timing()
+    if server_timing: response.headers['Server-Timing'] = server_timing
+    return response
 
 
 # --- HELPER FUNCTIONS ---
 # (get_spotify_oauth, get_token, search_youtube remain the same)
 def get_spotify_oauth():
-    """Creates a SpotifyOAuth instance."""
+    """Creates a SpotifyOAuth instance. Tokens live in token_manager, so spotipy's own cache stays in memory."""
     return SpotifyOAuth(
         client_id=SPOTIPY_CLIENT_ID,
         client_secret=SPOTIPY_CLIENT_SECRET,
         redirect_uri=SPOTIPY_REDIRECT_URI,
         scope=SCOPE,
-        cache_path=".spotify_cache-" + session.get('uuid', 'default') # Session-specific cache
+        cache_handler=MemoryCacheHandler(), # No per-visitor cache files
+        requests_session=spotify_session() # Shared keep-alive pool
     )
 
-def get_token():
-    """Checks for and refreshes the Spotify token."""
-    token_info = session.get('token_info', None)
-    if not token_info: return None
-    now = int(time.time())
-    is_expired = token_info.get('expires_at', 0) - now < 60
-    if is_expired:
-        try:
-            sp_oauth = get_spotify_oauth()
-            refresh_token = token_info.get('refresh_token')
-            if refresh_token:
-                 token_info = sp_oauth.refresh_access_token(refresh_token)
-                 session['token_info'] = token_info
-                 print("Spotify token refreshed.")
-            else:
-                 session.pop('token_info', None); session.pop('uuid', None)
-                 print("No refresh token found. User needs to re-authenticate.")
-                 return None
-        except Exception as e:
-            print(f"Error refreshing token: {e}. User needs to re-authenticate.")
-            session.pop('token_info', None); session.pop('uuid', None)
-            return None
-    return token_info
+def refresh_spotify_token(refresh_token):
+    metrics.spotify_api_calls.inc(endpoint='token_refresh')
+    return get_spotify_oauth().refresh_access_token(refresh_token)
+
+# Server-side Spotify tokens keyed by session uuid; the cookie only carries the uuid
+token_manager = TokenManager(create_token_store(), refresh_spotify_token)
 
-def search_youtube(query, max_results=1):
-    """Searches YouTube and returns the top video ID and title."""
+def get_token():
+    """Returns the session's Spotify token, refreshing it (once per user, however many requests race) if expired."""
+    return token_manager.get(session.get('uuid'))
+
+@timed('youtube.search')
+def search_youtube(query, max_results=1, raise_errors=False):
+    """
+    Searches YouTube and returns the top video ID and title.
+    With raise_errors=True unexpected errors are re-raised, so None always means "not found".
+    """
     if not YOUTUBE_API_KEY or YOUTUBE_API_KEY == "YOUR_API_KEY_HERE":
         print("❌ ERROR: YouTube API key missing or invalid.")
         return None
     try:
-        youtube = build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
-        search_response = youtube.search().list(
-            q=query,
-            part='id,snippet',
-            maxResults=max_results,
-            type='video',
-            videoEmbeddable='true' # Try to find videos that can be embedded
-        ).execute()
-        results = search_response.get('items', [])
-        if results:
-            return {'id': results[0]['id']['videoId'], 'title': results[0]['snippet']['title']}
-        else:
-            return None
+        with youtube_service(YOUTUBE_API_KEY) as youtube: # Pooled service built once from the bundled discovery document
+            metrics.youtube_api_calls.inc()
+            search_response = youtube.search().list(
+                q=query,
+                part='id,snippet',
+                maxResults=max_results,
+                type='video',
+                videoEmbeddable='true' # Try to find videos that can be embedded
+            ).execute()
+        return video_from_search(search_response)
     except HttpError as e:
         print(f"DEBUG: YouTube API HttpError: Status {e.resp.status}, Reason: {e.reason}")
         raise e
     except Exception as e:
         print(f"❌ Unexpected YouTube search error: {e}")
+        if raise_errors: raise
         return None
 
-# (get_playlist_tracks remains the same)
+async def search_youtube_async(query, max_results=1):
+    """Async twin of search_youtube(raise_errors=True) over the shared async HTTP client."""
+    with span('youtube.search'):
+        metrics.youtube_api_calls.inc()
+        search_response = await aio.youtube_search(YOUTUBE_API_KEY, query, max_results)
+    return video_from_search(search_response)
+
+def video_from_search(search_response):
+    """Top video of a search().list response as {'id', 'title'}, or None."""
+    results = search_response.get('items', [])
+    if results:
+        return {'id': results[0]['id']['videoId'], 'title': results[0]['snippet']['title']}
+    return None
+
+def song_key(track):
+    """The track's canonical song key (catalog and playlist tracks carry it; computed for older cached ones)."""
+    return track.get('canonical_key') or canonical_key(track.get('artist'), track.get('name'))
+
+def video_cache_key(track):
+    """Videos are cached per song, so every track id of the same song shares one search."""
+    return f"song:{song_key(track)}"
+
+def youtube_query(track):
+    """Builds the YouTube search query used for a track."""
+    return f"{track.get('artist', 'N/A')} - {track.get('name', 'N/A')} official audio video lyrics"
+
+def resolve_track_video(track):
+    """
+    Resolves a track to a YouTube video, checking the persistent cache before the API.
+    Returns (video_info or None, from_cache); from_cache is None when the quota ledger refused
+    the search and no call was made. HttpError (e.g. quota 403) propagates uncached
+    and a 403 also trips the shared quota breaker.
+    """
+    known = lookup_track_video(track)
+    if known: return known
+    if not YOUTUBE_API_KEY or YOUTUBE_API_KEY == "YOUR_API_KEY_HERE": return search_youtube(youtube_query(track)), False
+    if not spend_search_quota(): return None, None # Refused: nothing searched, nothing spent
+    youtube_rate_limiter.wait()
+    try:
+        video_info = search_youtube(youtube_query(track), raise_errors=True)
+    except HttpError as e:
+        note_youtube_error(e)
+        raise
+    video_cache.put(video_cache_key(track), video_info)
+    return video_info, False
+
+async def resolve_track_video_async(track):
+    """
+    Async twin of resolve_track_video: same cache, quota and breaker handling, the search awaits on the loop.
+    The video cache and quota ledger are SQLite (the ledger may wait on its busy timeout), so they run in threads.
+    """
+    known = await asyncio.to_thread(lookup_track_video, track)
+    if known: return known
+    if not YOUTUBE_API_KEY or YOUTUBE_API_KEY == "YOUR_API_KEY_HERE":
+        print("❌ ERROR: YouTube API key missing or invalid.")
+        return None, False
+    if not await asyncio.to_thread(spend_search_quota): return None, None # Refused: nothing searched, nothing spent
+    await youtube_rate_limiter.wait_async()
+    try:
+        video_info = await search_youtube_async(youtube_query(track))
+    except HttpError as e:
+        await asyncio.to_thread(note_youtube_error, e)
+        raise
+    await asyncio.to_thread(video_cache.put, video_cache_key(track), video_info)
+    return video_info, False
+
+def lookup_track_video(track):
+    """(video_info, True) for a warm pool draw or a cache entry (None video = known miss); None if the API must be asked."""
+    if track.get('video'): # Drawn from the warm pool, already resolved
+        metrics.warm_pool_hits.inc()
+        return track['video'], True
+    cached = video_cache.get(video_cache_key(track))
+    if cached is MISS: cached = video_cache.get(track.get('id')) # Entries cached per track id before songs were keyed
+    if cached is not MISS:
+        metrics.youtube_cache_hits.inc()
+        return cached, True
+    return None
+
+def spend_search_quota():
+    """Charges one search to the shared quota. False while the breaker is open or the daily budget is spent."""
+    # Serve cached results only then, don't make a call that will fail
+    if quota_ledger.try_spend(YOUTUBE_SEARCH_COST): return True
+    metrics.youtube_quota_errors.inc(kind='refused')
+    return False
+
+def note_youtube_error(e):
+    """A 403 means the quota is gone: count it and trip the shared breaker."""
+    if e.resp.status == 403:
+        metrics.youtube_quota_errors.inc(kind='forbidden')
+        quota_ledger.trip(f"YouTube API 403: {e.reason}")
+
+def is_quota_error(e):
+    """True for the YouTube 403 that signals an exhausted quota."""
+    return isinstance(e, HttpError) and e.resp.status == 403
+
+def resolve_youtube_videos(tracks, target=None, on_hit=None):
+    """Resolves tracks to YouTube videos concurrently, keeping track order. Shared by all routes."""
+    result = resolve_tracks(tracks, resolve_track_video, target=target, stop_on=is_quota_error, on_hit=on_hit)
+    metrics.tracks_resolved.inc(len(result.hits))
+    return result
+
+async def resolve_youtube_videos_async(tracks, target=None, on_hit=None):
+    """Async twin of resolve_youtube_videos."""
+    result = await resolve_tracks_async(tracks, resolve_track_video_async, target=target, stop_on=is_quota_error, on_hit=on_hit)
+    metrics.tracks_resolved.inc(len(result.hits))
+    return result
+
+# Refill the warm pools in the background (one worker at a time holds the refill lease)
+if WARM_POOL_ENABLED and YOUTUBE_API_KEY and YOUTUBE_API_KEY != "YOUR_API_KEY_HERE":
+    warm_pool.start(catalog_manager.get, AVAILABLE_MOODS, resolve_track_video, quota_ledger)
+
+PLAYLIST_ITEM_FIELDS = 'items(track(id,name,artists(name),album(release_date,release_date_precision),is_local)),next,offset,total' # Added is_local
+
+def fetch_playlist_page(sp, playlist_id, offset, limit=SPOTIFY_PAGE_SIZE):
+    """Fetches one page of playlist items."""
+    metrics.spotify_api_calls.inc(endpoint='playlist_items')
+    return sp.playlist_items(playlist_id, fields=PLAYLIST_ITEM_FIELDS, limit=limit, offset=offset, additional_types=['track']) # Ensure we only get tracks
+
+@timed('spotify.playlist_tracks')
 def get_playlist_tracks(sp, playlist_id):
-    """Fetches all tracks from a Spotify playlist, handling pagination."""
+    """
+    Fetches all tracks from a Spotify playlist. The first page tells us the
+    total; the remaining pages are fetched concurrently and kept in order.
+    """
     tracks_data = []
-    offset = 0
-    limit = 50 # Max limit per request
-    total_tracks = None # Store total number later
+    limit = SPOTIFY_PAGE_SIZE
 
     print(f"Fetching tracks for Spotify playlist ID: {playlist_id}")
-    while True:
-        try:
-            fields = 'items(track(id,name,artists(name),album(release_date,release_date_precision),is_local)),next,offset,total' # Added is_local
-            results = sp.playlist_items(playlist_id, fields=fields, limit=limit, offset=offset, additional_types=['track']) # Ensure we only get tracks
-
-            if results is None: break
-            if total_tracks is None: total_tracks = results.get('total', 0)
-            items = results.get('items', [])
-            if not items: break
-
-            tracks_data.extend(items)
-            print(f"Fetched {len(tracks_data)}/{total_tracks if total_tracks is not None else '?'} tracks...")
-
-            if results.get('next'): offset += limit
-            else: print("Reached end of playlist."); break
+    try:
+        results = fetch_playlist_page(sp, playlist_id, 0, limit)
+    except spotipy.SpotifyException as e: print(f"Spotify API error fetching playlist items (offset 0): {e}"); results = None
+    except Exception as e: print(f"Unexpected error fetching playlist items: {e}"); results = None
+
+    if results and results.get('items'):
+        total_tracks = results.get('total', 0) or 0
+        tracks_data.extend(results['items'])
+        remaining_offsets = list(range(limit, total_tracks, limit)) if results.get('next') else []
+        if remaining_offsets:
+            print(f"Fetched {len(tracks_data)}/{total_tracks} tracks, fetching {len(remaining_offsets)} more pages concurrently...")
+            with ThreadPoolExecutor(max_workers=SPOTIFY_PAGE_WORKERS, thread_name_prefix='sp-page') as pool:
+                pages = pool.map(lambda offset: _fetch_page_or_error(sp, playlist_id, offset, limit), remaining_offsets)
+                for offset, page in zip(remaining_offsets, pages):
+                    # Like the sequential loop, stop at the first failed or empty page so order is never broken
+                    if isinstance(page, Exception): print(f"Spotify API error fetching playlist items (offset {offset}): {page}"); break
+                    items = page.get('items', []) if page else []
+                    if not items: break
+                    tracks_data.extend(items)
+        print(f"Fetched {len(tracks_data)}/{total_tracks} tracks. Reached end of playlist.")
+    return process_playlist_items(tracks_data)
+
+async def get_playlist_tracks_async(asp, playlist_id):
+    """Async twin of get_playlist_tracks; the remaining pages are fetched concurrently on the shared loop."""
+    tracks_data = []
+    limit = SPOTIFY_PAGE_SIZE
+    pages_in_flight = asyncio.Semaphore(SPOTIFY_PAGE_WORKERS)
 
-        except spotipy.SpotifyException as e: print(f"Spotify API error fetching playlist items (offset {offset}): {e}"); break
-        except Exception as e: print(f"Unexpected error fetching playlist items: {e}"); break
+    async def fetch_page(offset):
+        async with pages_in_flight:
+            metrics.spotify_api_calls.inc(endpoint='playlist_items')
+            return await asp.playlist_items(playlist_id, fields=PLAYLIST_ITEM_FIELDS, limit=limit, offset=offset)
 
+    print(f"Fetching tracks for Spotify playlist ID: {playlist_id}")
+    with span('spotify.playlist_tracks'):
+        try:
+            results = await fetch_page(0)
+        except spotipy.SpotifyException as e: print(f"Spotify API error fetching playlist items (offset 0): {e}"); results = None
+        except Exception as e: print(f"Unexpected error fetching playlist items: {e}"); results = None
+
+        if results and results.get('items'):
+            total_tracks = results.get('total', 0) or 0
+            tracks_data.extend(results['items'])
+            remaining_offsets = list(range(limit, total_tracks, limit)) if results.get('next') else []
+            if remaining_offsets:
+                print(f"Fetched {len(tracks_data)}/{total_tracks} tracks, fetching {len(remaining_offsets)} more pages concurrently...")
+                pages = await asyncio.gather(*(fetch_page(offset) for offset in remaining_offsets), return_exceptions=True)
+                for offset, page in zip(remaining_offsets, pages):
+                    if isinstance(page, Exception): print(f"Spotify API error fetching playlist items (offset {offset}): {page}"); break
+                    items = page.get('items', []) if page else []
+                    if not items: break
+                    tracks_data.extend(items)
+            print(f"Fetched {len(tracks_data)}/{total_tracks} tracks. Reached end of playlist.")
+        return process_playlist_items(tracks_data)
+
+def process_playlist_items(tracks_data):
+    """Playlist items -> track dicts (id, name, artist, year), skipping local, invalid and repeated tracks."""
     print(f"Finished fetching. Total items received: {len(tracks_data)}")
     processed_tracks = []
     processed_ids = set()
@@ -162,39 +380,142 @@ def get_playlist_tracks(sp, playlist_id):
             'source': 'spotify_playlist',
             'mood': None
         })
+    song_keys = canonical_keys([t['artist'] for t in processed_tracks], [t['name'] for t in processed_tracks])
+    for track, key in zip(processed_tracks, song_keys): track['canonical_key'] = key
     print(f"Processed {len(processed_tracks)} valid, unique, non-local tracks from Spotify playlist.")
     return processed_tracks
 
-# (load_csv_tracks remains the same)
-def load_csv_tracks(csv_path):
-    """Loads tracks from the standardized CSV file."""
-    if not os.path.exists(csv_path):
-        print(f"❌ ERROR: Standardized CSV file not found at '{csv_path}'.")
-        return None
+def get_playlist_with_tracks(sp, playlist_id):
+    """
+    Returns (playlist name or None, processed tracks). A cheap snapshot_id check
+    decides whether the cached track list can be reused or must be refetched.
+    """
+    name = None; snapshot_id = None
     try:
-        df = pd.read_csv(csv_path, low_memory=False)
-        print(f"Loaded {len(df)} tracks from standardized CSV '{csv_path}'.")
-        expected_cols = ['track_id', 'track_name', 'artist_name', 'Mood', 'year']
-        if not all(col in df.columns for col in expected_cols):
-             missing = [col for col in expected_cols if col not in df.columns]
-             print(f"❌ ERROR: Standardized CSV missing expected columns: {', '.join(missing)}")
-             return None
-        df['year'] = pd.to_numeric(df['year'], errors='coerce')
-        df['Mood'] = df['Mood'].astype(str).str.strip().replace(['nan', 'NaN','None', ''], pd.NA, regex=False)
-        df['track_id'] = df['track_id'].astype(str).str.strip().replace(['nan', 'NaN', 'None', ''], pd.NA, regex=False)
-        df['track_name'] = df['track_name'].astype(str).str.strip().replace(['nan', 'NaN', 'None', ''], pd.NA, regex=False)
-        df['artist_name'] = df['artist_name'].astype(str).str.strip().replace(['nan', 'NaN','None', ''], pd.NA, regex=False)
-        initial_rows = len(df)
-        df.dropna(subset=['Mood', 'track_id', 'track_name', 'artist_name'], inplace=True)
-        print(f"Dropped {initial_rows - len(df)} rows due to missing critical data.")
-        print(f"DataFrame shape after cleaning and dropping NA: {df.shape}")
-        if df.empty: print("❌ Warning: DataFrame empty after cleaning."); return df
-        print(f"Found unique mood labels in standardized CSV: {list(df['Mood'].unique())}")
-        return df
-    except Exception as e:
-        print(f"❌ ERROR: Failed to load or process standardized CSV file '{csv_path}'. {e}")
-        import traceback; traceback.print_exc(); return None
-
+        metrics.spotify_api_calls.inc(endpoint='playlist')
+        playlist_details = sp.playlist(playlist_id, fields='snapshot_id,name')
+        name = playlist_details.get('name'); snapshot_id = playlist_details.get('snapshot_id')
+    except spotipy.SpotifyException as e:
+        print(f"Warning: Could not fetch snapshot for playlist {playlist_id}. Error: {e}")
+
+    cached_tracks = playlist_cache.get(playlist_id, snapshot_id)
+    if cached_tracks is not None:
+        print(f"Playlist {playlist_id} unchanged (snapshot {snapshot_id}), reusing {len(cached_tracks)} cached tracks.")
+        return name, cached_tracks
+    tracks = get_playlist_tracks(sp, playlist_id)
+    if tracks: playlist_cache.put(playlist_id, snapshot_id, tracks)
+    return name, tracks
+
+async def get_playlist_with_tracks_async(asp, playlist_id):
+    """Async twin of get_playlist_with_tracks."""
+    name = None; snapshot_id = None
+    try:
+        metrics.spotify_api_calls.inc(endpoint='playlist')
+        playlist_details = await asp.playlist(playlist_id, fields='snapshot_id,name')
+        name = playlist_details.get('name'); snapshot_id = playlist_details.get('snapshot_id')
+    except spotipy.SpotifyException as e:
+        print(f"Warning: Could not fetch snapshot for playlist {playlist_id}. Error: {e}")
+
+    cached_tracks = playlist_cache.get(playlist_id, snapshot_id)
+    if cached_tracks is not None:
+        print(f"Playlist {playlist_id} unchanged (snapshot {snapshot_id}), reusing {len(cached_tracks)} cached tracks.")
+        return name, cached_tracks
+    tracks = await get_playlist_tracks_async(asp, playlist_id)
+    if tracks: playlist_cache.put(playlist_id, snapshot_id, tracks)
+    return name, tracks
+
+def select_catalog_share(mood_label, candidate_rows, k, catalog):
+    """
+    Picks k random catalog tracks (distinct songs) among candidate_rows, taking up to
+    the warm pool's max share from the mood's pool (videos already resolved) and
+    sampling the rest.
+    """
+    selected = warm_pool.draw(mood_label, k, catalog, candidate_rows)
+    if len(selected) < k:
+        remaining_rows = np.setdiff1d(candidate_rows, catalog.rows_for_songs([t['canonical_key'] for t in selected]), assume_unique=True)
+        selected += catalog.sample_rows(remaining_rows, k - len(selected))
+    print(f"{sum(1 for t in selected if t.get('video'))} of {len(selected)} catalog tracks drawn from the warm pool.")
+    return selected
+
+def select_playlist_share(sp, playlist_tracks, mood_label, k, catalog=None):
+    """
+    Picks k user-playlist tracks, preferring those whose (catalog or predicted) mood
+    matches mood_label and topping up with the others if there are too few.
+    """
+    if not isinstance(playlist_tracks, list) or k <= 0: return []
+    moods = mood_predictor.predict_moods(sp, playlist_tracks, catalog)
+    mood_key = (mood_label or '').strip().lower()
+    matching = [t for t in playlist_tracks if (moods.get(t['id']) or '').lower() == mood_key]
+    selected = random.sample(matching, min(len(matching), k))
+    print(f"{len(matching)} of {len(playlist_tracks)} playlist tracks match mood '{mood_label}'.")
+    if len(selected) < k:
+        chosen_ids = {t['id'] for t in selected}
+        others = [t for t in playlist_tracks if t['id'] not in chosen_ids]
+        selected += random.sample(others, min(len(others), k - len(selected)))
+    return [dict(t, mood=moods.get(t['id'])) for t in selected] # Copies: cached playlist tracks stay untouched
+
+def select_similar_catalog_tracks(sp, playlist_tracks, candidate_rows, k, catalog):
+    """
+    Picks the k catalog tracks among candidate_rows whose audio features are closest
+    to the user's playlist tracks. Returns None if the catalog has no audio features
+    or no seed track has any, so the caller can fall back to random sampling.
+    """
+    index = catalog.similarity()
+    if index is None or not playlist_tracks or k <= 0: return None
+    seed_tracks = playlist_tracks if len(playlist_tracks) <= SIMILARITY_MAX_SEEDS else random.sample(playlist_tracks, SIMILARITY_MAX_SEEDS)
+    seed_ids = list(dict.fromkeys(t['id'] for t in seed_tracks if t.get('id')))
+
+    # Seeds already in the catalog use its features; the rest are fetched from Spotify in batches
+    rows = catalog.rows_for_ids(seed_ids)
+    seed_rows = rows[rows >= 0]
+    seeds = [index.matrix[seed_rows]]
+    missing_ids = [track_id for track_id, row in zip(seed_ids, rows) if row < 0]
+    if missing_ids:
+        features, _ = mood_predictor.fetch_audio_features(sp, missing_ids)
+        if not features.empty: seeds.append(index.scale_features(features))
+    seeds = index.usable_seeds(np.concatenate(seeds)) # Seeds missing a feature would match everything
+    if len(seeds) == 0: return None
+
+    # Other track ids of the seed songs would be the nearest matches, so they are left out too
+    exclude_rows = np.union1d(seed_rows, catalog.rows_for_songs({song_key(t) for t in seed_tracks}))
+    start = time.perf_counter()
+    nearest = catalog.distinct_rows(index.top_k(seeds, candidate_rows, 2 * k, exclude_rows=exclude_rows))[:k]
+    print(f"Similarity search: {len(nearest)} nearest of {len(candidate_rows)} candidate tracks to {len(seeds)} seeds in {(time.perf_counter() - start) * 1000:.1f} ms.")
+    return [catalog.track_at(row) for row in nearest]
+
+def parse_track_filters(form):
+    """
+    Reads the optional year range, genre and excluded-artist fields of the
+    /generate form into keyword arguments for TrackCatalog.filter_rows.
+    Raises ValueError with a user-facing message on invalid input.
+    """
+    filters = {}
+    for field in ('year_min', 'year_max'):
+        value = (form.get(field) or '').strip()
+        if not value: continue
+        try: filters[field] = int(value)
+        except ValueError: raise ValueError(f"Invalid {field.replace('_', ' ')} provided.")
+    if 'year_min' in filters and 'year_max' in filters and filters['year_min'] > filters['year_max']:
+        raise ValueError("The start year must not be after the end year.")
+    genres = [g for g in form.getlist('genre') if g.strip()]
+    if genres: filters['genres'] = genres
+    exclude_artists = [a.strip() for a in (form.get('exclude_artists') or '').split(',') if a.strip()]
+    if exclude_artists: filters['exclude_artists'] = exclude_artists
+    return filters
+
+def track_passes_filters(track, filters):
+    """Applies the year range and artist exclusions to a user-playlist track (genre is unknown for those)."""
+    if not filters: return True
+    year = track.get('year')
+    if 'year_min' in filters and (year is None or year < filters['year_min']): return False
+    if 'year_max' in filters and (year is None or year > filters['year_max']): return False
+    excluded = {a.lower() for a in filters.get('exclude_artists', [])}
+    return (track.get('artist') or '').strip().lower() not in excluded
+
+def _fetch_page_or_error(sp, playlist_id, offset, limit):
+    """Page fetch for the worker pool: returns the exception instead of raising it."""
+    try: return fetch_playlist_page(sp, playlist_id, offset, limit)
+    except Exception as e: return e
 
 # --- FLASK ROUTES ---
 # (/, /login, /logout, /callback remain the same)
@@ -209,7 +530,7 @@ def index():
 @app.route('/login')
 def login():
     if 'uuid' not in session: session['uuid'] = os.urandom(16).hex()
-    session.pop('token_info', None)
+    token_manager.forget(session['uuid'])
     sp_oauth = get_spotify_oauth()
     auth_url = sp_oauth.get_authorize_url()
     print(f"Redirecting to Spotify auth URL: {auth_url}")
@@ -218,11 +539,8 @@ def login():
 @app.route('/logout')
 def logout():
     uuid = session.get('uuid', None)
-    cache_file = f".spotify_cache-{uuid}" if uuid else None
     session.clear()
-    if cache_file and os.path.exists(cache_file):
-        try: os.remove(cache_file); print(f"Removed Spotipy cache file: {cache_file}")
-        except OSError as e: print(f"Warning: Could not remove cache file {cache_file}. Error: {e}")
+    if uuid: token_manager.forget(uuid)
     print("User logged out.")
     return redirect(url_for('index'))
 
@@ -235,7 +553,8 @@ def callback():
     if not code: print("No authorization code received in callback."); return "Authentication failed: No code.", 400
     try:
         token_info = sp_oauth.get_access_token(code, check_cache=False)
-        session['token_info'] = token_info
+        session['uuid'] = os.urandom(16).hex() # Fresh key for the logged-in session
+        token_manager.save(session['uuid'], token_info)
         print("Successfully obtained and stored Spotify token.")
         return redirect(url_for('select_options')) # Redirect to mood selection after login
     except Exception as e: print(f"Error getting access token from Spotify: {e}"); return "Failed to get access token.", 500
@@ -247,7 +566,7 @@ def select_options():
     if not token_info: return redirect(url_for('login'))
     username = "User"; user_playlists = []
     try:
-        sp = Spotify(auth=token_info['access_token'])
+        sp = spotify_client(token_info['access_token'])
         user_profile = sp.current_user()
         username = user_profile.get('display_name', 'User')
         user_playlists_data = sp.current_user_playlists(limit=50)
@@ -258,9 +577,12 @@ def select_options():
         if e.http_status in [401, 403]: return redirect(url_for('logout'))
         return "Error communicating with Spotify.", 500
     except Exception as e: print(f"Warning: Could not fetch Spotify user data. Error: {e}")
+    catalog = catalog_manager.get() # Genre choices come from the catalog's filter index
     # Render select.html for mood playlist generation
     return render_template('select.html',
                            moods=AVAILABLE_MOODS,
+                           strategies=SELECTION_STRATEGIES,
+                           genres=catalog.genres if catalog else [],
                            username=username,
                            playlists=user_playlists) # Pass playlists for the 20% mix
 
@@ -268,7 +590,7 @@ def select_options():
 @app.route('/generate', methods=['POST'])
 def generate_playlist():
     token_info = get_token()
-    if not token_info: return render_template('mood_player.html', video_ids_json='[]', track_names_json='[]', error="Your session has expired. Please log in again."), 401
+    if not token_info: return render_template('mood_player.html', video_ids=[], track_names=[], error="Your session has expired. Please log in again."), 401
 
     selected_playlist_id = request.form.get('playlist_id')
     selected_mood_label = request.form.get('mood')
@@ -278,97 +600,215 @@ def generate_playlist():
     except (TypeError, ValueError): return "Invalid number of songs provided.", 400
 
     if not selected_mood_label or not selected_playlist_id: return "Missing Mood or Playlist selection.", 400
+    strategy = request.form.get('strategy', 'random')
+    if strategy not in SELECTION_STRATEGIES: return "Invalid selection strategy.", 400
+    try: filters = parse_track_filters(request.form)
+    except ValueError as e: return str(e), 400
+
+    print(f"Generating MOOD playlist for Mood: {selected_mood_label}, Target Songs: {num_songs}, From Playlist: {selected_playlist_id}, Strategy: {strategy}, Filters: {filters}")
+
+    # Selection and YouTube resolution run in the background under the new mix's id; /mix/<id> streams it meanwhile
+    with span('generate.submit'):
+        mix_id = new_mix_id()
+        mix_store.reserve(mix_id, owner=session.get('uuid'), mood=selected_mood_label)
+        job_args = (token_info['access_token'], selected_mood_label, selected_playlist_id, num_songs, strategy, filters)
+        if ASYNC_ENABLED: generation_jobs.submit_async(run_mix_job_async, *job_args, owner=session.get('uuid'), job_id=mix_id)
+        else: generation_jobs.submit(run_mix_job, *job_args, owner=session.get('uuid'), job_id=mix_id)
+    return redirect(url_for('mix_player', mix_id=mix_id), code=303)
+
+
+def run_mix_job(job, *args):
+    """Runs a /generate job and stores its outcome as the mix with the job's id."""
+    try: run_generation_job(job, *args)
+    finally: save_mix(job)
+
+
+async def run_mix_job_async(job, *args):
+    try: await run_generation_job_async(job, *args)
+    finally: save_mix(job)
 
-    print(f"Generating MOOD playlist for Mood: {selected_mood_label}, Target Songs: {num_songs}, From Playlist: {selected_playlist_id}")
 
+def save_mix(job):
+    final_event, data = job.events[-1] if job.done else ('error', {'message': "Unexpected server error."})
+    if final_event == 'done':
+        mix_store.complete(job.id, [track for event, track in job.events if event == 'track'])
+    else:
+        mix_store.fail(job.id, data.get('message') or "Could not generate the playlist.")
+
+
+@timed('generate.job')
+def run_generation_job(job, access_token, selected_mood_label, selected_playlist_id, num_songs, strategy='random', filters=None):
+    """Background half of /generate: picks the tracks and publishes each resolved video to the job."""
     try:
-        # Load CSV
-        csv_df = load_csv_tracks(EXTERNAL_CSV_PATH)
-        if csv_df is None or csv_df.empty: return render_template('mood_player.html', video_ids_json='[]', track_names_json='[]', error=f"Could not load valid track data.")
+        # Resident catalog (reloaded only when the CSV file changes)
+        with span('generate.catalog'):
+            catalog = catalog_manager.get()
+        if catalog is None or len(catalog) == 0: job.finish('error', {'message': "Could not load valid track data."}); return
 
-        # Filter CSV by mood
-        mood_filter = csv_df['Mood'].str.lower() == selected_mood_label.strip().lower()
-        filtered_csv_df = csv_df.loc[mood_filter].copy()
-        print(f"Found {len(filtered_csv_df)} tracks in CSV matching mood criteria.")
+        # Mood, year, genre and artist filters are answered from precomputed indexes, no per-request scan
+        filters = filters or {}
+        with span('generate.filter'):
+            candidate_rows = catalog.filter_rows(selected_mood_label, **filters)
+        print(f"Found {len(candidate_rows)} tracks in CSV matching mood criteria.")
 
         # Fetch User Playlist Tracks
-        sp = Spotify(auth=token_info['access_token'])
-        playlist_tracks_list = get_playlist_tracks(sp, selected_playlist_id)
+        sp = spotify_client(access_token)
+        with span('generate.playlist'):
+            _, playlist_tracks_list = get_playlist_with_tracks(sp, selected_playlist_id)
         print(f"Found {len(playlist_tracks_list)} total tracks in the selected Spotify playlist.")
 
-        # Convert filtered DataFrame rows to list of dicts
-        filtered_csv_tracks_list = []
-        for _, row in filtered_csv_df.iterrows():
-            filtered_csv_tracks_list.append({ 'id': row['track_id'], 'name': row['track_name'], 'artist': row['artist_name'], 'mood': row['Mood'], 'source': 'csv_dataset' })
-
-        # Combine Tracks with Ratio
-        num_csv_target = math.ceil(num_songs * 0.8)
-        num_playlist_target = num_songs - num_csv_target
-        selected_csv = random.sample(filtered_csv_tracks_list, min(len(filtered_csv_tracks_list), num_csv_target))
-        selected_playlist = random.sample(playlist_tracks_list, min(len(playlist_tracks_list), num_playlist_target)) if isinstance(playlist_tracks_list, list) else []
-        combined_selection = selected_csv + selected_playlist
-
-        # Deduplicate and Shuffle
-        final_selection_dict = {}
-        for track in combined_selection:
-            track_id = track.get('id')
-            if track_id:
-                if track_id not in final_selection_dict or track.get('source') == 'csv_dataset': final_selection_dict[track_id] = track
-        selected_tracks = list(final_selection_dict.values())
-        random.shuffle(selected_tracks)
-        print(f"Final selected count for mood playlist: {len(selected_tracks)}")
-
-        if not selected_tracks: return render_template('mood_player.html', video_ids_json='[]', track_names_json='[]', error=f"No tracks found matching criteria.")
-
-        # --- Iterative YouTube Search --- (Remains the same logic)
-        print(f"\nSearching YouTube iteratively...")
-        youtube_video_ids = []; final_track_names = []; youtube_titles = []
-        processed_track_ids_yt = set(); search_candidates = selected_tracks[:]
-        youtube_search_attempts = 0; max_youtube_attempts = len(selected_tracks) + 10
-        quota_exceeded = False; target_yt_videos = len(selected_tracks)
-
-        while len(youtube_video_ids) < target_yt_videos and search_candidates and youtube_search_attempts < max_youtube_attempts:
-            youtube_search_attempts += 1; current_track = search_candidates.pop(0)
-            track_id = current_track.get('id'); artist = current_track.get('artist', 'N/A'); name = current_track.get('name', 'N/A')
-            if not track_id or not name or not artist or track_id in processed_track_ids_yt: continue
-            processed_track_ids_yt.add(track_id)
-            query = f"{artist} - {name} official audio video lyrics"
-            print(f"  Attempt {youtube_search_attempts}: Searching '{query}'")
-            video_info = None
-            try:
-                video_info = search_youtube(query)
-                if video_info:
-                    youtube_video_ids.append(video_info['id']); final_track_names.append(f"{artist} - {name}"); youtube_titles.append(video_info['title'])
-                    print(f"    -> SUCCESS [{len(youtube_video_ids)} found]")
-                else: print(f"    -> FAILED: Video not found.")
-            except HttpError as e:
-                 if e.resp.status == 403: print("🛑 YouTube Quota likely exceeded."); quota_exceeded = True; break
-                 else: print(f"  - YouTube HTTP Error: {e}")
-            except Exception as e: print(f"  - Unexpected YT search error: {e}")
-            time.sleep(0.1)
-        # --- End Search ---
+        with span('generate.select'):
+            selected_tracks = select_generation_tracks(sp, catalog, candidate_rows, playlist_tracks_list, selected_mood_label, num_songs, strategy, filters)
+        if not selected_tracks: job.finish('error', {'message': "No tracks found matching criteria."}); return
+        job.publish('status', {'message': f"Finding videos for {len(selected_tracks)} tracks..."})
 
-        found_videos_count = len(youtube_video_ids)
-        print(f"\nFinished YouTube search. Found {found_videos_count} videos.")
-        if quota_exceeded: print("Warning: YouTube quota likely exceeded.")
-        if not youtube_video_ids: return render_template('mood_player.html', video_ids_json='[]', track_names_json='[]', error="Could not find YouTube videos.")
-
-        # --- Render Mood Player ---
-        video_ids_json = jsonify(youtube_video_ids).get_data(as_text=True)
-        track_names_json = jsonify(final_track_names).get_data(as_text=True)
-        youtube_titles_json = jsonify(youtube_titles).get_data(as_text=True)
-        # --- UPDATE: Render mood_player.html ---
-        return render_template('mood_player.html', video_ids_json=video_ids_json, track_names_json=track_names_json, youtube_titles_json=youtube_titles_json)
-        # --- End Update ---
+        # --- Concurrent YouTube Resolution, each hit is streamed as soon as it is in order ---
+        print(f"\nResolving YouTube videos for {len(selected_tracks)} tracks...")
+        with span('generate.resolve'):
+            resolved = resolve_youtube_videos(selected_tracks, on_hit=lambda track, video_info: publish_track(job, track, video_info))
+        # --- End Search ---
+        finish_generation_job(job, resolved)
 
-    except spotipy.SpotifyException as e:
-         print(f"Spotify API error during mood generation: {e}")
-         if e.http_status in [401, 403]: return redirect(url_for('logout'))
-         return render_template('mood_player.html', video_ids_json='[]', track_names_json='[]', error=f"Spotify error: {e.msg}")
     except Exception as e:
-        print(f"Unexpected error in /generate: {e}")
-        import traceback; traceback.print_exc()
-        return render_template('mood_player.html', video_ids_json='[]', track_names_json='[]', error="Unexpected server error.")
+        fail_generation_job(job, e)
+
+
+async def run_generation_job_async(job, access_token, selected_mood_label, selected_playlist_id, num_songs, strategy='random', filters=None):
+    """
+    Async twin of run_generation_job (ASYNC_IO=1). Playlist paging and YouTube searches
+    await on the shared event loop; catalog work and the spotipy calls of the selection
+    step run in a worker thread so they never block the other users' I/O.
+    """
+    with span('generate.job'):
+        try:
+            with span('generate.catalog'):
+                catalog = await asyncio.to_thread(catalog_manager.get)
+            if catalog is None or len(catalog) == 0: job.finish('error', {'message': "Could not load valid track data."}); return
+
+            filters = filters or {}
+            with span('generate.filter'):
+                candidate_rows = await asyncio.to_thread(catalog.filter_rows, selected_mood_label, **filters)
+            print(f"Found {len(candidate_rows)} tracks in CSV matching mood criteria.")
+
+            with span('generate.playlist'):
+                _, playlist_tracks_list = await get_playlist_with_tracks_async(aio.AsyncSpotify(access_token), selected_playlist_id)
+            print(f"Found {len(playlist_tracks_list)} total tracks in the selected Spotify playlist.")
+
+            with span('generate.select'):
+                selected_tracks = await asyncio.to_thread(select_generation_tracks, spotify_client(access_token), catalog, candidate_rows,
+                                                          playlist_tracks_list, selected_mood_label, num_songs, strategy, filters)
+            if not selected_tracks: job.finish('error', {'message': "No tracks found matching criteria."}); return
+            job.publish('status', {'message': f"Finding videos for {len(selected_tracks)} tracks..."})
+
+            print(f"\nResolving YouTube videos for {len(selected_tracks)} tracks...")
+            with span('generate.resolve'):
+                resolved = await resolve_youtube_videos_async(selected_tracks, on_hit=lambda track, video_info: publish_track(job, track, video_info))
+            finish_generation_job(job, resolved)
+
+        except Exception as e:
+            fail_generation_job(job, e)
+
+
+def select_generation_tracks(sp, catalog, candidate_rows, playlist_tracks_list, selected_mood_label, num_songs, strategy, filters):
+    """Selection step of a /generate job: the catalog and playlist shares, deduplicated and shuffled."""
+    playlist_candidates = [t for t in playlist_tracks_list if track_passes_filters(t, filters)]
+
+    # Combine Tracks with Ratio (only the sampled catalog rows are materialized)
+    num_csv_target = math.ceil(num_songs * 0.8)
+    num_playlist_target = num_songs - num_csv_target
+    selected_csv = None
+    if strategy == 'similar':
+        selected_csv = select_similar_catalog_tracks(sp, playlist_tracks_list, candidate_rows, num_csv_target, catalog)
+        if selected_csv is None: print("Similarity selection unavailable (no audio features), falling back to random sampling.")
+    if selected_csv is None: selected_csv = select_catalog_share(selected_mood_label, candidate_rows, num_csv_target, catalog)
+    selected_playlist = select_playlist_share(sp, playlist_candidates, selected_mood_label, num_playlist_target, catalog)
+    combined_selection = selected_csv + selected_playlist
+
+    # Deduplicate (by song, so other track ids of the same song count as repeats) and Shuffle
+    final_selection_dict = {}
+    for track in combined_selection:
+        if track.get('id'):
+            key = song_key(track)
+            if key not in final_selection_dict or track.get('source') == 'csv_dataset': final_selection_dict[key] = track
+    selected_tracks = list(final_selection_dict.values())
+    random.shuffle(selected_tracks)
+    print(f"Final selected count for mood playlist: {len(selected_tracks)}")
+    return selected_tracks
+
+
+def publish_track(job, track, video_info):
+    """Streams one resolved video to the job's player."""
+    job.publish('track', {'video_id': video_info['id'], 'track_name': f"{track.get('artist', 'N/A')} - {track.get('name', 'N/A')}", 'youtube_title': video_info['title']})
+
+
+def finish_generation_job(job, resolved):
+    found_videos_count = len(resolved.hits)
+    print(f"\nFinished YouTube search. Found {found_videos_count} videos ({resolved.cache_hits} from cache).")
+    quota_exceeded = resolved.stopped or quota_ledger.is_open()
+    if quota_exceeded: print("Warning: YouTube quota likely exceeded, only cached videos were used.")
+    if not resolved.hits: job.finish('error', {'message': "Could not find YouTube videos."}); return
+    job.finish('done', {'count': found_videos_count, 'quota_exceeded': quota_exceeded})
+
+
+def fail_generation_job(job, e):
+    if isinstance(e, spotipy.SpotifyException):
+        print(f"Spotify API error during mood generation: {e}")
+        job.finish('error', {'message': f"Spotify error: {e.msg}", 'relogin': e.http_status in [401, 403]})
+        return
+    print(f"Unexpected error in /generate job {job.id}: {e}")
+    import traceback; traceback.print_exc()
+    job.finish('error', {'message': "Unexpected server error."})
+
+
+@app.route('/mix/<mix_id>')
+def mix_player(mix_id):
+    """
+    Player page of a generated mix. Finished mixes come straight from the mix store
+    with ETag/Last-Modified, so repeat views and shared links need no generation;
+    the owner of a mix still in progress gets the streaming player instead.
+    """
+    with span('mix.lookup'):
+        mix = mix_store.get(mix_id)
+    if not mix: return "Mix not found.", 404
+    if mix['status'] == 'error':
+        return render_template('mood_player.html', video_ids=[], track_names=[], error=mix['message'])
+    if mix['status'] == 'pending':
+        if mix['owner'] != session.get('uuid'): # The job may run on another worker; its owner is in the mix store
+            response = make_response(render_template('mood_player.html', video_ids=[], track_names=[],
+                                                     error="This mix is still being generated. Reload the page in a moment."), 202)
+            response.headers['Retry-After'] = '5'
+            return response
+        response = make_response(render_template('mood_player.html', video_ids=[], track_names=[], youtube_titles=[],
+                                                 stream_url=url_for('generate_stream', job_id=mix_id)))
+        response.headers['Cache-Control'] = 'no-store' # The finished page replaces this shell
+        return response
+
+    # Finished mixes never change, so the validators only depend on when the mix was completed
+    etag = f"{mix_id}-{int(mix['updated_at'] * 1000)}"
+    last_modified = datetime.datetime.fromtimestamp(int(mix['updated_at']), datetime.timezone.utc)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        tracks = mix['tracks']
+        with span('mix.render'):
+            response = make_response(render_template('mood_player.html',
+                                                     video_ids=[t['video_id'] for t in tracks],
+                                                     track_names=[t['track_name'] for t in tracks],
+                                                     youtube_titles=[t['youtube_title'] for t in tracks]))
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = f'public, max-age={MIX_CACHE_MAX_AGE}'
+    return response
+
+
+@app.route('/generate/stream/<job_id>')
+def generate_stream(job_id):
+    """Server-Sent Events stream of the videos resolved by a /generate job, tailed from the mix store by any worker."""
+    mix = mix_store.get(job_id)
+    if not mix or mix['owner'] != session.get('uuid'): return "Playlist job not found.", 404
+    last_event_id = request.headers.get('Last-Event-ID', default=-1, type=int)
+    return Response(stream_events(mix_store, job_id, last_event_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 # --- Route to browse user's playlists ---
@@ -378,7 +818,7 @@ def browse_playlists():
     if not token_info: return redirect(url_for('login'))
     username = "User"; user_playlists = []
     try:
-        sp = Spotify(auth=token_info['access_token'])
+        sp = spotify_client(token_info['access_token'])
         user_profile = sp.current_user()
         username = user_profile.get('display_name', 'User')
         user_playlists_data = sp.current_user_playlists(limit=50)
@@ -405,83 +845,98 @@ def play_playlist(playlist_id):
     playlist_title = f"Spotify Playlist" # Default title
 
     try:
-        sp = Spotify(auth=token_info['access_token'])
-
-        # Get playlist details for the title
-        try:
-            playlist_details = sp.playlist(playlist_id, fields='name')
-            playlist_title = playlist_details.get('name', playlist_title)
-        except spotipy.SpotifyException as e:
-             print(f"Warning: Could not fetch playlist name for {playlist_id}. Error: {e}")
-
-
-        # Fetch all tracks from the selected playlist
-        selected_tracks = get_playlist_tracks(sp, playlist_id)
+        # Playlist title and tracks (cached tracks are reused while the snapshot is unchanged)
+        with span('play.playlist'):
+            if ASYNC_ENABLED: playlist_name, selected_tracks = aio.run(get_playlist_with_tracks_async(aio.AsyncSpotify(token_info['access_token']), playlist_id))
+            else: playlist_name, selected_tracks = get_playlist_with_tracks(spotify_client(token_info['access_token']), playlist_id)
+        playlist_title = playlist_name or playlist_title
 
         if not selected_tracks:
             # --- UPDATE: Render playlist_player.html with error ---
-            return render_template('playlist_player.html', video_ids_json='[]', track_names_json='[]', playlist_title=playlist_title, error=f"Could not find any playable tracks in the selected Spotify playlist.")
-
-        # --- Iterative YouTube Search for Playlist Tracks ---
-        print(f"\nSearching YouTube iteratively for {len(selected_tracks)} playlist tracks...")
-        youtube_video_ids = []; final_track_names = []; youtube_titles = []
-        processed_track_ids_yt = set(); search_candidates = selected_tracks[:] # Use the fetched tracks
-        # No need to shuffle playlist tracks, keep original order
-        youtube_search_attempts = 0; max_youtube_attempts = len(selected_tracks) + 10
-        quota_exceeded = False; target_yt_videos = len(selected_tracks)
-
-        while len(youtube_video_ids) < target_yt_videos and search_candidates and youtube_search_attempts < max_youtube_attempts:
-            # (Search logic is identical to /generate route)
-            youtube_search_attempts += 1; current_track = search_candidates.pop(0)
-            track_id = current_track.get('id'); artist = current_track.get('artist', 'N/A'); name = current_track.get('name', 'N/A')
-            if not track_id or not name or not artist or track_id in processed_track_ids_yt: continue
-            processed_track_ids_yt.add(track_id)
-            query = f"{artist} - {name} official audio video lyrics"
-            print(f"  Attempt {youtube_search_attempts}: Searching '{query}'")
-            video_info = None
-            try:
-                video_info = search_youtube(query)
-                if video_info:
-                    youtube_video_ids.append(video_info['id']); final_track_names.append(f"{artist} - {name}"); youtube_titles.append(video_info['title'])
-                    print(f"    -> SUCCESS [{len(youtube_video_ids)} found]")
-                else: print(f"    -> FAILED: Video not found.")
-            except HttpError as e:
-                 if e.resp.status == 403: print("🛑 YouTube Quota likely exceeded."); quota_exceeded = True; break
-                 else: print(f"  - YouTube HTTP Error: {e}")
-            except Exception as e: print(f"  - Unexpected YT search error: {e}")
-            time.sleep(0.1)
-        # --- End Search ---
+            return render_template('playlist_player.html', playlist_title=playlist_title, error=f"Could not find any playable tracks in the selected Spotify playlist.")
 
-        found_videos_count = len(youtube_video_ids)
-        print(f"\nFinished YouTube search for playlist. Found {found_videos_count} videos.")
-        if quota_exceeded: print("Warning: YouTube quota likely exceeded during playlist search.")
+        # --- Only the first window is resolved now; the player asks for the rest as it advances ---
+        print(f"\nResolving YouTube videos for the first {PLAYLIST_WINDOW} of {len(selected_tracks)} playlist tracks...")
+        with span('play.resolve'):
+            window = resolve_playlist_window(selected_tracks, 0, PLAYLIST_WINDOW)
 
-        if not youtube_video_ids:
+        if not window['videos'] and window['end'] >= len(selected_tracks):
             # --- UPDATE: Render playlist_player.html with error ---
-             return render_template('playlist_player.html', video_ids_json='[]', track_names_json='[]', playlist_title=playlist_title, error="Found Spotify tracks, but couldn't find any matching YouTube videos.")
+             return render_template('playlist_player.html', playlist_title=playlist_title, error="Found Spotify tracks, but couldn't find any matching YouTube videos.")
 
         # --- Render Playlist Player ---
-        video_ids_json = jsonify(youtube_video_ids).get_data(as_text=True)
-        track_names_json = jsonify(final_track_names).get_data(as_text=True)
-        youtube_titles_json = jsonify(youtube_titles).get_data(as_text=True)
-        # --- UPDATE: Render playlist_player.html ---
-        return render_template('playlist_player.html',
-                               video_ids_json=video_ids_json,
-                               track_names_json=track_names_json,
-                               youtube_titles_json=youtube_titles_json,
-                               playlist_title=playlist_title) # Pass playlist title
+        track_names = [f"{track.get('artist', 'N/A')} - {track.get('name', 'N/A')}" for track in selected_tracks]
+        with span('play.render'):
+            return render_template('playlist_player.html',
+                                   track_names=track_names, window=window, # Rendered with |tojson, which escapes </script> and friends
+                                   window_url=url_for('play_playlist_window', playlist_id=playlist_id),
+                                   window_size=PLAYLIST_WINDOW, prefetch=PLAYLIST_PREFETCH,
+                                   playlist_title=playlist_title) # Pass playlist title
         # --- End Update ---
 
     except spotipy.SpotifyException as e:
          print(f"Spotify API error playing playlist {playlist_id}: {e}")
          if e.http_status in [401, 403]: return redirect(url_for('logout'))
          # --- UPDATE: Render playlist_player.html with error ---
-         return render_template('playlist_player.html', video_ids_json='[]', track_names_json='[]', playlist_title=playlist_title, error=f"Spotify error: {e.msg}")
+         return render_template('playlist_player.html', playlist_title=playlist_title, error=f"Spotify error: {e.msg}")
     except Exception as e:
         print(f"Unexpected error playing playlist {playlist_id}: {e}")
         import traceback; traceback.print_exc()
         # --- UPDATE: Render playlist_player.html with error ---
-        return render_template('playlist_player.html', video_ids_json='[]', track_names_json='[]', playlist_title=playlist_title, error="Unexpected server error.")
+        return render_template('playlist_player.html', playlist_title=playlist_title, error="Unexpected server error.")
+
+
+@app.route('/play_playlist/<playlist_id>/window')
+def play_playlist_window(playlist_id):
+    """JSON: resolves the playlist's tracks [start, start + count) for the player (next window, prefetch or a jump)."""
+    token_info = get_token()
+    if not token_info: return jsonify({'error': "Your session has expired. Please log in again.", 'relogin': True}), 401
+    start = request.args.get('start', default=0, type=int)
+    count = request.args.get('count', default=PLAYLIST_WINDOW, type=int)
+    try:
+        # Track list comes from the playlist cache while the snapshot is unchanged (one cheap snapshot call)
+        with span('play.playlist'):
+            if ASYNC_ENABLED: _, tracks = aio.run(get_playlist_with_tracks_async(aio.AsyncSpotify(token_info['access_token']), playlist_id))
+            else: _, tracks = get_playlist_with_tracks(spotify_client(token_info['access_token']), playlist_id)
+        with span('play.window'):
+            return jsonify(resolve_playlist_window(tracks, start, count))
+    except spotipy.SpotifyException as e:
+        print(f"Spotify API error resolving playlist window {playlist_id}@{start}: {e}")
+        return jsonify({'error': f"Spotify error: {e.msg}", 'relogin': e.http_status in [401, 403]}), 502
+    except Exception as e:
+        print(f"Unexpected error resolving playlist window {playlist_id}@{start}: {e}")
+        import traceback; traceback.print_exc()
+        return jsonify({'error': "Unexpected server error."}), 500
+
+
+def resolve_playlist_window(tracks, start, count):
+    """
+    Resolves tracks[start:start + count] and returns the window the playlist player
+    consumes: {'start', 'end', 'total', 'videos': [{'index', 'video_id', 'youtube_title'}],
+    'quota_exceeded'}. Indices in [start, end) without a video have none.
+    """
+    start = min(max(0, start), len(tracks))
+    end = min(len(tracks), start + min(max(1, count), PLAYLIST_WINDOW_MAX))
+    window = tracks[start:end]
+    resolved = aio.run(resolve_youtube_videos_async(window)) if ASYNC_ENABLED else resolve_youtube_videos(window)
+    positions = {track['id']: start + i for i, track in enumerate(window)}
+    quota_exceeded = resolved.stopped or quota_ledger.is_open()
+    print(f"Playlist window [{start}, {end}) of {len(tracks)}: {len(resolved.hits)} videos ({resolved.cache_hits} from cache).")
+    if quota_exceeded: print("Warning: YouTube quota likely exceeded during playlist search, only cached videos were used.")
+    return {'start': start, 'end': end, 'total': len(tracks), 'quota_exceeded': quota_exceeded,
+            'videos': [{'index': positions[track['id']], 'video_id': video['id'], 'youtube_title': video['title']} for track, video in resolved.hits]}
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Stage latency histograms and cache/API/quota counters of this worker, in Prometheus text format."""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/quota')
+def quota_status():
+    """Remaining YouTube quota budget and circuit breaker state (shared by all workers)."""
+    return jsonify(dict(quota_ledger.status(), warm_pool=warm_pool.sizes(), warm_pool_spent_today=warm_pool.spent_today()))
 
 
 # --- Error Handlers & Run ---
@@ -510,8 +965,8 @@ if __name__ == '__main__':
     for tpl in ['index.html', 'select.html', 'mood_player.html', 'playlist_player.html', 'browse.html']:
         if not os.path.exists(os.path.join(templates_dir, tpl)): print(f"🚨 WARNING: Template '{tpl}' not found.")
     # --- End Update ---
-    if not os.path.exists(EXTERNAL_CSV_PATH): print(f"🚨 CRITICAL ERROR: CSV file '{EXTERNAL_CSV_PATH}' not found."); exit(1)
-    else: print(f"Found standardized CSV file at '{EXTERNAL_CSV_PATH}'.")
+    if not os.path.exists(CATALOG_PATH): print(f"🚨 CRITICAL ERROR: Catalog file '{CATALOG_PATH}' not found."); exit(1)
+    else: print(f"Found standardized catalog file at '{CATALOG_PATH}' (format: {CATALOG_FORMAT}).")
 
     print("\nStarting Flask app...")
     app.run(debug=True, port=8888, host='127.0.0.1')
@@ -0,0 +1,233 @@
+import os
+import gc
+import copy
+import sys
+import json
+import time
+import random
+import itertools
+import platform
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import pandas as pd
+import numpy as np # Import numpy for synthetic catalog generation
+
+# --- Configuration ---
+BENCH_OUTPUT_PATH = 'bench_results.json'
+BENCH_SIZES = ['10k', '1m', '10m'] # Synthetic catalog sizes (rows)
+BENCH_MOODS = ['Happy', 'Sad', 'Calm', 'Energetic']
+BENCH_QUERY_REPEAT = 200 # Filter/sample calls per measurement
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1m' -> 1000000, '2500' -> 2500."""
+    text = text.strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if multiplier > 1 else text) * multiplier)
+
+
+def write_synthetic_catalog(path, rows, seed=0, with_features=True):
+    """Writes a standardized CSV with rows synthetic tracks (moods, years, genres and audio features)."""
+    rng = np.random.default_rng(seed)
+    index = pd.RangeIndex(rows).astype(str)
+    df = pd.DataFrame({
+        'track_id': 'trk' + index,
+        'track_name': 'Track ' + index,
+        'artist_name': 'Artist ' + pd.Index(rng.integers(0, max(1, rows // 20), rows)).astype(str),
+        'Mood': np.array(BENCH_MOODS, dtype=object)[rng.integers(0, len(BENCH_MOODS), rows)],
+        'year': rng.integers(1960, 2025, rows),
+        'genre': np.array(['pop', 'rock', 'jazz', 'hip hop', 'electronic', 'classical'], dtype=object)[rng.integers(0, 6, rows)],
+    })
+    from standardize import canonical_keys
+    df['canonical_key'] = canonical_keys(df['artist_name'], df['track_name'])
+    if with_features:
+        from mood_inference import MOOD_FEATURES
+        for feature in MOOD_FEATURES: df[feature] = rng.random(rows, dtype=np.float32)
+    df.to_csv(path, index=False)
+    return df
+
+
+class StageRecorder:
+    """
+    Times a stage, then runs it once more under tracemalloc (which covers Python
+    and NumPy allocations) for its peak memory, so tracing never skews timings.
+    With setup, every run gets fresh state from setup() (untimed) as its argument,
+    e.g. a catalog whose lazy indexes are not built yet.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.results = []
+
+    def measure(self, stage, fn, rows=None, repeat=1, setup=None, **extra):
+        call = (lambda state: fn(state)) if setup else (lambda state: fn())
+        gc.collect()
+        elapsed = 0.0
+        for _ in range(repeat):
+            state = setup() if setup else None
+            start = time.perf_counter()
+            value = call(state)
+            elapsed += time.perf_counter() - start
+        peak = None
+        if self.trace_memory:
+            state = setup() if setup else None
+            gc.collect()
+            tracemalloc.start()
+            try: call(state); peak = round(tracemalloc.get_traced_memory()[1] / 2**20, 3)
+            finally: tracemalloc.stop()
+        result = {'stage': stage, 'rows': rows, 'repeat': repeat, 'seconds': round(elapsed, 6),
+                  'per_call_ms': round(elapsed / repeat * 1000, 4), 'peak_mem_mb': peak, **extra}
+        self.results.append(result)
+        print(f"{stage:<28} rows={rows!s:<10} {result['per_call_ms']:>12.3f} ms/call  peak {peak if peak is not None else '-':>10} MB")
+        return value
+
+
+def prepare_catalog(workdir, rows, seed):
+    """Writes the synthetic CSV and its compiled catalog (not timed). Returns (csv path, columnar path)."""
+    from columnar import write_columnar
+    csv_path = os.path.join(workdir, f'catalog_{rows}.csv')
+    bin_path = os.path.join(workdir, f'catalog_{rows}.bin')
+    start = time.perf_counter()
+    write_columnar(write_synthetic_catalog(csv_path, rows, seed), bin_path)
+    print(f"Prepared synthetic catalog of {rows} rows in {time.perf_counter() - start:.1f}s.")
+    return csv_path, bin_path
+
+
+def cold_copy(catalog):
+    """A catalog sharing catalog's columns but none of its lazily built indexes."""
+    fresh = copy.copy(catalog)
+    fresh._year_index = None; fresh._artist_index = None; fresh._id_index = None; fresh._song_index = None
+    return fresh
+
+
+def bench_catalog(recorder, workdir, rows, repeat, seed):
+    """
+    load_csv_tracks, catalog build, mmap load, mood filtering and sampling for one
+    catalog size. Queries run on the in-memory and the mmap catalog (stages suffixed
+    _mmap); the first call, which builds the lazy indexes, is timed as a _cold stage.
+    """
+    from catalog import load_csv_tracks, load_columnar_tracks, TrackCatalog
+
+    csv_path, bin_path = prepare_catalog(workdir, rows, seed)
+    df = recorder.measure('load_csv_tracks', lambda: load_csv_tracks(csv_path), rows=rows)
+    catalog = recorder.measure('catalog_from_dataframe', lambda: TrackCatalog.from_dataframe(df), rows=rows)
+    del df
+    mapped = recorder.measure('load_columnar_catalog', lambda: TrackCatalog.from_columnar(load_columnar_tracks(bin_path)), rows=rows)
+
+    rng = random.Random(seed)
+    moods = [rng.choice(BENCH_MOODS) for _ in range(repeat)]
+    it = itertools.cycle(moods)
+    seed_ids = [f'trk{i}' for i in rng.sample(range(rows), min(rows, 100))] + ['missing']
+    filters = dict(year_min=2015, year_max=2020, genres=['pop', 'rock'], exclude_artists=['Artist 1', 'Artist 2'])
+    for suffix, cat in (('', catalog), ('_mmap', mapped)):
+        # First calls build the year, artist, id and song indexes
+        recorder.measure(f'filter_rows_cold{suffix}', lambda fresh: fresh.filter_rows(next(it), **filters), rows=rows, setup=lambda: cold_copy(cat))
+        recorder.measure(f'sample_k40_cold{suffix}', lambda fresh: fresh.sample(next(it), 40, rng), rows=rows, setup=lambda: cold_copy(cat))
+        recorder.measure(f'rows_for_ids_cold{suffix}', lambda fresh: fresh.rows_for_ids(seed_ids), rows=rows, setup=lambda: cold_copy(cat))
+        recorder.measure(f'mood_rows{suffix}', lambda: cat.mood_rows(next(it)), rows=rows, repeat=repeat)
+        cat.filter_rows(next(it), **filters); cat.sample(next(it), 40, rng) # Warm: the stages below time queries alone
+        recorder.measure(f'filter_rows{suffix}', lambda: cat.filter_rows(next(it), **filters), rows=rows, repeat=repeat)
+        recorder.measure(f'sample_k40{suffix}', lambda: cat.sample(next(it), 40, rng), rows=rows, repeat=repeat)
+    if catalog.similarity() is not None:
+        index = catalog.similarity()
+        seeds = index.matrix[np.arange(min(50, len(catalog)))]
+        recorder.measure('similarity_top40', lambda: index.top_k(seeds, catalog.mood_rows('calm'), 40), rows=rows, repeat=max(1, repeat // 20))
+    for path in (csv_path, bin_path):
+        if os.path.exists(path): os.remove(path)
+
+
+def bench_services(recorder, args):
+    """get_playlist_tracks and the YouTube resolution loop against the fake clients."""
+    import app
+    from bench_fakes import FakeSpotify, FakeYouTube
+
+    sp = FakeSpotify(playlist_size=args.playlist_size, latency=args.spotify_latency, error_rate=args.spotify_error_rate, seed=args.seed)
+    tracks = recorder.measure('get_playlist_tracks', lambda: app.get_playlist_tracks(sp, 'bench-playlist'), rows=args.playlist_size,
+                              latency_s=args.spotify_latency, error_rate=args.spotify_error_rate)
+
+    youtube = FakeYouTube(latency=args.youtube_latency, error_rate=args.youtube_error_rate, seed=args.seed)
+    app.youtube_service = youtube.service # search_youtube borrows its service through this name
+    batch = tracks[:args.resolve_tracks]
+    for stage in ('resolve_youtube_cold', 'resolve_youtube_warm'): # Second pass is served by the video cache
+        resolved = recorder.measure(stage, lambda: app.resolve_youtube_videos(batch), rows=len(batch),
+                                    latency_s=args.youtube_latency, error_rate=args.youtube_error_rate)
+        recorder.results[-1].update({'hits': len(resolved.hits), 'cache_hits': resolved.cache_hits})
+
+    if args.enrich_ids:
+        # enrich.py against a local fake Spotify server (real HTTP, batching, pool and 429 handling)
+        import enrich
+        from bench_fakes import serve_fake_spotify
+        pd.DataFrame({'track_id': [f'enr{i:08d}' for i in range(args.enrich_ids)]}).to_csv('enrich_input.csv', index=False)
+        server, api_base = serve_fake_spotify(sp, throttle_rate=args.spotify_throttle_rate, seed=args.seed)
+        try:
+            stats = recorder.measure('enrich_tracks', lambda: enrich.enrich_tracks('enrich_input.csv', 'enriched.csv', token_provider=lambda: 'bench',
+                                                                                   api_base=api_base, restart=True), # restart: every pass starts cold
+                                     rows=args.enrich_ids, latency_s=args.spotify_latency, throttle_rate=args.spotify_throttle_rate)
+            recorder.results[-1].update({key: stats[key] for key in ('requests', 'throttled', 'retries')})
+        finally:
+            server.shutdown()
+
+    if args.async_io:
+        # Same stages on the async I/O path (ASYNC_IO=1), against the same fakes through an httpx transport
+        import aio
+        from bench_fakes import fake_http_transport
+        from video_cache import VideoCache
+        aio.use_transport(fake_http_transport(sp, youtube))
+        app.playlist_cache = type(app.playlist_cache)()
+        recorder.measure('get_playlist_tracks_async', lambda: aio.run(app.get_playlist_tracks_async(aio.AsyncSpotify('bench'), 'bench-playlist')),
+                         rows=args.playlist_size, latency_s=args.spotify_latency, error_rate=args.spotify_error_rate)
+        app.video_cache = VideoCache(path=os.path.abspath('youtube_cache_async.sqlite3')) # Cold again
+        for stage in ('resolve_youtube_async_cold', 'resolve_youtube_async_warm'):
+            resolved = recorder.measure(stage, lambda: aio.run(app.resolve_youtube_videos_async(batch)), rows=len(batch),
+                                        latency_s=args.youtube_latency, error_rate=args.youtube_error_rate)
+            recorder.results[-1].update({'hits': len(resolved.hits), 'cache_hits': resolved.cache_hits})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the catalog and playlist pipeline offline.")
+    parser.add_argument('--sizes', default=','.join(BENCH_SIZES), help="Comma-separated catalog sizes, e.g. 10k,1m,10m")
+    parser.add_argument('--output', default=BENCH_OUTPUT_PATH, help="Machine-readable results (JSON)")
+    parser.add_argument('--repeat', type=int, default=BENCH_QUERY_REPEAT, help="Calls per filter/sample measurement")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--playlist-size', type=int, default=1000)
+    parser.add_argument('--spotify-latency', type=float, default=0.05, help="Seconds per fake Spotify call")
+    parser.add_argument('--spotify-error-rate', type=float, default=0.0)
+    parser.add_argument('--spotify-throttle-rate', type=float, default=0.0, help="Share of fake Spotify HTTP requests answered with a 429")
+    parser.add_argument('--enrich-ids', type=int, default=2000, help="Track ids enriched against the fake Spotify server (0 = skip)")
+    parser.add_argument('--resolve-tracks', type=int, default=40, help="Tracks resolved against fake YouTube")
+    parser.add_argument('--youtube-latency', type=float, default=0.2, help="Seconds per fake YouTube search")
+    parser.add_argument('--youtube-error-rate', type=float, default=0.0)
+    parser.add_argument('--skip-services', action='store_true', help="Only run the catalog stages")
+    parser.add_argument('--async-io', action='store_true', help="Also measure the async I/O path (needs httpx)")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the traced pass that measures peak memory per stage")
+    args = parser.parse_args()
+    output_path = os.path.abspath(args.output)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    with tempfile.TemporaryDirectory(prefix='spotigai-bench-') as workdir:
+        # Keep app.py's caches, ledger and catalog lookups inside the scratch directory
+        os.chdir(workdir)
+        os.environ.update({'YOUTUBE_API_KEY': 'bench', 'YOUTUBE_RATE_LIMIT': '0', 'YOUTUBE_DAILY_QUOTA': str(10**9),
+                           'YOUTUBE_CACHE_PATH': os.path.join(workdir, 'youtube_cache.sqlite3'),
+                           'YOUTUBE_QUOTA_PATH': os.path.join(workdir, 'youtube_quota.sqlite3'), 'WARM_POOL_ENABLED': '0'})
+        recorder = StageRecorder(trace_memory=not args.no_memory)
+        for size in args.sizes.split(','):
+            bench_catalog(recorder, workdir, parse_size(size), args.repeat, args.seed)
+        if not args.skip_services: bench_services(recorder, args)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+        'platform': platform.platform(),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1), # Linux reports KiB
+        'args': vars(args),
+        'results': recorder.results,
+    }
+    with open(output_path, 'w') as f: json.dump(report, f, indent=2)
+    print(f"\n✅ Wrote {len(recorder.results)} measurements to '{output_path}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import time
+import json
+import zlib
+import asyncio
+import random
+import argparse
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import httplib2
+from googleapiclient.errors import HttpError
+from spotipy import SpotifyException
+
+
+class FakeLatency:
+    """Sleeps for latency +/- jitter seconds and raises the given error at error_rate."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0; self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """(delay seconds, fail) for the next call."""
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            fail = self._rng.random() < self.error_rate
+            if fail: self.errors += 1
+        return delay, fail
+
+    def __call__(self, make_error):
+        delay, fail = self.draw()
+        if delay: time.sleep(delay)
+        if fail: raise make_error()
+
+
+class FakeSpotify:
+    """
+    Offline stand-in for spotipy.Spotify covering the calls the playlist and
+    mood paths make: playlist, playlist_items, audio_features and tracks.
+    Ids starting with 'unknown' are answered with null, like ids Spotify doesn't have.
+    """
+
+    def __init__(self, playlist_size=1000, latency=0.05, jitter=0.0, error_rate=0.0, seed=0):
+        self.playlist_size = playlist_size
+        self.timing = FakeLatency(latency, jitter, error_rate, seed)
+        self._rng = random.Random(seed)
+        self._tracks = [self._fake_track(i) for i in range(playlist_size)]
+
+    def _fake_track(self, i):
+        year = 1970 + self._rng.randrange(55)
+        return {'track': {'id': f'pl{i:07d}', 'name': f'Playlist Track {i}', 'artists': [{'name': f'Artist {i % 97}'}],
+                          'album': {'release_date': f'{year}-01-01', 'release_date_precision': 'day'}, 'is_local': False}}
+
+    def _error(self):
+        return SpotifyException(500, -1, "Fake Spotify server error")
+
+    def playlist(self, playlist_id, fields=None, **kwargs):
+        self.timing(self._error)
+        return {'name': f'Fake playlist {playlist_id}', 'snapshot_id': 'fake-snapshot'}
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, **kwargs):
+        self.timing(self._error)
+        return self.page(offset, limit)
+
+    def page(self, offset, limit):
+        items = self._tracks[offset:offset + limit]
+        has_next = offset + limit < self.playlist_size
+        return {'items': items, 'total': self.playlist_size, 'offset': offset, 'next': 'fake-next' if has_next else None}
+
+    def audio_features(self, tracks):
+        self.timing(self._error)
+        return self.feature_objects(tracks)
+
+    def tracks(self, tracks, market=None):
+        self.timing(self._error)
+        return {'tracks': self.track_objects(tracks)}
+
+    def feature_objects(self, track_ids):
+        return [None if track_id.startswith('unknown') else
+                {'id': track_id, 'danceability': 0.5, 'energy': 0.5, 'loudness': -8.0, 'speechiness': 0.05, 'acousticness': 0.3,
+                 'instrumentalness': 0.0, 'liveness': 0.1, 'valence': 0.5, 'tempo': 120.0} for track_id in track_ids]
+
+    def track_objects(self, track_ids):
+        return [None if track_id.startswith('unknown') else
+                {'id': track_id, 'name': f'Track {track_id}', 'artists': [{'name': f'Artist {zlib.crc32(track_id.encode()) % 97}'}],
+                 'album': {'release_date': f'{1970 + zlib.crc32(track_id.encode()) % 55}-01-01', 'release_date_precision': 'day'}}
+                for track_id in track_ids]
+
+
+class FakeYouTube:
+    """
+    Offline stand-in for the YouTube Data API service object. search().list(...).execute()
+    returns one deterministic video per query; not_found_rate of queries return no items
+    and error_rate of calls raise HttpError with error_status.
+    """
+
+    def __init__(self, latency=0.2, jitter=0.0, error_rate=0.0, error_status=500, not_found_rate=0.0, seed=0):
+        self.timing = FakeLatency(latency, jitter, error_rate, seed)
+        self.error_status = error_status
+        self.not_found_rate = not_found_rate
+
+    def _error(self):
+        return HttpError(httplib2.Response({'status': self.error_status}), b'{"error": {"message": "Fake YouTube error"}}')
+
+    def search(self):
+        return _FakeSearch(self)
+
+    def execute_search(self, query):
+        self.timing(self._error)
+        return self.search_result(query)
+
+    def search_result(self, query):
+        digest = zlib.crc32((query or '').encode('utf-8'))
+        if (digest % 1000) / 1000 < self.not_found_rate: return {'items': []}
+        return {'items': [{'id': {'videoId': f'vid{digest:010d}'}, 'snippet': {'title': query}}]}
+
+    @contextmanager
+    def service(self, api_key=None):
+        """Drop-in for clients.youtube_service."""
+        yield self
+
+
+class _FakeSearch:
+    def __init__(self, youtube): self.youtube = youtube
+
+    def list(self, q=None, **kwargs): return _FakeRequest(self.youtube, q)
+
+
+class _FakeRequest:
+    def __init__(self, youtube, query): self.youtube = youtube; self.query = query
+
+    def execute(self): return self.youtube.execute_search(self.query)
+
+
+def fake_http_transport(spotify, youtube):
+    """
+    httpx transport answering the async I/O mode's Spotify and YouTube requests
+    from the same fakes (latency awaited, not slept), for offline runs.
+    """
+    import httpx
+
+    async def handle(request):
+        fake = youtube if request.url.host == 'www.googleapis.com' else spotify
+        delay, fail = fake.timing.draw()
+        if delay: await asyncio.sleep(delay)
+        if fail:
+            status = getattr(fake, 'error_status', 500)
+            return httpx.Response(status, json={'error': {'status': status, 'message': "Fake error"}})
+        params = request.url.params
+        if fake is youtube: body = youtube.search_result(params.get('q'))
+        elif request.url.path.endswith('/tracks'): body = spotify.page(int(params.get('offset', 0)), int(params.get('limit', 100)))
+        else: body = {'name': f"Fake playlist {request.url.path.rsplit('/', 1)[-1]}", 'snapshot_id': 'fake-snapshot'}
+        return httpx.Response(200, content=json.dumps(body).encode('utf-8'), headers={'Content-Type': 'application/json'})
+
+    return httpx.MockTransport(handle)
+
+
+def serve_fake_spotify(spotify, throttle_rate=0.0, retry_after=1, host='127.0.0.1', port=0, seed=0):
+    """
+    Serves a FakeSpotify's /v1/tracks and /v1/audio-features over local HTTP (its
+    latency slept per request), for tools that talk to the Web API directly such
+    as enrich.py. throttle_rate of requests get a 429 with Retry-After.
+    Returns (server, api_base); stop it with server.shutdown().
+    """
+    rng = random.Random(seed); lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args): pass
+
+        def _send(self, status, body, headers=None):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            for name, value in dict(headers or {}, **{'Content-Type': 'application/json', 'Content-Length': str(len(payload))}).items():
+                self.send_header(name, value)
+            self.end_headers(); self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            ids = [i for i in parse_qs(url.query).get('ids', [''])[0].split(',') if i]
+            with lock: throttled = rng.random() < throttle_rate
+            if throttled:
+                self._send(429, {'error': {'status': 429, 'message': "API rate limit exceeded"}}, {'Retry-After': str(retry_after)}); return
+            delay, fail = spotify.timing.draw()
+            if delay: time.sleep(delay)
+            if fail: self._send(500, {'error': {'status': 500, 'message': "Fake Spotify server error"}}); return
+            if url.path == '/v1/audio-features': self._send(200, {'audio_features': spotify.feature_objects(ids)})
+            elif url.path == '/v1/tracks': self._send(200, {'tracks': spotify.track_objects(ids)})
+            else: self._send(404, {'error': {'status': 404, 'message': "Not found"}})
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fake-spotify', daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake Spotify Web API (e.g. for enrich.py --api-base).")
+    parser.add_argument('--port', type=int, default=8899)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds per request")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Share of requests answered with a 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds of a 429")
+    args = parser.parse_args()
+    server, api_base = serve_fake_spotify(FakeSpotify(playlist_size=0, latency=args.latency, error_rate=args.error_rate),
+                                          throttle_rate=args.throttle_rate, retry_after=args.retry_after, port=args.port)
+    print(f"Fake Spotify API listening on {api_base} (Ctrl+C to stop).")
+    try: threading.Event().wait()
+    except KeyboardInterrupt: server.shutdown()
@@ -0,0 +1,415 @@
+import os
+import time
+import random
+import threading
+import pandas as pd
+import numpy as np # Import numpy for index arrays
+from columnar import open_columnar
+from mood_inference import MOOD_FEATURES
+from similarity import SimilarityIndex
+from standardize import canonical_keys
+
+# --- Configuration ---
+# Minimum number of seconds between two mtime checks of the catalog file
+CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "2"))
+
+# 'csv' parses the standardized CSV into a private DataFrame, 'mmap' memory-maps
+# the compiled catalog written by standardize.py so all workers share page cache
+CATALOG_FORMAT = os.getenv("CATALOG_FORMAT", "csv")
+
+CATALOG_EXPECTED_COLS = ['track_id', 'track_name', 'artist_name', 'Mood', 'year']
+
+
+def load_csv_tracks(csv_path, mode='csv'):
+    """
+    Loads tracks from the standardized CSV file. With mode='mmap' the path is a
+    compiled catalog and a memory-mapped ColumnarTable is returned instead.
+    """
+    if mode == 'mmap': return load_columnar_tracks(csv_path)
+    if not os.path.exists(csv_path):
+        print(f"❌ ERROR: Standardized CSV file not found at '{csv_path}'.")
+        return None
+    try:
+        df = pd.read_csv(csv_path, low_memory=False)
+        print(f"Loaded {len(df)} tracks from standardized CSV '{csv_path}'.")
+        expected_cols = CATALOG_EXPECTED_COLS
+        if not all(col in df.columns for col in expected_cols):
+             missing = [col for col in expected_cols if col not in df.columns]
+             print(f"❌ ERROR: Standardized CSV missing expected columns: {', '.join(missing)}")
+             return None
+        df['year'] = pd.to_numeric(df['year'], errors='coerce')
+        df['Mood'] = df['Mood'].astype(str).str.strip().replace(['nan', 'NaN','None', ''], pd.NA, regex=False)
+        df['track_id'] = df['track_id'].astype(str).str.strip().replace(['nan', 'NaN', 'None', ''], pd.NA, regex=False)
+        df['track_name'] = df['track_name'].astype(str).str.strip().replace(['nan', 'NaN', 'None', ''], pd.NA, regex=False)
+        df['artist_name'] = df['artist_name'].astype(str).str.strip().replace(['nan', 'NaN','None', ''], pd.NA, regex=False)
+        if 'canonical_key' in df.columns: df['canonical_key'] = df['canonical_key'].astype(str).str.strip().replace(['nan', 'NaN', 'None', ''], pd.NA, regex=False)
+        if 'genre' in df.columns: df['genre'] = df['genre'].astype(str).str.strip().replace(['nan', 'NaN', 'None', ''], pd.NA, regex=False)
+        initial_rows = len(df)
+        df.dropna(subset=['Mood', 'track_id', 'track_name', 'artist_name'], inplace=True)
+        print(f"Dropped {initial_rows - len(df)} rows due to missing critical data.")
+        print(f"DataFrame shape after cleaning and dropping NA: {df.shape}")
+        if df.empty: print("❌ Warning: DataFrame empty after cleaning."); return df
+        print(f"Found unique mood labels in standardized CSV: {list(df['Mood'].unique())}")
+        return df
+    except Exception as e:
+        print(f"❌ ERROR: Failed to load or process standardized CSV file '{csv_path}'. {e}")
+        import traceback; traceback.print_exc(); return None
+
+def load_columnar_tracks(catalog_path):
+    """Memory-maps a compiled catalog file (see columnar.py)."""
+    if not os.path.exists(catalog_path):
+        print(f"❌ ERROR: Compiled catalog file not found at '{catalog_path}'.")
+        return None
+    try:
+        table = open_columnar(catalog_path)
+        missing = [col for col in CATALOG_EXPECTED_COLS if col not in table.columns]
+        if missing:
+            print(f"❌ ERROR: Compiled catalog missing expected columns: {', '.join(missing)}")
+            return None
+        print(f"Memory-mapped {len(table)} tracks from compiled catalog '{catalog_path}'.")
+        return table
+    except Exception as e:
+        print(f"❌ ERROR: Failed to open compiled catalog file '{catalog_path}'. {e}")
+        import traceback; traceback.print_exc(); return None
+
+
+def group_rows(codes, labels):
+    """Groups row positions by lower-cased label of a factorized column (negative codes are skipped)."""
+    index = {}
+    codes = np.asarray(codes)
+    if len(codes) == 0: return index
+    order = np.argsort(codes, kind='stable')
+    order = order[codes[order] >= 0]
+    boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+    for rows in np.split(order, boundaries):
+        if len(rows) == 0: continue
+        key = str(labels[codes[rows[0]]]).strip().lower()
+        if key in index: rows = np.sort(np.concatenate([index[key], rows]))
+        index[key] = rows.astype(np.int64)
+    return index
+
+def merge_groups(groups):
+    """Uses row groups precomputed by the columnar writer, merging labels that differ only in case."""
+    index = {}
+    for label, rows in groups.items():
+        key = label.strip().lower()
+        index[key] = np.sort(np.concatenate([index[key], rows])) if key in index else rows
+    return index
+
+def complete_song_keys(song_keys, artist_names, track_names):
+    """
+    Canonical key of every row as an object array. Keys missing from the file
+    (catalogs standardized before the canonical_key column existed) are computed
+    here, once per load, and reported so the catalog gets re-standardized.
+    """
+    keys = pd.Series(np.asarray(song_keys.to_numpy() if hasattr(song_keys, 'to_numpy') else song_keys, dtype=object)
+                     if song_keys is not None else [None] * len(artist_names), dtype=object)
+    missing = np.flatnonzero(keys.isna().to_numpy())
+    if len(missing):
+        print(f"❌ Warning: {len(missing)} of {len(keys)} catalog rows have no canonical_key; computing them at load. "
+              f"Re-run standardize.py to store them in the catalog file.")
+        keys.iloc[missing] = canonical_keys([artist_names[row] for row in missing], [track_names[row] for row in missing])
+    return keys.to_numpy(dtype=object)
+
+def union_rows(groups, keys):
+    """Sorted union of the row arrays stored under keys (missing keys contribute nothing)."""
+    parts = [groups[key] for key in keys if key in groups]
+    if not parts: return np.empty(0, dtype=np.int64)
+    return parts[0] if len(parts) == 1 else np.unique(np.concatenate(parts))
+
+
+class TrackCatalog:
+    """
+    Read-only, resident view of the standardized song list.
+
+    Columns are kept as flat arrays and every mood (and genre) has a
+    precomputed array of row positions, so sampling k tracks for a mood only
+    touches those k rows. Filters (year range, genres, excluded artists) are
+    answered by intersecting sorted row arrays, never by scanning columns.
+    Rows sharing a canonical song key (standardize.canonical_keys) are the same
+    song, and sampling returns at most one row per song.
+    """
+
+    def __init__(self, track_ids, track_names, artist_names, mood_codes, mood_labels, years, source_mtime=None, mood_groups=None, features=None,
+                 genre_codes=None, genre_labels=None, genre_groups=None, song_keys=None, key_indexes=None, year_order=None):
+        self.track_ids = track_ids
+        self.track_names = track_names
+        self.artist_names = artist_names
+        self.mood_codes = mood_codes
+        self.mood_labels = list(mood_labels)
+        self.years = years
+        self.source_mtime = source_mtime
+        self.mood_index = merge_groups(mood_groups) if mood_groups is not None else group_rows(self.mood_codes, self.mood_labels)
+        if genre_groups is not None: self.genre_index = merge_groups(genre_groups)
+        elif genre_codes is not None: self.genre_index = group_rows(genre_codes, list(genre_labels))
+        else: self.genre_index = {}
+        self._year_index = year_order # (sorted known years, their rows): from the compiled catalog, or built on first year filter
+        self._artist_index = None # lower-cased artist -> sorted rows, built on first artist filter
+        self._filter_lock = threading.Lock()
+        self._id_index = None # Built on first lookup by track id
+        self._id_lock = threading.Lock()
+        self.features = features or {} # Audio feature name -> array, when the catalog has them
+        self._similarity = None # Built on first similarity query
+        self._similarity_lock = threading.Lock()
+        self.song_keys = song_keys # Canonical key column, when the standardized file has one
+        self._song_index = None # (codes, rows grouped by code, group offsets, find codes, key at row), built on first use
+        self._song_lock = threading.Lock()
+        self.key_indexes = key_indexes or {} # Column -> columnar KeyIndex, so mmap lookups skip decoding strings
+
+    @classmethod
+    def from_dataframe(cls, df, source_mtime=None):
+        """Builds a catalog from the cleaned DataFrame returned by load_csv_tracks."""
+        codes, labels = pd.factorize(df['Mood'], sort=True)
+        genre_codes, genre_labels = pd.factorize(df['genre'], sort=True) if 'genre' in df.columns else (None, None)
+        return cls(
+            track_ids=df['track_id'].to_numpy(dtype=object),
+            track_names=df['track_name'].to_numpy(dtype=object),
+            artist_names=df['artist_name'].to_numpy(dtype=object),
+            mood_codes=codes.astype(np.int16),
+            mood_labels=[str(label) for label in labels],
+            years=df['year'].to_numpy(dtype=np.float64, na_value=np.nan),
+            source_mtime=source_mtime,
+            features={f: pd.to_numeric(df[f], errors='coerce').to_numpy(dtype=np.float32, na_value=np.nan) for f in MOOD_FEATURES if f in df.columns},
+            genre_codes=genre_codes, genre_labels=genre_labels,
+            song_keys=complete_song_keys(df['canonical_key'] if 'canonical_key' in df.columns else None,
+                                         df['artist_name'].to_numpy(dtype=object), df['track_name'].to_numpy(dtype=object)),
+        )
+
+    @classmethod
+    def from_columnar(cls, table, source_mtime=None):
+        """Builds a catalog over a memory-mapped ColumnarTable without copying columns."""
+        key_indexes = {col: table.key_index(col) for col in ('track_id', 'artist_name', 'canonical_key') if table.key_index(col) is not None}
+        song_index = key_indexes.get('canonical_key')
+        if song_index is not None and not (song_index.codes < 0).any():
+            song_keys = table.column('canonical_key') # Complete, and looked up through its key index
+        else:
+            # Older compiled file: keys are decoded (or computed) and grouped here rather than on the first request
+            print(f"❌ Warning: Compiled catalog '{table.path}' has no canonical_key index; song lookups will use a resident copy. "
+                  f"Re-run standardize.py to recompile it.")
+            song_keys = complete_song_keys(table.column('canonical_key') if 'canonical_key' in table.columns else None,
+                                           table.column('artist_name'), table.column('track_name'))
+        catalog = cls(
+            track_ids=table.column('track_id'),
+            track_names=table.column('track_name'),
+            artist_names=table.column('artist_name'),
+            mood_codes=table.column('Mood'),
+            mood_labels=table.categories('Mood'),
+            years=table.column('year'),
+            source_mtime=source_mtime,
+            mood_groups=table.grouped_rows('Mood'),
+            features={f: table.column(f) for f in MOOD_FEATURES if f in table.columns},
+            genre_groups=table.grouped_rows('genre') if 'genre' in table.columns else None,
+            song_keys=song_keys,
+            key_indexes=key_indexes,
+            year_order=table.sort_order('year'), # None for files compiled without it
+        )
+        catalog._songs()
+        return catalog
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    def mood_rows(self, mood_label):
+        """Returns the array of row positions tagged with the given mood."""
+        return self.mood_index.get((mood_label or '').strip().lower(), np.empty(0, dtype=np.int64))
+
+    @property
+    def genres(self):
+        """Lower-cased genre labels present in the catalog."""
+        return sorted(self.genre_index)
+
+    def year_rows(self, year_min=None, year_max=None):
+        """Sorted rows whose year lies in [year_min, year_max] (either bound may be None)."""
+        if self._year_index is None:
+            with self._filter_lock:
+                if self._year_index is None:
+                    years = np.asarray(self.years) # Older compiled files: argsort the mapped column, no float64 copy
+                    order = np.argsort(years, kind='stable') # NaN years sort last and are never matched
+                    sorted_years = years[order]
+                    known = int(np.count_nonzero(~np.isnan(sorted_years)))
+                    self._year_index = (sorted_years[:known], order[:known])
+        sorted_years, order = self._year_index
+        bound = sorted_years.dtype.type # Search the (possibly memory-mapped) years in their own dtype, never a converted copy
+        start = 0 if year_min is None else np.searchsorted(sorted_years, bound(year_min), side='left')
+        stop = len(sorted_years) if year_max is None else np.searchsorted(sorted_years, bound(year_max), side='right')
+        return np.sort(order[start:stop]).astype(np.int64, copy=False)
+
+    def artist_rows(self, artist_names):
+        """Sorted rows by any of the given artists (case-insensitive)."""
+        index = self.key_indexes.get('artist_name')
+        if index is not None:
+            parts = [index.group(code) for code in index.lookup(artist_names) if code >= 0]
+            return np.unique(np.concatenate(parts)).astype(np.int64) if parts else np.empty(0, dtype=np.int64)
+        if self._artist_index is None:
+            with self._filter_lock:
+                if self._artist_index is None:
+                    artists = self.artist_names.to_numpy() if hasattr(self.artist_names, 'to_numpy') else np.asarray(self.artist_names, dtype=object)
+                    codes, labels = pd.factorize(pd.Series(artists, dtype=object).str.strip().str.lower())
+                    self._artist_index = group_rows(codes, labels)
+        return union_rows(self._artist_index, [name.strip().lower() for name in artist_names])
+
+    def filter_rows(self, mood_label, year_min=None, year_max=None, genres=None, exclude_artists=None):
+        """
+        Sorted rows of mood_label narrowed by a year range, a set of genres and a
+        list of artists to leave out, all resolved through the precomputed indexes.
+        """
+        rows = self.mood_rows(mood_label)
+        if year_min is not None or year_max is not None:
+            rows = np.intersect1d(rows, self.year_rows(year_min, year_max), assume_unique=True)
+        if genres:
+            rows = np.intersect1d(rows, union_rows(self.genre_index, [g.strip().lower() for g in genres]), assume_unique=True)
+        if exclude_artists:
+            rows = np.setdiff1d(rows, self.artist_rows(exclude_artists), assume_unique=True)
+        return rows
+
+    def rows_for_ids(self, track_ids):
+        """Row positions of the given track ids (-1 where an id is not in the catalog)."""
+        index = self.key_indexes.get('track_id')
+        if index is not None: return index.first_rows(index.lookup(track_ids)) # Duplicate ids resolve to their first row
+        if self._id_index is None:
+            with self._id_lock:
+                if self._id_index is None:
+                    ids = self.track_ids.to_numpy() if hasattr(self.track_ids, 'to_numpy') else np.asarray(self.track_ids, dtype=object)
+                    first = ~pd.Index(ids).duplicated() # Duplicate ids resolve to their first row
+                    self._id_index = (pd.Index(ids[first]), np.flatnonzero(first))
+        index, rows = self._id_index
+        positions = index.get_indexer(list(track_ids))
+        return np.where(positions >= 0, rows[positions], -1)
+
+    def _songs(self):
+        if self._song_index is None:
+            with self._song_lock:
+                if self._song_index is None:
+                    index = self.key_indexes.get('canonical_key')
+                    if index is not None and not (index.codes < 0).any():
+                        # Song codes, groups and key lookup come precomputed from the compiled catalog
+                        self._song_index = (index.codes, index.rows, index.offsets, index.lookup, lambda row: self.song_keys[row])
+                        return self._song_index
+                    codes, labels = pd.factorize(pd.Series(self.song_keys, dtype=object)) # Completed at load (complete_song_keys)
+                    order = np.argsort(codes, kind='stable')
+                    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(labels)))])
+                    labels = pd.Index(labels)
+                    self._song_index = (codes, order, offsets, lambda keys: labels.get_indexer(list(keys)), lambda row: labels[codes[row]])
+        return self._song_index
+
+    def song_codes(self, rows):
+        """Song identity code of each row: rows of the same song share a code."""
+        return self._songs()[0][np.asarray(rows, dtype=np.int64)]
+
+    def song_key_at(self, row):
+        return self._songs()[4](row)
+
+    def rows_for_songs(self, keys):
+        """Sorted rows of every track id of the given canonical keys (unknown keys contribute nothing)."""
+        _, order, offsets, find, _ = self._songs()
+        codes = find(keys)
+        parts = [order[int(offsets[code]):int(offsets[code + 1])] for code in codes[codes >= 0]]
+        return np.sort(np.concatenate(parts)).astype(np.int64) if parts else np.empty(0, dtype=np.int64)
+
+    def track_ids_for_song(self, key):
+        """All track ids that are the given canonical song."""
+        return [self.track_ids[row] for row in self.rows_for_songs([key])]
+
+    def distinct_rows(self, rows):
+        """rows with only the first row of each song, order kept."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0: return rows
+        _, first = np.unique(self.song_codes(rows), return_index=True)
+        return rows[np.sort(first)]
+
+    def similarity(self):
+        """The audio-feature SimilarityIndex, or None if the catalog has no features."""
+        if not self.features or len(self) == 0: return None
+        if self._similarity is None:
+            with self._similarity_lock:
+                if self._similarity is None: self._similarity = SimilarityIndex(self.features)
+        return self._similarity
+
+    def mood_at(self, row):
+        return self.mood_labels[self.mood_codes[row]]
+
+    def track_at(self, row):
+        """Materializes a single row as the track dict used by the routes."""
+        return {
+            'id': self.track_ids[row],
+            'name': self.track_names[row],
+            'artist': self.artist_names[row],
+            'mood': self.mood_at(row),
+            'canonical_key': self.song_key_at(row),
+            'source': 'csv_dataset'
+        }
+
+    def sample(self, mood_label, k, rng=random):
+        """Picks k random tracks of the given mood, materializing only those rows."""
+        return self.sample_rows(self.mood_rows(mood_label), k, rng)
+
+    def sample_rows(self, rows, k, rng=random):
+        """
+        Picks k random tracks from an array of rows (e.g. from filter_rows), at most
+        one per song. Draws 2k rows and drops repeated songs, doubling the draw
+        until k distinct songs are found or every row has been drawn.
+        """
+        k = min(len(rows), max(0, k))
+        if k == 0: return []
+        draw = min(len(rows), 2 * k)
+        while True:
+            picked = np.asarray(rng.sample(range(len(rows)), draw), dtype=np.int64)
+            _, first = np.unique(self.song_codes(np.asarray(rows)[picked]), return_index=True)
+            picked = picked[np.sort(first)]
+            if len(picked) >= k or draw == len(rows): break
+            draw = min(len(rows), 2 * draw)
+        return [self.track_at(rows[i]) for i in picked[:k]]
+
+
+class CatalogManager:
+    """
+    Holds the current TrackCatalog for the process and swaps in a freshly
+    built one when the file on disk changes (checked via mtime).
+    """
+
+    def __init__(self, path, mode=CATALOG_FORMAT, reload_interval=CATALOG_RELOAD_INTERVAL):
+        self.path = path
+        self.mode = mode
+        self.reload_interval = reload_interval
+        self._catalog = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _current_mtime(self):
+        try: return os.stat(self.path).st_mtime_ns
+        except OSError: return None
+
+    def _build(self, mtime):
+        data = load_csv_tracks(self.path, mode=self.mode)
+        if data is None: return None
+        if self.mode == 'mmap': catalog = TrackCatalog.from_columnar(data, source_mtime=mtime)
+        else: catalog = TrackCatalog.from_dataframe(data, source_mtime=mtime)
+        print(f"Catalog ready: {len(catalog)} tracks, moods: {sorted(catalog.mood_index)}")
+        return catalog
+
+    def reload(self, force=False):
+        """Rebuilds the catalog if the file changed (or if forced). Keeps the old one on failure."""
+        with self._lock:
+            self._last_check = time.monotonic()
+            mtime = self._current_mtime()
+            current = self._catalog
+            if mtime is None:
+                if current is None: print(f"❌ ERROR: Catalog file '{self.path}' not found.")
+                return current
+            if not force and current is not None and current.source_mtime == mtime:
+                return current
+            catalog = self._build(mtime)
+            if catalog is not None:
+                self._catalog = catalog # Single reference assignment: readers see old or new, never half-built
+            elif current is not None:
+                print(f"Warning: Reloading catalog '{self.path}' failed. Keeping previous version.")
+            return self._catalog
+
+    def get(self):
+        """Returns the current catalog, reloading it first if the file changed."""
+        catalog = self._catalog
+        if catalog is None: return self.reload()
+        if time.monotonic() - self._last_check >= self.reload_interval:
+            self._last_check = time.monotonic()
+            if self._current_mtime() != catalog.source_mtime: return self.reload()
+        return catalog
@@ -0,0 +1,64 @@
+import os
+import json
+import queue
+import threading
+from contextlib import contextmanager
+import httplib2
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from spotipy import Spotify
+from googleapiclient.discovery import build_from_document
+from googleapiclient import discovery_cache
+
+# --- Configuration ---
+YOUTUBE_HTTP_TIMEOUT = int(os.getenv("YOUTUBE_HTTP_TIMEOUT", "10"))
+SPOTIFY_POOL_SIZE = int(os.getenv("SPOTIFY_POOL_SIZE", "32")) # Keep-alive connections kept per host
+SPOTIFY_REQUESTS_TIMEOUT = 5
+
+_discovery_lock = threading.Lock()
+_youtube_discovery_doc = None
+_youtube_services = queue.LifoQueue() # Idle YouTube service objects, each with its own keep-alive connection
+
+# Same retry policy spotipy applies to the sessions it creates itself
+_spotify_retry = Retry(total=3, connect=None, read=False, allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+                       status=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504))
+_spotify_session = requests.Session()
+_spotify_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=SPOTIFY_POOL_SIZE, max_retries=_spotify_retry))
+
+
+def youtube_discovery_document():
+    """The YouTube v3 discovery document bundled with google-api-python-client, parsed once."""
+    global _youtube_discovery_doc
+    if _youtube_discovery_doc is None:
+        with _discovery_lock:
+            if _youtube_discovery_doc is None:
+                doc = discovery_cache.get_static_doc('youtube', 'v3')
+                if doc is None: raise RuntimeError("Bundled YouTube discovery document not found; upgrade google-api-python-client.")
+                _youtube_discovery_doc = json.loads(doc)
+    return _youtube_discovery_doc
+
+
+@contextmanager
+def youtube_service(api_key):
+    """
+    Borrows a YouTube service from the pool. httplib2 connections are not
+    thread-safe, so each service is used by one thread at a time and returned
+    afterwards with its connection still open for the next search.
+    """
+    try: service = _youtube_services.get_nowait()
+    except queue.Empty:
+        service = build_from_document(youtube_discovery_document(), developerKey=api_key,
+                                      http=httplib2.Http(timeout=YOUTUBE_HTTP_TIMEOUT))
+    yield service
+    _youtube_services.put(service) # Not reached if the search raised; that service is dropped
+
+
+def spotify_client(access_token):
+    """Spotify client for one user's token, sharing the process-wide keep-alive connection pool."""
+    return Spotify(auth=access_token, requests_session=_spotify_session, requests_timeout=SPOTIFY_REQUESTS_TIMEOUT)
+
+
+def spotify_session():
+    """Shared requests.Session used for Spotify API and OAuth calls."""
+    return _spotify_session
@@ -0,0 +1,342 @@
+import os
+import json
+import shutil
+import tempfile
+import pandas as pd
+import numpy as np # Import numpy for fixed-width columns and memory maps
+
+# --- Format ---
+# A compiled catalog is a single file:
+#   MAGIC | uint64 header length | JSON header | 8-byte aligned sections
+# The header lists every section (name, dtype, byte offset, item count) and
+# describes each column as one of:
+#   'fixed'  - one numeric section (NaN marks missing floats); a sorted column
+#              ('sorted': true) also stores its known values in ascending order
+#              ('<col>.sorted_values') and their row positions ('<col>.sorted_rows')
+#   'dict'   - int16 codes (-1 = missing; int32 if there are too many categories)
+#              + categories stored in the header, plus rows grouped by code
+#              ('<col>.rows' / '<col>.row_offsets')
+#   'string' - uint64 offsets (rows + 1) into a UTF-8 blob, '' = missing
+# A string column may also carry a key index ('index': 'exact' or 'lower', the
+# latter matching stripped, lower-cased values) so lookups and groupings never
+# decode the blob: sorted 64-bit hashes of the distinct keys ('<col>.key_hashes'),
+# each row's position in them (int32 '<col>.key_codes', -1 = missing) and rows
+# grouped by that code ('<col>.key_rows' / '<col>.key_offsets').
+MAGIC = b'SPGCAT01'
+ALIGNMENT = 8
+STRING_NA = ''
+DICT_NA_CODE = -1
+DEFAULT_DICT_COLUMNS = ('Mood', 'genre')
+DEFAULT_INDEX_COLUMNS = {'track_id': 'exact', 'artist_name': 'lower', 'canonical_key': 'exact'}
+DEFAULT_SORTED_COLUMNS = ('year',)
+
+
+def _aligned(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def normalize_keys(values, how='exact'):
+    """Index keys of string values as a Series: the value itself, or stripped and lower-cased for 'lower'."""
+    keys = pd.Series(values, dtype=object).fillna(STRING_NA).astype(str)
+    return keys.str.strip().str.lower() if how == 'lower' else keys
+
+
+def hash_keys(keys):
+    """64-bit hashes of normalized keys, as stored in a key index."""
+    return pd.util.hash_pandas_object(pd.Series(keys, dtype=object), index=False).to_numpy(dtype=np.uint64)
+
+
+class ColumnarWriter:
+    """
+    Writes a compiled catalog incrementally. Chunks are appended to one
+    temporary file per section and the final file is assembled (and
+    atomically renamed into place) on close().
+    """
+
+    def __init__(self, output_path, dict_columns=DEFAULT_DICT_COLUMNS, index_columns=DEFAULT_INDEX_COLUMNS, sorted_columns=DEFAULT_SORTED_COLUMNS):
+        self.output_path = output_path
+        self.dict_columns = set(dict_columns)
+        self.index_columns = dict(index_columns)
+        self.sorted_columns = set(sorted_columns)
+        self.rows = 0
+        self.columns = None # name -> column description, fixed by the first chunk
+        self._tmp_dir = tempfile.mkdtemp(prefix='.catalog-', dir=os.path.dirname(os.path.abspath(output_path)))
+        self._files = {}
+        self._string_sizes = {}
+        self._categories = {}
+        self._dtypes = {} # Section name -> dtype, where it differs from the default for its suffix
+
+    def _section(self, name):
+        if name not in self._files:
+            self._files[name] = open(os.path.join(self._tmp_dir, name), 'wb')
+        return self._files[name]
+
+    def _describe(self, df):
+        columns = {}
+        for col in df.columns:
+            if col in self.dict_columns:
+                columns[col] = {'kind': 'dict'}
+                self._categories[col] = {}
+            elif pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+                columns[col] = {'kind': 'fixed', 'dtype': '<f4'}
+                if col in self.sorted_columns: columns[col]['sorted'] = True
+            else:
+                columns[col] = {'kind': 'string'}
+                if col in self.index_columns: columns[col]['index'] = self.index_columns[col]
+                self._string_sizes[col] = 0
+                self._section(f'{col}.offsets').write(np.zeros(1, dtype='<u8').tobytes())
+        return columns
+
+    def append(self, df):
+        """Appends a chunk of standardized rows."""
+        if self.columns is None: self.columns = self._describe(df)
+        for col, desc in self.columns.items():
+            series = df[col]
+            if desc['kind'] == 'fixed':
+                values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+                self._section(col).write(values.astype(desc['dtype']).tobytes())
+            elif desc['kind'] == 'dict':
+                mapping = self._categories[col]
+                for label in series.dropna().unique():
+                    if label not in mapping: mapping[label] = len(mapping)
+                codes = series.map(mapping).fillna(DICT_NA_CODE).to_numpy(dtype=np.int32)
+                self._section(f'{col}.codes').write(codes.astype('<i4').tobytes()) # Narrowed on close() when the categories allow
+            else:
+                encoded = [value.encode('utf-8') for value in series.fillna(STRING_NA).astype(str)]
+                lengths = np.fromiter((len(b) for b in encoded), dtype=np.uint64, count=len(encoded))
+                offsets = self._string_sizes[col] + np.cumsum(lengths, dtype=np.uint64)
+                self._section(f'{col}.blob').write(b''.join(encoded))
+                self._section(f'{col}.offsets').write(offsets.astype('<u8').tobytes())
+                if len(offsets): self._string_sizes[col] = int(offsets[-1])
+                if desc.get('index'): self._section(f'{col}.hashes').write(hash_keys(normalize_keys(series, desc['index'])).astype('<u8').tobytes())
+        self.rows += len(df)
+
+    def _narrow_codes(self, col):
+        """Stores the codes as int16 when every category fits, int32 (with a warning) otherwise."""
+        self._section(f'{col}.codes').flush()
+        path = os.path.join(self._tmp_dir, f'{col}.codes')
+        codes = np.fromfile(path, dtype='<i4')
+        if len(self._categories[col]) - 1 <= np.iinfo(np.int16).max:
+            codes.astype('<i2').tofile(path)
+        else:
+            print(f"Warning: Column '{col}' has {len(self._categories[col])} categories, too many for int16 codes; storing int32 codes.")
+            self._dtypes[f'{col}.codes'] = '<i4'
+        return codes
+
+    def _write_row_groups(self, col, codes):
+        """Groups row positions by dictionary code so readers skip the argsort."""
+        order = np.argsort(codes, kind='stable').astype('<i4')
+        counts = np.bincount(codes[codes >= 0], minlength=len(self._categories[col]))
+        missing = int((codes < 0).sum())
+        row_offsets = np.concatenate([[missing], missing + np.cumsum(counts)]).astype('<u8')
+        self._section(f'{col}.rows').write(order.tobytes())
+        self._section(f'{col}.row_offsets').write(row_offsets.tobytes())
+
+    def _write_sort_order(self, col):
+        """Stores the column's known values in ascending order with their rows, so range filters only binary-search."""
+        self._section(col).flush()
+        values = np.fromfile(os.path.join(self._tmp_dir, col), dtype=self.columns[col]['dtype'])
+        order = np.argsort(values, kind='stable') # NaN sorts last and is left out
+        order = order[:int(np.count_nonzero(~np.isnan(values)))]
+        self._section(f'{col}.sorted_values').write(values[order].astype(self.columns[col]['dtype']).tobytes())
+        self._section(f'{col}.sorted_rows').write(order.astype('<i4').tobytes())
+
+    def _write_key_index(self, col):
+        """Turns the per-row key hashes (a scratch file) into the key index sections."""
+        self._files.pop(f'{col}.hashes').close()
+        self._section(f'{col}.offsets').flush()
+        hashes_path = os.path.join(self._tmp_dir, f'{col}.hashes')
+        hashes = np.fromfile(hashes_path, dtype='<u8')
+        os.remove(hashes_path)
+        present = np.diff(np.fromfile(os.path.join(self._tmp_dir, f'{col}.offsets'), dtype='<u8')) > 0 # '' = missing
+        key_hashes, inverse = np.unique(hashes[present], return_inverse=True)
+        codes = np.full(len(hashes), -1, dtype='<i4')
+        codes[present] = inverse
+        order = np.argsort(codes, kind='stable').astype('<i4')
+        order = order[int((~present).sum()):] # Missing rows (code -1) sort first and belong to no key
+        key_offsets = np.concatenate([[0], np.cumsum(np.bincount(inverse, minlength=len(key_hashes)))]).astype('<u8')
+        self._section(f'{col}.key_hashes').write(key_hashes.astype('<u8').tobytes())
+        self._section(f'{col}.key_codes').write(codes.tobytes())
+        self._section(f'{col}.key_rows').write(order.tobytes())
+        self._section(f'{col}.key_offsets').write(key_offsets.tobytes())
+
+    def close(self):
+        """Assembles the sections into the output file and renames it into place."""
+        try:
+            if self.columns is None: raise ValueError("No rows were appended to the columnar writer.")
+            for col, desc in self.columns.items():
+                if desc['kind'] == 'dict':
+                    desc['categories'] = [str(label) for label in self._categories[col]]
+                    self._write_row_groups(col, self._narrow_codes(col))
+                elif desc.get('index'):
+                    self._write_key_index(col)
+                elif desc.get('sorted'):
+                    self._write_sort_order(col)
+            for f in self._files.values(): f.close()
+
+            dtypes = {'.offsets': '<u8', '.blob': '|u1', '.codes': '<i2', '.rows': '<i4', '.row_offsets': '<u8',
+                      '.key_hashes': '<u8', '.key_codes': '<i4', '.key_rows': '<i4', '.key_offsets': '<u8',
+                      '.sorted_values': '<f4', '.sorted_rows': '<i4'}
+            sections = {}
+            for name in self._files:
+                suffix = os.path.splitext(name)[1]
+                dtype = self._dtypes.get(name) or dtypes.get(suffix, self.columns.get(name, {}).get('dtype', '|u1'))
+                size = os.path.getsize(os.path.join(self._tmp_dir, name))
+                sections[name] = {'dtype': dtype, 'count': size // np.dtype(dtype).itemsize, 'size': size}
+
+            # Header size depends on the offsets it contains, so fix it point-iteratively
+            header_len = 0
+            while True:
+                position = _aligned(len(MAGIC) + 8 + header_len)
+                for name, sec in sections.items():
+                    sec['offset'] = position
+                    position = _aligned(position + sec['size'])
+                header = json.dumps({'rows': self.rows, 'columns': self.columns, 'sections': sections}).encode('utf-8')
+                if len(header) == header_len: break
+                header_len = len(header)
+
+            tmp_output = self.output_path + '.tmp'
+            with open(tmp_output, 'wb') as out:
+                out.write(MAGIC); out.write(np.array([len(header)], dtype='<u8').tobytes()); out.write(header)
+                for name, sec in sections.items():
+                    out.write(b'\0' * (sec['offset'] - out.tell()))
+                    with open(os.path.join(self._tmp_dir, name), 'rb') as src: shutil.copyfileobj(src, out)
+            os.replace(tmp_output, self.output_path)
+        finally:
+            for f in self._files.values(): f.close()
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+
+    def abort(self):
+        """Discards everything written so far without touching output_path."""
+        for f in self._files.values(): f.close()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+
+def write_columnar(df, output_path, dict_columns=DEFAULT_DICT_COLUMNS, index_columns=DEFAULT_INDEX_COLUMNS, sorted_columns=DEFAULT_SORTED_COLUMNS):
+    """Writes a whole standardized DataFrame as a compiled catalog."""
+    writer = ColumnarWriter(output_path, dict_columns=dict_columns, index_columns=index_columns, sorted_columns=sorted_columns)
+    writer.append(df)
+    writer.close()
+
+
+class StringColumn:
+    """Offset-indexed view over a UTF-8 blob; values are decoded on access."""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        value = self.blob[start:end].tobytes().decode('utf-8')
+        return value if value != STRING_NA else None
+
+    def to_numpy(self):
+        """Decodes the whole column (only meant for small catalogs and tooling)."""
+        return np.array([self[i] for i in range(len(self))], dtype=object)
+
+
+class ColumnarTable:
+    """Read-only, memory-mapped compiled catalog. Sections are zero-copy views."""
+
+    def __init__(self, path):
+        self.path = path
+        self._mm = np.memmap(path, dtype=np.uint8, mode='r')
+        if self._mm[:len(MAGIC)].tobytes() != MAGIC: raise ValueError(f"'{path}' is not a compiled catalog file.")
+        header_len = int(self._mm[len(MAGIC):len(MAGIC) + 8].view('<u8')[0])
+        header = json.loads(self._mm[len(MAGIC) + 8:len(MAGIC) + 8 + header_len].tobytes().decode('utf-8'))
+        self.rows = header['rows']
+        self.columns = header['columns']
+        self._sections = header['sections']
+
+    def section(self, name):
+        sec = self._sections[name]
+        return self._mm[sec['offset']:sec['offset'] + sec['size']].view(sec['dtype'])
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        """Returns a numpy view (fixed), codes view (dict) or StringColumn (string)."""
+        desc = self.columns[name]
+        if desc['kind'] == 'fixed': return self.section(name)
+        if desc['kind'] == 'dict': return self.section(f'{name}.codes')
+        return StringColumn(self.section(f'{name}.offsets'), self.section(f'{name}.blob'))
+
+    def categories(self, name):
+        return self.columns[name].get('categories', [])
+
+    def grouped_rows(self, name):
+        """Returns {category: row positions} for a dictionary-encoded column."""
+        rows = self.section(f'{name}.rows')
+        offsets = self.section(f'{name}.row_offsets')
+        return {label: rows[int(offsets[code]):int(offsets[code + 1])] for code, label in enumerate(self.categories(name))}
+
+    def sort_order(self, name):
+        """(ascending known values, their rows) of a sorted fixed column, or None (e.g. a file compiled before sort orders existed)."""
+        if not self.columns.get(name, {}).get('sorted'): return None
+        return self.section(f'{name}.sorted_values'), self.section(f'{name}.sorted_rows')
+
+    def key_index(self, name):
+        """The column's KeyIndex, or None if it has none (e.g. a file compiled before key indexes existed)."""
+        return KeyIndex(self, name) if self.columns.get(name, {}).get('index') else None
+
+
+class KeyIndex:
+    """
+    Hash index of a string column, read straight from the memory map. Keys are
+    found by binary search over the sorted hashes and checked against one
+    decoded row, so neither lookups nor groupings decode the column.
+    """
+
+    def __init__(self, table, name):
+        self.how = table.columns[name]['index']
+        self.values = table.column(name)
+        self.hashes = table.section(f'{name}.key_hashes')
+        self.codes = table.section(f'{name}.key_codes') # Key code of every row (-1 = missing)
+        self.rows = table.section(f'{name}.key_rows') # Rows grouped by key code, ascending within a key
+        self.offsets = table.section(f'{name}.key_offsets')
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def lookup(self, values):
+        """Key codes of the given values (-1 where a value is not in the column)."""
+        keys = normalize_keys(list(values), self.how)
+        if len(keys) == 0 or len(self.hashes) == 0: return np.full(len(keys), -1, dtype=np.int64)
+        hashes = hash_keys(keys)
+        codes = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1).astype(np.int64)
+        codes[self.hashes[codes] != hashes] = -1
+        for i in np.flatnonzero(codes >= 0): # Rule out a hash match on a different key
+            if normalize_keys([self.values[self.rows[int(self.offsets[codes[i]])]]], self.how)[0] != keys[i]: codes[i] = -1
+        return codes
+
+    def group(self, code):
+        """Sorted rows holding key code."""
+        return self.rows[int(self.offsets[code]):int(self.offsets[code + 1])]
+
+    def first_rows(self, codes):
+        """First row of each key code (-1 for negative codes)."""
+        codes = np.asarray(codes, dtype=np.int64)
+        first = self.rows[self.offsets[np.maximum(codes, 0)].astype(np.int64)].astype(np.int64) if len(self.rows) else np.zeros(len(codes), dtype=np.int64)
+        return np.where(codes >= 0, first, -1)
+
+
+def open_columnar(path):
+    """Memory-maps a compiled catalog file."""
+    return ColumnarTable(path)
+
+
+def read_columnar(path):
+    """Reads a whole compiled catalog back into a DataFrame (tooling only, e.g. incremental merges)."""
+    table = open_columnar(path)
+    data = {}
+    for name, desc in table.columns.items():
+        if desc['kind'] == 'fixed': data[name] = table.column(name).astype(np.float64)
+        elif desc['kind'] == 'dict': data[name] = pd.Series(pd.Categorical.from_codes(table.column(name).astype(np.int64), table.categories(name))).astype(object)
+        else: data[name] = table.column(name).to_numpy()
+    return pd.DataFrame(data, columns=list(table.columns))
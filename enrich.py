@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from spotipy import SpotifyException
+import pandas as pd
+from standardize import COLUMN_MAPPING, OUTPUT_CSV_PATH, STREAM_CHUNK_SIZE, clean_column
+from mood_inference import MOOD_FEATURES, AUDIO_FEATURES_BATCH_SIZE
+
+# --- Configuration ---
+SPOTIFY_API_BASE = os.getenv("SPOTIFY_API_BASE", "https://api.spotify.com/v1") # Point at a local fake server for offline runs
+ENRICH_OUTPUT_PATH = 'enriched_tracks.csv'
+CHECKPOINT_SUFFIX = '.checkpoint.json' # Written next to the output
+ENRICH_WORKERS = int(os.getenv("ENRICH_WORKERS", "8")) # Batches in flight at once
+TRACKS_BATCH_SIZE = 50 # Max ids per /tracks request
+ENRICH_MAX_RETRIES = 8 # Per request, 429s included
+ENRICH_BACKOFF = 1.0 # Seconds, doubled per retry of 5xx/connection errors
+ENRICH_HTTP_TIMEOUT = 10
+CHECKPOINT_EVERY = 20 # Batches written between checkpoints
+
+# Enriched rows use the standardized column names, so the output is a valid source for score.py/ingest.py
+OUTPUT_COLUMNS = ['track_id', 'track_name', 'artist_name', 'year'] + MOOD_FEATURES
+
+
+def missing_feature_ids(input_path, chunksize=STREAM_CHUNK_SIZE):
+    """
+    Unique track ids of input_path (any CSV with a track id column) that lack at
+    least one audio feature, in file order. Reads only the id and feature columns.
+    """
+    header = pd.read_csv(input_path, nrows=0).columns
+    id_columns = [col for col in COLUMN_MAPPING['track_id'] if col in header]
+    if not id_columns: raise ValueError(f"'{input_path}' has no track id column (expected one of {COLUMN_MAPPING['track_id']}).")
+    feature_columns = [col for col in MOOD_FEATURES if col in header]
+    parts = []
+    for chunk in pd.read_csv(input_path, usecols=id_columns + feature_columns, dtype={col: str for col in id_columns}, chunksize=chunksize):
+        track_ids = clean_column(chunk[id_columns[0]])
+        for alt_col in id_columns[1:]: track_ids = track_ids.fillna(clean_column(chunk[alt_col]))
+        if len(feature_columns) == len(MOOD_FEATURES):
+            features = chunk[feature_columns].apply(pd.to_numeric, errors='coerce')
+            track_ids = track_ids[features.isna().any(axis=1).to_numpy()]
+        parts.append(track_ids.dropna())
+    return pd.unique(pd.concat(parts)) if parts else pd.unique(pd.Series([], dtype=object))
+
+
+def release_year(album):
+    """Year of an album's release_date ('1999', '1999-03' or '1999-03-01'), or None."""
+    release_date = (album or {}).get('release_date') or ''
+    return int(release_date[:4]) if release_date[:4].isdigit() else None
+
+
+class SpotifyBatchClient:
+    """
+    Batched /audio-features and /tracks calls over one keep-alive pool shared by
+    the worker threads. A 429 pauses every worker for its Retry-After, 5xx and
+    connection errors back off exponentially, other errors raise SpotifyException.
+    """
+
+    def __init__(self, token_provider, api_base=SPOTIFY_API_BASE, pool_size=ENRICH_WORKERS,
+                 max_retries=ENRICH_MAX_RETRIES, backoff=ENRICH_BACKOFF, timeout=ENRICH_HTTP_TIMEOUT):
+        self.token_provider = token_provider
+        self.api_base = api_base.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount('http://', adapter); self.session.mount('https://', adapter)
+        self.requests = 0; self.throttled = 0; self.retries = 0
+        self._pause_until = 0.0 # Shared Retry-After deadline
+        self._lock = threading.Lock()
+
+    def _wait_for_pause(self):
+        delay = self._pause_until - time.monotonic()
+        if delay > 0: time.sleep(delay)
+
+    def _get(self, path, ids):
+        url = f"{self.api_base}/{path}"
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_pause()
+            with self._lock: self.requests += 1
+            try:
+                response = self.session.get(url, params={'ids': ','.join(ids)}, timeout=self.timeout,
+                                            headers={'Authorization': f"Bearer {self.token_provider()}"})
+            except requests.RequestException as e:
+                if attempt == self.max_retries: raise SpotifyException(599, -1, f"{url}:\n {e}")
+                with self._lock: self.retries += 1
+                time.sleep(self.backoff * 2 ** attempt); continue
+            if response.status_code < 400: return response.json()
+            if attempt == self.max_retries: break
+            if response.status_code == 429:
+                retry_after = response.headers.get('Retry-After', '')
+                delay = float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** attempt
+                with self._lock:
+                    self.throttled += 1
+                    self._pause_until = max(self._pause_until, time.monotonic() + delay)
+                continue
+            if response.status_code < 500: break
+            with self._lock: self.retries += 1
+            time.sleep(self.backoff * 2 ** attempt)
+        try: message = response.json().get('error', {}).get('message', response.text)
+        except ValueError: message = response.text
+        raise SpotifyException(response.status_code, -1, f"{response.url}:\n {message}", headers=dict(response.headers))
+
+    def enrich_batch(self, track_ids, with_tracks=True):
+        """
+        One unit of work: audio features for up to AUDIO_FEATURES_BATCH_SIZE ids
+        (one call) plus their name, artist and year from /tracks (TRACKS_BATCH_SIZE
+        per call). Returns a DataFrame with one OUTPUT_COLUMNS row per id; ids
+        Spotify doesn't know keep empty values, so they are not asked for again.
+        """
+        rows = {track_id: {'track_id': track_id} for track_id in track_ids}
+        features = self._get('audio-features', track_ids).get('audio_features') or []
+        for track_id, feature in zip(track_ids, features): # Results come back in request order, null for unknown ids
+            if feature: rows[track_id].update({name: feature.get(name) for name in MOOD_FEATURES})
+        if with_tracks:
+            for start in range(0, len(track_ids), TRACKS_BATCH_SIZE):
+                batch = track_ids[start:start + TRACKS_BATCH_SIZE]
+                for track_id, track in zip(batch, self._get('tracks', batch).get('tracks') or []):
+                    if not track: continue
+                    artists = track.get('artists') or []
+                    rows[track_id].update({'track_name': track.get('name'), 'artist_name': artists[0].get('name') if artists else None,
+                                           'year': release_year(track.get('album'))})
+        df = pd.DataFrame(list(rows.values()), columns=OUTPUT_COLUMNS)
+        df['year'] = pd.to_numeric(df['year']).astype('Int64')
+        return df
+
+
+def client_credentials_token_provider():
+    """Returns a callable yielding an app token (client credentials flow, refreshed by spotipy when it expires)."""
+    from spotipy.oauth2 import SpotifyClientCredentials
+    manager = SpotifyClientCredentials(client_id=os.getenv("SPOTIPY_CLIENT_ID"), client_secret=os.getenv("SPOTIPY_CLIENT_SECRET"))
+    return lambda: manager.get_access_token(as_dict=False)
+
+
+def input_signature(input_path):
+    """Identifies the input a checkpoint was written for (path, size and mtime)."""
+    stat = os.stat(input_path)
+    return {'input': os.path.abspath(input_path), 'input_size': stat.st_size, 'input_mtime_ns': stat.st_mtime_ns}
+
+
+def load_checkpoint(checkpoint_path, output_path):
+    """The checkpoint dict if it describes output_path, else None."""
+    if not os.path.exists(checkpoint_path) or not os.path.exists(output_path): return None
+    with open(checkpoint_path) as f: checkpoint = json.load(f)
+    return checkpoint if checkpoint.get('output') == os.path.abspath(output_path) else None
+
+
+def save_checkpoint(checkpoint_path, out, checkpoint):
+    """fsyncs the output and atomically records how many of its bytes are complete."""
+    out.flush(); os.fsync(out.fileno())
+    checkpoint.update({'output_bytes': out.tell(), 'updated_at': time.time()})
+    with open(checkpoint_path + '.tmp', 'w') as f: json.dump(checkpoint, f)
+    os.replace(checkpoint_path + '.tmp', checkpoint_path)
+
+
+def enrich_tracks(input_path, output_path=ENRICH_OUTPUT_PATH, token_provider=None, api_base=SPOTIFY_API_BASE,
+                  workers=ENRICH_WORKERS, batch_size=AUDIO_FEATURES_BATCH_SIZE, with_tracks=True, restart=False):
+    """
+    Fetches audio features (and name/artist/year) for every track id of input_path
+    that lacks features and appends them to output_path, batch_size ids per unit of
+    work with up to workers units in flight. Progress is checkpointed every
+    CHECKPOINT_EVERY batches: a rerun truncates the output to the last checkpoint
+    and skips ids already in it. A batch that still fails after its retries stops
+    the run (its ids are fetched again on resume). Progress is kept per id, so a
+    modified input resumes too (only ids not in the output are fetched); a
+    checkpoint written for a different input file is refused. Returns a stats dict, or None.
+    """
+    checkpoint_path = output_path + CHECKPOINT_SUFFIX
+    track_ids = missing_feature_ids(input_path)
+    print(f"Found {len(track_ids)} track ids without audio features in '{input_path}'.")
+
+    checkpoint = None if restart else load_checkpoint(checkpoint_path, output_path)
+    signature = input_signature(input_path)
+    if checkpoint and checkpoint.get('input') != signature['input']:
+        # The output would mix two datasets' ids
+        print(f"❌ ERROR: Checkpoint '{checkpoint_path}' was written for a different input "
+              f"('{checkpoint.get('input')}'). Rerun with --restart to start over.")
+        return None
+    if checkpoint and any(checkpoint.get(key) != value for key, value in signature.items()):
+        print(f"Warning: '{input_path}' changed since checkpoint '{checkpoint_path}'. Resuming: ids already enriched are kept, "
+              f"new ones are fetched.")
+        checkpoint.update(signature)
+    if checkpoint:
+        with open(output_path, 'r+b') as f: f.truncate(checkpoint['output_bytes']) # Drop rows written after the last checkpoint
+        done = pd.read_csv(output_path, usecols=['track_id'], dtype=str)['track_id']
+        track_ids = track_ids[~pd.Index(track_ids).isin(done)]
+        print(f"Resuming from checkpoint '{checkpoint_path}': {len(done)} ids done, {len(track_ids)} left.")
+    else:
+        if os.path.exists(output_path): print(f"Warning: No usable checkpoint for '{output_path}'. Starting over.")
+        pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(output_path, index=False)
+        checkpoint = dict(signature, output=os.path.abspath(output_path), batches=0, rows=0)
+
+    client = SpotifyBatchClient(token_provider or client_credentials_token_provider(), api_base=api_base, pool_size=workers)
+    batches = (list(track_ids[i:i + batch_size]) for i in range(0, len(track_ids), batch_size))
+    stats = {'ids': len(track_ids), 'rows': 0, 'with_features': 0, 'failed': False}
+    start = time.perf_counter()
+    with open(output_path, 'a', newline='') as out, ThreadPoolExecutor(max_workers=workers, thread_name_prefix='enrich') as pool:
+        in_flight = set(); exhausted = False
+        while True:
+            # Bounded submission: only a few batches past the worker count are ever queued
+            while not exhausted and not stats['failed'] and len(in_flight) < 2 * workers:
+                batch = next(batches, None)
+                if batch is None: exhausted = True; break
+                in_flight.add(pool.submit(client.enrich_batch, batch, with_tracks))
+            if not in_flight: break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                try: rows = future.result()
+                except Exception as e:
+                    if not stats['failed']: print(f"❌ ERROR: Enrichment batch failed, stopping after in-flight batches. {e}")
+                    stats['failed'] = True; continue
+                rows.to_csv(out, header=False, index=False)
+                stats['rows'] += len(rows); stats['with_features'] += int(rows[MOOD_FEATURES].notna().all(axis=1).sum())
+                checkpoint['batches'] += 1; checkpoint['rows'] += len(rows)
+                if checkpoint['batches'] % CHECKPOINT_EVERY == 0:
+                    save_checkpoint(checkpoint_path, out, checkpoint)
+                    print(f"Checkpoint: {checkpoint['rows']} rows written ({stats['rows']}/{stats['ids']} this run, "
+                          f"{client.requests} requests, {client.throttled} throttled).")
+        save_checkpoint(checkpoint_path, out, checkpoint)
+
+    stats.update({'requests': client.requests, 'throttled': client.throttled, 'retries': client.retries,
+                  'seconds': round(time.perf_counter() - start, 3)})
+    if stats['failed']: print(f"❌ Enrichment stopped early; rerun to resume from '{checkpoint_path}'. {stats}")
+    else: print(f"✅ Enriched {stats['rows']} tracks ({stats['with_features']} with audio features) into '{output_path}'. {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Fetch missing audio features for catalog tracks in batched, resumable runs.")
+    parser.add_argument('--input', default=OUTPUT_CSV_PATH, help="CSV with track ids (e.g. the standardized catalog or a raw scrape)")
+    parser.add_argument('--output', default=ENRICH_OUTPUT_PATH, help=f"Enriched rows (checkpoint: <output>{CHECKPOINT_SUFFIX})")
+    parser.add_argument('--api-base', default=SPOTIFY_API_BASE, help="Spotify Web API base URL (e.g. a local fake server)")
+    parser.add_argument('--token', default=os.getenv("SPOTIFY_ACCESS_TOKEN"), help="Access token (default: client credentials from SPOTIPY_CLIENT_ID/SECRET)")
+    parser.add_argument('--workers', type=int, default=ENRICH_WORKERS, help="Batches in flight at once")
+    parser.add_argument('--batch-size', type=int, default=AUDIO_FEATURES_BATCH_SIZE, help="Ids per batch (max 100)")
+    parser.add_argument('--features-only', action='store_true', help="Skip the /tracks calls for name, artist and year")
+    parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint and start over")
+    args = parser.parse_args()
+    enrich_tracks(args.input, args.output, token_provider=(lambda: args.token) if args.token else None, api_base=args.api_base,
+                  workers=args.workers, batch_size=min(args.batch_size, AUDIO_FEATURES_BATCH_SIZE), with_tracks=not args.features_only,
+                  restart=args.restart)
@@ -0,0 +1,99 @@
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from standardize import COLUMN_MAPPING, NUMERIC_COLS, OUTPUT_CSV_PATH, OUTPUT_COLUMNAR_PATH, OUTPUT_FORMATS, clean_column, standardize_dataframe
+from mood_inference import MOOD_LABELS
+
+# --- Configuration ---
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+
+# Sources merged into the catalog (replaces the concat chain in music.ipynb).
+# 'columns' renames source columns to names standardize.py recognises (see
+# COLUMN_MAPPING); columns already named that way are picked up as they are.
+# 'mood_labels' maps numeric model output to mood names.
+# The three raw scrapes (high_popularity_spotify_data.csv, spotifydataset.csv,
+# spotify_tracks_filtered.csv) have no mood column; they enter the catalog
+# through the predicted-mood file score.py writes from them (mood names, or
+# numeric labels in files scored by the older music.ipynb cell).
+SOURCES = [
+    {'path': 'MusicMoodFinal.csv'},
+    {'path': 'predicted_mood_output_new_data.csv', 'mood_labels': {str(k): v for k, v in MOOD_LABELS.items()}},
+]
+
+KNOWN_COLUMNS = [col for options in COLUMN_MAPPING.values() for col in options]
+STRING_COLUMNS = [col for standard_name, options in COLUMN_MAPPING.items() if standard_name not in NUMERIC_COLS for col in options]
+
+
+def load_sources(sources_path):
+    """Reads a JSON list of source specs in the same shape as SOURCES."""
+    with open(sources_path) as f:
+        return json.load(f)
+
+
+def read_source(source):
+    """
+    Reads and cleans one source in a worker process: only the mapped columns,
+    as strings, renamed to standardize.py names. Returns (path, DataFrame or None).
+    """
+    path = source['path']
+    if not os.path.exists(path):
+        print(f"Warning: Source '{path}' not found. Skipping.")
+        return path, None
+    try:
+        renames = source.get('columns') or {}
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [col for col in header if col in renames or col in KNOWN_COLUMNS]
+        df = pd.read_csv(path, usecols=usecols, dtype=str).rename(columns=renames)
+        df = df.loc[:, ~df.columns.duplicated()] # A rename may collide with a column already using that name
+
+        mood_labels = source.get('mood_labels')
+        for col in df.columns:
+            if col in STRING_COLUMNS: df[col] = clean_column(df[col])
+        if mood_labels:
+            for col in COLUMN_MAPPING['Mood']:
+                if col in df.columns:
+                    # Model output may have been written as floats ("1.0"); non-integral values ("1.5") are left as they are
+                    numbers = pd.to_numeric(df[col], errors='coerce')
+                    codes = numbers.where(numbers == numbers.round()).astype('Int64').astype(str)
+                    df[col] = codes.map(mood_labels).fillna(df[col])
+        print(f"Read {len(df)} rows from '{path}' (columns: {list(df.columns)}).")
+        return path, df
+    except Exception as e:
+        print(f"❌ ERROR: Could not read source '{path}'. {e}")
+        return path, None
+
+
+def ingest_sources(sources=SOURCES, max_workers=INGEST_WORKERS):
+    """
+    Reads all sources in a process pool, merges them with a single concat and
+    drops exact duplicate rows by row hash. Returns the merged raw DataFrame.
+    """
+    frames = []
+    with ProcessPoolExecutor(max_workers=max(1, min(max_workers, len(sources)))) as pool:
+        for path, df in pool.map(read_source, sources): # Source order is kept, so the dedupe is deterministic
+            if df is not None and not df.empty: frames.append(df)
+    if not frames:
+        print("❌ ERROR: No source could be read.")
+        return None
+
+    merged = pd.concat(frames, ignore_index=True, sort=False)
+    row_hashes = pd.util.hash_pandas_object(merged, index=False)
+    merged = merged[~row_hashes.duplicated()].reset_index(drop=True)
+    print(f"Merged {sum(len(f) for f in frames)} rows from {len(frames)} sources into {len(merged)} distinct rows.")
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the raw song sources and standardize them in one pass.")
+    parser.add_argument('--sources', default=None, help="JSON file with a list of source specs (default: SOURCES)")
+    parser.add_argument('--output', default=OUTPUT_CSV_PATH, help="Standardized CSV output")
+    parser.add_argument('--format', default='csv', choices=OUTPUT_FORMATS, help="Output format(s) to write")
+    parser.add_argument('--columnar-output', default=OUTPUT_COLUMNAR_PATH, help="Compiled catalog output")
+    parser.add_argument('--workers', type=int, default=INGEST_WORKERS, help="Processes reading sources")
+    args = parser.parse_args()
+
+    merged = ingest_sources(load_sources(args.sources) if args.sources else SOURCES, max_workers=args.workers)
+    if merged is not None:
+        standardize_dataframe(merged, args.output, output_format=args.format, columnar_path=args.columnar_output)
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configuration ---
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "8")) # Background playlist generations per process
+JOB_TTL = int(os.getenv("JOB_TTL", "900")) # Seconds a finished job's events stay available for reconnects
+SSE_KEEPALIVE = 15 # Seconds between keep-alive comments on an idle event stream
+SSE_POLL_INTERVAL = float(os.getenv("SSE_POLL_INTERVAL", "0.25")) # Seconds between reads of the shared event log
+FINAL_EVENTS = ('done', 'error') # Events that end a job's stream
+
+
+class PlaylistJob:
+    """
+    A background playlist generation. Events are appended in order; each one
+    also goes to sink(job_id, event_id, event, data), the shared event log
+    (MixStore) that any worker's SSE route tails, so the stream does not
+    depend on which worker runs the job.
+    """
+
+    def __init__(self, job_id, owner=None, sink=None):
+        self.id = job_id
+        self.owner = owner # Session uuid of the user who started the job
+        self.events = [] # (event name, data dict); the list position is the SSE event id
+        self.done = False
+        self.finished_at = None
+        self._sink = sink
+        self._lock = threading.Lock()
+
+    def _append(self, event, data):
+        with self._lock:
+            self.events.append((event, data))
+            event_id = len(self.events) - 1
+        if self._sink: self._sink(self.id, event_id, event, data)
+
+    def publish(self, event, data):
+        self._append(event, data)
+
+    def finish(self, event='done', data=None):
+        """Publishes the final event and marks the job as done."""
+        self._append(event, data or {})
+        self.done = True
+        self.finished_at = time.time()
+
+
+def stream_events(store, job_id, last_event_id=-1, poll=SSE_POLL_INTERVAL, keepalive=SSE_KEEPALIVE):
+    """
+    Yields a job's Server-Sent Events from the shared event log until its final
+    event. Works from any worker: the log is polled, not waited on in memory.
+    A job whose mix stopped being pending without a final event (its worker
+    died) ends with an error event.
+    """
+    after = last_event_id; idle_since = time.monotonic()
+    while True:
+        new = store.events(job_id, after)
+        for event_id, event, data in new:
+            yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+            after = event_id
+            if event in FINAL_EVENTS: return
+        if new:
+            idle_since = time.monotonic(); continue
+        if time.monotonic() - idle_since >= keepalive:
+            mix = store.get(job_id)
+            if mix is None or mix['status'] != 'pending':
+                if not store.events(job_id, after): # Re-checked: the final event may have landed meanwhile
+                    yield f"id: {after + 1}\nevent: error\ndata: {json.dumps({'message': (mix or {}).get('message') or 'Playlist job not found.'})}\n\n"
+                    return
+                continue
+            yield ": keep-alive\n\n"
+            idle_since = time.monotonic()
+        time.sleep(poll)
+
+
+class JobRegistry:
+    """
+    In-process registry of generation jobs plus the thread pool that runs them.
+    Events are written through sink (see PlaylistJob) for the other workers.
+    """
+
+    def __init__(self, max_workers=GENERATION_WORKERS, ttl=JOB_TTL, sink=None):
+        self.ttl = ttl
+        self.sink = sink
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='playlist-job')
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [j.id for j in self._jobs.values() if j.done and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _register(self, owner, job_id):
+        job = PlaylistJob(job_id or os.urandom(8).hex(), owner=owner, sink=self.sink)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        return job
+
+    @staticmethod
+    def _end(job, error=None):
+        if error is not None:
+            print(f"Unexpected error in background job {job.id}: {error}")
+            import traceback; traceback.print_exception(error)
+            if not job.done: job.finish('error', {'message': "Unexpected server error."})
+        if not job.done: job.finish()
+
+    def submit(self, fn, *args, owner=None, job_id=None):
+        """Creates a job and runs fn(job, *args) in the background. Unhandled errors end the job."""
+        job = self._register(owner, job_id)
+
+        def run():
+            try: fn(job, *args)
+            except Exception as e: self._end(job, e)
+            finally: self._end(job)
+
+        self._executor.submit(run)
+        return job
+
+    def submit_async(self, coro_fn, *args, owner=None, job_id=None):
+        """Like submit, but awaits coro_fn(job, *args) on the shared event loop instead of taking a pool thread."""
+        import aio
+        job = self._register(owner, job_id)
+
+        async def run():
+            try: await coro_fn(job, *args)
+            except Exception as e: self._end(job, e)
+            finally: self._end(job)
+
+        aio.submit(run())
+        return job
+
+    def get(self, job_id):
+        with self._lock: return self._jobs.get(job_id)
@@ -0,0 +1,130 @@
+import os
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+
+# --- Configuration ---
+# Upper bounds (seconds) of the latency histogram buckets
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "spotigai")
+
+_timing_local = threading.local() # Per-request list of (stage, seconds) for the Server-Timing header
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels: return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock: self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock: return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock: values = sorted(self._values.items())
+        lines += [f"{self.name}{_format_labels(key)} {value}" for key, value in values]
+        return lines
+
+
+class Histogram:
+    """Latency histogram with fixed buckets and optional labels."""
+
+    def __init__(self, name, help_text, buckets=METRICS_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {} # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, **labels):
+        key = tuple(sorted(labels.items()))
+        position = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            if position < len(self.buckets): series[position] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock: series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {values[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {values[-1]}")
+        return lines
+
+
+# --- Process-wide metrics (each worker process exposes its own) ---
+stage_seconds = Histogram(f"{METRICS_PREFIX}_stage_seconds", "Time spent per pipeline stage.")
+youtube_cache_hits = Counter(f"{METRICS_PREFIX}_youtube_cache_hits_total", "Tracks resolved from the persistent video cache.")
+youtube_api_calls = Counter(f"{METRICS_PREFIX}_youtube_api_calls_total", "YouTube search API calls made.")
+youtube_quota_errors = Counter(f"{METRICS_PREFIX}_youtube_quota_errors_total", "YouTube 403 responses and calls refused by the quota breaker.")
+spotify_api_calls = Counter(f"{METRICS_PREFIX}_spotify_api_calls_total", "Spotify API calls made, by endpoint.")
+tracks_resolved = Counter(f"{METRICS_PREFIX}_tracks_resolved_total", "Tracks resolved to a YouTube video.")
+warm_pool_hits = Counter(f"{METRICS_PREFIX}_warm_pool_hits_total", "Catalog tracks served from a warm pool without any lookup.")
+ALL_METRICS = [stage_seconds, youtube_cache_hits, youtube_api_calls, youtube_quota_errors, spotify_api_calls, tracks_resolved, warm_pool_hits]
+
+
+@contextmanager
+def span(stage):
+    """Times a stage into the stage histogram and, inside a request, the Server-Timing header."""
+    start = time.perf_counter()
+    try: yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=stage)
+        timings = getattr(_timing_local, 'timings', None)
+        if timings is not None: timings.append((stage, elapsed))
+
+
+def timed(stage):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage): return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_request_timing():
+    """Starts collecting spans for the current request thread."""
+    _timing_local.timings = []
+
+
+def finish_request_timing():
+    """Stops collecting and returns the Server-Timing header value ('' if no spans ran)."""
+    timings = getattr(_timing_local, 'timings', None) or []
+    _timing_local.timings = None
+    totals = {} # Repeated stages (e.g. several YouTube searches) are summed
+    for stage, seconds in timings: totals[stage] = totals.get(stage, 0.0) + seconds
+    return ', '.join(f"{stage.replace('.', '-')};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    return '\n'.join(line for metric in ALL_METRICS for line in metric.render()) + '\n'
@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import secrets
+import sqlite3
+import threading
+
+# --- Configuration ---
+MIX_STORE_PATH = os.getenv("MIX_STORE_PATH", "mixes.sqlite3") # SQLite file shared by all workers
+MIX_MAX_AGE = int(os.getenv("MIX_MAX_AGE", str(90 * 24 * 3600))) # Mixes older than this are pruned
+MIX_PENDING_TIMEOUT = int(os.getenv("MIX_PENDING_TIMEOUT", "900")) # A mix still pending after this long is treated as failed
+MIX_EVENT_TTL = int(os.getenv("MIX_EVENT_TTL", os.getenv("JOB_TTL", "900"))) # Seconds a finished mix's stream events are kept for reconnects
+PRUNE_EVERY = 200 # Prune old mixes every N writes
+
+
+def new_mix_id():
+    """Short URL-safe id for /mix/<id> (48 random bits)."""
+    return secrets.token_urlsafe(6)
+
+
+class MixStore:
+    """
+    Generated mood mixes (ordered video id, track name, YouTube title) by short id.
+
+    /generate reserves a 'pending' mix, the background job completes or fails
+    it, and /mix/<id> serves completed mixes straight from here. While the job
+    runs its SSE events are logged here too, so any worker can stream them.
+    """
+
+    def __init__(self, path=MIX_STORE_PATH, max_age=MIX_MAX_AGE, pending_timeout=MIX_PENDING_TIMEOUT, event_ttl=MIX_EVENT_TTL):
+        self.path = path
+        self.max_age = max_age
+        self.pending_timeout = pending_timeout
+        self.event_ttl = event_ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._connect().execute('''CREATE TABLE IF NOT EXISTS mixes (
+                                       mix_id TEXT PRIMARY KEY,
+                                       owner TEXT,
+                                       mood TEXT,
+                                       status TEXT NOT NULL,
+                                       tracks TEXT,
+                                       message TEXT,
+                                       created_at REAL NOT NULL,
+                                       updated_at REAL NOT NULL)''')
+        self._connect().execute('''CREATE TABLE IF NOT EXISTS mix_events (
+                                       mix_id TEXT NOT NULL,
+                                       event_id INTEGER NOT NULL,
+                                       event TEXT NOT NULL,
+                                       data TEXT NOT NULL,
+                                       created_at REAL NOT NULL,
+                                       PRIMARY KEY (mix_id, event_id))''')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _write(self, sql, params):
+        try:
+            conn = self._connect()
+            conn.execute(sql, params)
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM mixes WHERE updated_at < ?', (time.time() - self.max_age,))
+                conn.execute('DELETE FROM mix_events WHERE created_at < ?', (time.time() - max(self.event_ttl, self.pending_timeout),))
+        except sqlite3.Error as e:
+            print(f"Warning: Mix store write failed. Error: {e}")
+
+    def reserve(self, mix_id, owner=None, mood=None):
+        now = time.time()
+        self._write('INSERT INTO mixes (mix_id, owner, mood, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (mix_id, owner, mood, 'pending', now, now))
+
+    def complete(self, mix_id, tracks):
+        """Stores the final ordered tracks: dicts with video_id, track_name and youtube_title."""
+        self._write("UPDATE mixes SET status = 'done', tracks = ?, updated_at = ? WHERE mix_id = ?",
+                    (json.dumps(tracks), time.time(), mix_id))
+
+    def fail(self, mix_id, message):
+        self._write("UPDATE mixes SET status = 'error', message = ?, updated_at = ? WHERE mix_id = ?",
+                    (message, time.time(), mix_id))
+
+    def append_event(self, mix_id, event_id, event, data):
+        """Logs one SSE event of the job generating mix_id (a PlaylistJob sink)."""
+        self._write('INSERT OR REPLACE INTO mix_events (mix_id, event_id, event, data, created_at) VALUES (?, ?, ?, ?, ?)',
+                    (mix_id, event_id, event, json.dumps(data), time.time()))
+
+    def events(self, mix_id, after=-1):
+        """Logged events of mix_id with event_id > after, as (event_id, event, data), in order."""
+        try:
+            rows = self._connect().execute('SELECT event_id, event, data FROM mix_events WHERE mix_id = ? AND event_id > ? ORDER BY event_id',
+                                           (mix_id, after)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Warning: Mix store read failed. Error: {e}")
+            return []
+        return [(event_id, event, json.loads(data)) for event_id, event, data in rows]
+
+    def get(self, mix_id):
+        """The mix as a dict (tracks decoded), or None if unknown."""
+        try:
+            row = self._connect().execute('SELECT owner, mood, status, tracks, message, created_at, updated_at FROM mixes WHERE mix_id = ?',
+                                          (mix_id,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Warning: Mix store read failed. Error: {e}")
+            return None
+        if not row: return None
+        owner, mood, status, tracks, message, created_at, updated_at = row
+        if status == 'pending' and created_at < time.time() - self.pending_timeout:
+            status, message = 'error', "This mix was never finished." # The worker running it stopped
+        return {'id': mix_id, 'owner': owner, 'mood': mood, 'status': status, 'tracks': json.loads(tracks) if tracks else [],
+                'message': message, 'created_at': created_at, 'updated_at': updated_at}
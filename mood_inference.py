@@ -0,0 +1,166 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import numpy as np # Import numpy for the feature matrix
+
+# --- Configuration ---
+MOOD_MODEL_PATH = os.getenv("MOOD_MODEL_PATH", 'random_forest_mood_model_update.joblib') # Trained in recom.ipynb
+MOOD_SCALER_PATH = os.getenv("MOOD_SCALER_PATH", 'mood_scaler.joblib') # Scaler fitted on the training features
+MOOD_PREDICTION_CACHE_SIZE = int(os.getenv("MOOD_PREDICTION_CACHE_SIZE", "100000"))
+
+# Features the model was trained on, in training order
+MOOD_FEATURES = ['danceability', 'energy', 'loudness', 'speechiness', 'acousticness',
+                 'instrumentalness', 'liveness', 'valence', 'tempo']
+# Numeric labels used when training (see recom.ipynb)
+MOOD_LABELS = {0: 'Calm', 1: 'Happy', 2: 'Sad', 3: 'Energetic'}
+AUDIO_FEATURES_BATCH_SIZE = 100 # Max ids per audio-features request
+AUDIO_FEATURES_WORKERS = 4
+
+
+def load_mood_model(model_path=MOOD_MODEL_PATH, scaler_path=MOOD_SCALER_PATH):
+    """Loads (model, scaler). Returns (None, None) if either file or joblib/scikit-learn is missing."""
+    try:
+        import joblib
+    except ImportError:
+        print("Warning: joblib/scikit-learn not installed. Mood inference disabled.")
+        return None, None
+    for path in (model_path, scaler_path):
+        if not os.path.exists(path):
+            print(f"Warning: Mood inference file '{path}' not found. Mood inference disabled.")
+            return None, None
+    try:
+        model, scaler = joblib.load(model_path), joblib.load(scaler_path)
+        print(f"Loaded mood model '{model_path}' and scaler '{scaler_path}'.")
+        return model, scaler
+    except Exception as e:
+        print(f"❌ ERROR: Could not load mood model or scaler. {e}")
+        return None, None
+
+
+def feature_columns(scaler):
+    """Column order the scaler was fitted with (falls back to MOOD_FEATURES)."""
+    names = getattr(scaler, 'feature_names_in_', None)
+    return list(names) if names is not None else MOOD_FEATURES
+
+
+def scale_features(scaler, features_df):
+    """Applies the training scaler to features_df in the column order it was fitted with."""
+    X = features_df[feature_columns(scaler)]
+    if not hasattr(scaler, 'feature_names_in_'): X = X.to_numpy(dtype=np.float64) # Scaler was fitted on a plain array
+    return scaler.transform(X)
+
+
+def mood_label(prediction):
+    """Mood name for a model class (numeric training labels are mapped through MOOD_LABELS)."""
+    return prediction if isinstance(prediction, str) else MOOD_LABELS.get(prediction, prediction)
+
+
+def predict_mood_labels(model, scaler, features_df):
+    """Scales with the training scaler and predicts in one vectorized call. Returns mood label strings."""
+    predictions = model.predict(scale_features(scaler, features_df))
+    return [mood_label(p) for p in predictions.tolist()]
+
+
+def predict_mood_probabilities(model, scaler, features_df):
+    """
+    (mood labels, DataFrame of class probabilities with one column per mood label)
+    from a single predict_proba call; the label is the most probable class.
+    """
+    probabilities = model.predict_proba(scale_features(scaler, features_df))
+    labels = [mood_label(c) for c in model.classes_.tolist()]
+    return [labels[i] for i in probabilities.argmax(axis=1)], pd.DataFrame(probabilities, columns=labels, index=features_df.index)
+
+
+class MoodPredictor:
+    """
+    Infers moods for user-playlist tracks. Tracks already in the catalog use
+    its label; the rest get their audio features fetched in batches and are
+    predicted together in a single call. Predictions are cached by track id.
+    """
+
+    def __init__(self, model_path=MOOD_MODEL_PATH, scaler_path=MOOD_SCALER_PATH, cache_size=MOOD_PREDICTION_CACHE_SIZE):
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.cache_size = cache_size
+        self._model = None; self._scaler = None; self._loaded = False
+        self._load_lock = threading.Lock()
+        self._cache = OrderedDict() # track_id -> mood label, or None when Spotify had no features
+        self._cache_lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._model, self._scaler = load_mood_model(self.model_path, self.scaler_path)
+                    self._loaded = True
+        return self._model is not None
+
+    def _cache_get_many(self, track_ids):
+        found = {}
+        with self._cache_lock:
+            for track_id in track_ids:
+                if track_id in self._cache:
+                    self._cache.move_to_end(track_id)
+                    found[track_id] = self._cache[track_id]
+        return found
+
+    def _cache_put_many(self, predictions):
+        with self._cache_lock:
+            self._cache.update(predictions)
+            for track_id in predictions: self._cache.move_to_end(track_id)
+            while len(self._cache) > self.cache_size: self._cache.popitem(last=False)
+
+    def fetch_audio_features(self, sp, track_ids):
+        """
+        Fetches audio features in batches of AUDIO_FEATURES_BATCH_SIZE ids.
+        Returns (DataFrame indexed by id, ids whose batch request failed).
+        """
+        batches = [track_ids[i:i + AUDIO_FEATURES_BATCH_SIZE] for i in range(0, len(track_ids), AUDIO_FEATURES_BATCH_SIZE)]
+
+        def fetch(batch):
+            try: return [f for f in (sp.audio_features(batch) or []) if f and f.get('id')]
+            except Exception as e: print(f"Warning: Could not fetch audio features for {len(batch)} tracks. Error: {e}"); return None
+
+        rows = []; failed_ids = []
+        with ThreadPoolExecutor(max_workers=AUDIO_FEATURES_WORKERS, thread_name_prefix='audio-features') as pool:
+            for batch, batch_rows in zip(batches, pool.map(fetch, batches)):
+                if batch_rows is None: failed_ids.extend(batch)
+                else: rows.extend(batch_rows)
+        if not rows: return pd.DataFrame(columns=MOOD_FEATURES), failed_ids
+        df = pd.DataFrame(rows).drop_duplicates(subset='id').set_index('id')
+        return df.reindex(columns=MOOD_FEATURES).dropna(), failed_ids
+
+    def predict_moods(self, sp, tracks, catalog=None):
+        """Returns {track_id: mood label or None} for the given tracks."""
+        track_ids = list(dict.fromkeys(t['id'] for t in tracks if t.get('id')))
+        moods = {}
+        if not track_ids: return moods
+
+        # 1. Tracks that are already in the catalog keep their labelled mood
+        if catalog is not None and len(catalog) > 0:
+            rows = catalog.rows_for_ids(track_ids)
+            for track_id, row in zip(track_ids, rows):
+                if row >= 0: moods[track_id] = catalog.mood_at(row)
+
+        # 2. Previously predicted tracks
+        remaining = [track_id for track_id in track_ids if track_id not in moods]
+        moods.update(self._cache_get_many(remaining))
+        remaining = [track_id for track_id in remaining if track_id not in moods]
+        if not remaining or not self._ensure_loaded(): return moods
+
+        # 3. One batched prediction for everything else
+        features, failed_ids = self.fetch_audio_features(sp, remaining)
+        failed = set(failed_ids) # Failed requests are retried next time, not cached
+        predictions = dict.fromkeys(track_id for track_id in remaining if track_id not in failed) # No features: cached as None
+        if not features.empty:
+            try:
+                predictions.update(zip(features.index, predict_mood_labels(self._model, self._scaler, features)))
+            except Exception as e:
+                print(f"❌ ERROR: Mood prediction failed. {e}")
+                return moods
+        print(f"Predicted moods for {len(features)} of {len(remaining)} uncached playlist tracks in one batch.")
+        self._cache_put_many(predictions)
+        moods.update(predictions)
+        return moods
@@ -0,0 +1,34 @@
+import os
+import threading
+from collections import OrderedDict
+
+# --- Configuration ---
+PLAYLIST_CACHE_MAX_ENTRIES = int(os.getenv("PLAYLIST_CACHE_MAX_ENTRIES", "256"))
+
+
+class PlaylistTrackCache:
+    """
+    Per-process LRU of processed playlist tracks, keyed by playlist id and
+    valid only for the Spotify snapshot_id they were fetched at.
+    """
+
+    def __init__(self, max_entries=PLAYLIST_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # playlist_id -> (snapshot_id, tracks)
+        self._lock = threading.Lock()
+
+    def get(self, playlist_id, snapshot_id):
+        """Returns the cached track list if it was stored for this snapshot, else None."""
+        if not snapshot_id: return None
+        with self._lock:
+            entry = self._entries.get(playlist_id)
+            if entry is None or entry[0] != snapshot_id: return None
+            self._entries.move_to_end(playlist_id)
+            return entry[1]
+
+    def put(self, playlist_id, snapshot_id, tracks):
+        if not snapshot_id: return
+        with self._lock:
+            self._entries[playlist_id] = (snapshot_id, tracks)
+            self._entries.move_to_end(playlist_id)
+            while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
@@ -0,0 +1,109 @@
+import os
+import time
+import sqlite3
+import datetime
+import threading
+from video_cache import YOUTUBE_CACHE_PATH
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles") # YouTube quota resets at midnight Pacific Time
+except Exception:
+    QUOTA_TIMEZONE = datetime.timezone(datetime.timedelta(hours=-8))
+
+# --- Configuration ---
+YOUTUBE_QUOTA_PATH = os.getenv("YOUTUBE_QUOTA_PATH", YOUTUBE_CACHE_PATH) # Shared SQLite file (same as the video cache by default)
+YOUTUBE_DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000")) # Units per day for the API key
+YOUTUBE_SEARCH_COST = 100 # Units charged for one search().list call
+YOUTUBE_QUOTA_COOLDOWN = int(os.getenv("YOUTUBE_QUOTA_COOLDOWN", "1800")) # Seconds the breaker stays open after a 403
+
+
+def quota_day(now=None):
+    """Quota day (Pacific date) for a timestamp."""
+    return datetime.datetime.fromtimestamp(now or time.time(), QUOTA_TIMEZONE).date().isoformat()
+
+
+class QuotaLedger:
+    """
+    Cross-worker YouTube quota budget and circuit breaker.
+
+    Units spent per quota day are counted in a SQLite table shared by every
+    worker. A 403 from the API trips the breaker for a cooldown; while it is
+    open (or the day's budget is spent) try_spend() refuses, so callers can
+    fall back to cached results instead of making calls that will fail.
+    """
+
+    def __init__(self, path=YOUTUBE_QUOTA_PATH, daily_budget=YOUTUBE_DAILY_QUOTA, cooldown=YOUTUBE_QUOTA_COOLDOWN):
+        self.path = path
+        self.daily_budget = daily_budget
+        self.cooldown = cooldown
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS quota_usage (day TEXT PRIMARY KEY, spent INTEGER NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS quota_breaker (id INTEGER PRIMARY KEY CHECK (id = 1), open_until REAL NOT NULL, reason TEXT)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _open_until(self, conn):
+        row = conn.execute('SELECT open_until FROM quota_breaker WHERE id = 1').fetchone()
+        return row[0] if row else 0.0
+
+    def try_spend(self, units=YOUTUBE_SEARCH_COST):
+        """Reserves units for one API call. Returns False if the breaker is open or the budget is spent."""
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE') # Serializes check-and-spend across workers
+            try:
+                if self._open_until(conn) > time.time(): return False
+                day = quota_day()
+                row = conn.execute('SELECT spent FROM quota_usage WHERE day = ?', (day,)).fetchone()
+                spent = row[0] if row else 0
+                if spent + units > self.daily_budget: return False
+                conn.execute('INSERT OR REPLACE INTO quota_usage (day, spent) VALUES (?, ?)', (day, spent + units))
+                return True
+            finally:
+                conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            print(f"Warning: Quota ledger unavailable, allowing call. Error: {e}")
+            return True
+
+    def trip(self, reason="YouTube API returned 403", cooldown=None):
+        """Opens the breaker for the cooldown period."""
+        open_until = time.time() + (self.cooldown if cooldown is None else cooldown)
+        try:
+            self._connect().execute('INSERT OR REPLACE INTO quota_breaker (id, open_until, reason) VALUES (1, ?, ?)', (open_until, reason))
+            print(f"🛑 YouTube quota breaker open for {int(open_until - time.time())}s: {reason}")
+        except sqlite3.Error as e:
+            print(f"Warning: Could not record quota breaker state. Error: {e}")
+
+    def is_open(self):
+        try: return self._open_until(self._connect()) > time.time()
+        except sqlite3.Error: return False
+
+    def remaining(self):
+        """Units left in today's budget."""
+        try:
+            row = self._connect().execute('SELECT spent FROM quota_usage WHERE day = ?', (quota_day(),)).fetchone()
+        except sqlite3.Error: row = None
+        return max(0, self.daily_budget - (row[0] if row else 0))
+
+    def status(self):
+        """Snapshot of the budget and breaker, for the /quota endpoint."""
+        try: open_until = self._open_until(self._connect())
+        except sqlite3.Error: open_until = 0.0
+        remaining = self.remaining()
+        return {
+            'day': quota_day(),
+            'daily_budget': self.daily_budget,
+            'spent': self.daily_budget - remaining,
+            'remaining': remaining,
+            'remaining_searches': remaining // YOUTUBE_SEARCH_COST,
+            'breaker_open': open_until > time.time(),
+            'breaker_retry_in': max(0, int(open_until - time.time())),
+        }
@@ -0,0 +1,169 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# --- Configuration ---
+YOUTUBE_RESOLVE_WORKERS = int(os.getenv("YOUTUBE_RESOLVE_WORKERS", "4")) # Concurrent searches per request
+YOUTUBE_RATE_LIMIT = float(os.getenv("YOUTUBE_RATE_LIMIT", "10")) # Max API searches per second per process (0 = unlimited)
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads of the process."""
+
+    def __init__(self, rate=YOUTUBE_RATE_LIMIT):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Claims the next slot and returns how many seconds to wait for it."""
+        if not self.interval: return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        return slot - now
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0: time.sleep(delay)
+
+    async def wait_async(self):
+        delay = self.reserve()
+        if delay > 0: await asyncio.sleep(delay)
+
+
+class ResolveResult:
+    """Outcome of a resolver run. hits is a list of (track, video_info) in candidate order."""
+
+    def __init__(self):
+        self.hits = []
+        self.attempts = 0
+        self.cache_hits = 0
+        self.stopped = False # True when stop_on() matched an error (e.g. YouTube quota 403)
+
+    @property
+    def video_ids(self): return [video['id'] for _, video in self.hits]
+
+    @property
+    def track_names(self): return [f"{track.get('artist', 'N/A')} - {track.get('name', 'N/A')}" for track, _ in self.hits]
+
+    @property
+    def youtube_titles(self): return [video['title'] for _, video in self.hits]
+
+
+def candidate_queue(candidates):
+    """Searchable candidates (id, name and artist present), first occurrence of each id only."""
+    queue = []
+    seen_ids = set()
+    for track in candidates:
+        track_id = track.get('id')
+        if not track_id or not track.get('name') or not track.get('artist') or track_id in seen_ids: continue
+        seen_ids.add(track_id)
+        queue.append(track)
+    return queue
+
+
+class _ResolveRun:
+    """
+    Bookkeeping shared by resolve_tracks and resolve_tracks_async: which
+    candidates to start, outcome handling, in-order release and stop_on.
+    """
+
+    def __init__(self, candidates, target, stop_on, on_hit, log):
+        self.result = ResolveResult()
+        self.target = len(candidates) if target is None else target
+        self.queue = candidate_queue(candidates)
+        self.stop_on = stop_on; self.on_hit = on_hit; self.log = log
+        self.outcomes = {} # candidate index -> video_info or None
+        self.next_submit = 0; self.next_release = 0; self.found = 0
+
+    def empty(self):
+        return self.target <= 0 or not self.queue
+
+    def to_submit(self, in_flight, limit):
+        """(index, track) pairs to start now: at most limit in flight, and no more than are still needed to reach target."""
+        while not self.result.stopped and self.next_submit < len(self.queue) and in_flight < limit and self.found + in_flight < self.target:
+            index = self.next_submit; track = self.queue[index]
+            self.log(f"  Attempt {index + 1}: Searching '{track.get('artist')} - {track.get('name')}'")
+            self.next_submit += 1; self.result.attempts += 1; in_flight += 1
+            yield index, track
+
+    def settle(self, index, done):
+        """Records the outcome of a finished future or task for candidate index."""
+        video_info = None
+        try:
+            video_info, from_cache = done.result()
+            if from_cache: self.result.cache_hits += 1
+            if video_info:
+                self.found += 1
+                self.log(f"    -> SUCCESS [{self.found} found]{' (cached)' if from_cache else ''}: {self.queue[index].get('name')}")
+            else: self.log(f"    -> FAILED: Video not found for '{self.queue[index].get('name')}'.")
+        except Exception as e:
+            if self.stop_on and self.stop_on(e):
+                self.log(f"🛑 Stopping YouTube resolution: {e}")
+                self.result.stopped = True
+            else: self.log(f"  - Unexpected YT search error: {e}")
+        self.outcomes[index] = video_info
+
+    def release_ready(self):
+        """Hands out hits strictly in candidate order as soon as every earlier candidate is settled."""
+        while self.next_release in self.outcomes and len(self.result.hits) < self.target:
+            video_info = self.outcomes.pop(self.next_release)
+            if video_info:
+                track = self.queue[self.next_release]
+                self.result.hits.append((track, video_info))
+                if self.on_hit: self.on_hit(track, video_info)
+            self.next_release += 1
+
+
+def resolve_tracks(candidates, resolve_fn, target=None, max_workers=YOUTUBE_RESOLVE_WORKERS,
+                   stop_on=None, on_hit=None, log=print):
+    """
+    Resolves candidates concurrently with resolve_fn(track) -> (video_info or None, from_cache).
+
+    Candidates are tried in order; a miss falls through to the next spare
+    candidate, and no more searches are in flight than are still needed to
+    reach target hits. Hits are returned (and passed to on_hit) in the
+    original candidate order. If resolve_fn raises an exception for which
+    stop_on(exc) is true, no new searches are started and the run ends.
+    """
+    run = _ResolveRun(candidates, target, stop_on, on_hit, log)
+    if run.empty(): return run.result
+    max_workers = max(1, max_workers)
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='yt-resolve') as pool:
+        while True:
+            for index, track in run.to_submit(len(in_flight), max_workers):
+                in_flight[pool.submit(resolve_fn, track)] = index
+            if not in_flight: break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done: run.settle(in_flight.pop(future), future)
+            run.release_ready()
+    return run.result
+
+
+async def resolve_tracks_async(candidates, resolve_fn, target=None, max_concurrency=YOUTUBE_RESOLVE_WORKERS,
+                               stop_on=None, on_hit=None, log=print):
+    """
+    Coroutine twin of resolve_tracks for the async I/O mode: resolve_fn is a
+    coroutine function and searches are tasks on the running loop instead of
+    pool threads. Submission, fall-through and in-order release are the same,
+    so both return the same hits for the same outcomes.
+    """
+    run = _ResolveRun(candidates, target, stop_on, on_hit, log)
+    if run.empty(): return run.result
+    max_concurrency = max(1, max_concurrency)
+
+    in_flight = {}
+    while True:
+        for index, track in run.to_submit(len(in_flight), max_concurrency):
+            in_flight[asyncio.ensure_future(resolve_fn(track))] = index
+        if not in_flight: break
+        done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        for task in done: run.settle(in_flight.pop(task), task)
+        run.release_ready()
+    return run.result
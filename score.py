@@ -0,0 +1,116 @@
+import os
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np # Import numpy for the feature matrix
+from standardize import COLUMN_MAPPING, STREAM_CHUNK_SIZE
+from mood_inference import MOOD_MODEL_PATH, MOOD_SCALER_PATH, load_mood_model, feature_columns, mood_label, predict_mood_probabilities
+
+# --- Configuration ---
+SCORE_INPUT_PATH = 'final_combined_spotify_data.csv' # The unlabelled scrapes merged in music.ipynb (or enrich.py output)
+SCORE_OUTPUT_PATH = 'predicted_mood_output_new_data.csv' # Picked up by ingest.py's SOURCES
+SCORE_WORKERS = int(os.getenv("SCORE_WORKERS", str(os.cpu_count() or 1)))
+SCORE_CHUNK_SIZE = STREAM_CHUNK_SIZE
+PROBABILITY_PREFIX = 'mood_prob_' # Class probability columns: mood_prob_Calm, mood_prob_Happy, ...
+
+# Source columns carried into the output: everything standardize.py maps, nothing else
+KNOWN_COLUMNS = [col for options in COLUMN_MAPPING.values() for col in options]
+
+_model = None; _scaler = None # Loaded once per worker process
+
+
+def init_worker(model_path, scaler_path):
+    """Pool initializer: loads the model and training scaler into this worker process."""
+    global _model, _scaler
+    _model, _scaler = load_mood_model(model_path, scaler_path)
+    if _model is not None and hasattr(_model, 'n_jobs'): _model.n_jobs = 1 # Parallelism comes from the process pool
+
+
+def score_chunk(chunk, header=False):
+    """
+    Predicts moods for one chunk (read as strings) with the persisted training
+    scaler and returns (CSV text, rows scored). Source values pass through
+    unchanged and the CSV is formatted here, so the parent only concatenates.
+    Rows missing any model feature keep an empty Predicted_Mood (standardize.py
+    drops them). A Mood column already in the input is replaced by the prediction.
+    """
+    features = chunk[feature_columns(_scaler)].apply(pd.to_numeric, errors='coerce')
+    complete = features.notna().all(axis=1).to_numpy()
+    scored = chunk.drop(columns=[col for col in COLUMN_MAPPING['Mood'] if col in chunk.columns])
+    classes = [mood_label(c) for c in _model.classes_.tolist()]
+    moods = np.full(len(chunk), '', dtype=object)
+    probabilities = np.full((len(chunk), len(classes)), np.nan) # Same columns in every chunk, empty where unscored
+    if complete.any():
+        labels, class_probabilities = predict_mood_probabilities(_model, _scaler, features[complete])
+        moods[complete] = labels
+        probabilities[complete] = class_probabilities[classes].to_numpy()
+    scored['Predicted_Mood'] = moods
+    for i, label in enumerate(classes): scored[f'{PROBABILITY_PREFIX}{label}'] = probabilities[:, i].round(4)
+    return scored.to_csv(index=False, header=header), int(complete.sum())
+
+
+def score_catalog(input_path=SCORE_INPUT_PATH, output_path=SCORE_OUTPUT_PATH, model_path=MOOD_MODEL_PATH, scaler_path=MOOD_SCALER_PATH,
+                  workers=SCORE_WORKERS, chunksize=SCORE_CHUNK_SIZE):
+    """
+    Streams input_path in chunks through a process pool and writes each row with
+    Predicted_Mood and its class probabilities, in input order, to output_path.
+    At most workers + 1 chunks are read ahead, so memory stays bounded by
+    chunksize whatever the input size. Returns the number of rows scored.
+    """
+    if not os.path.exists(input_path):
+        print(f"❌ ERROR: Input file not found at '{input_path}'.")
+        return None
+    model, scaler = load_mood_model(model_path, scaler_path) # Checked here rather than failing in every worker
+    if model is None:
+        print("❌ ERROR: Scoring needs the trained model and the scaler fitted on its training data (see recom.ipynb).")
+        return None
+    header = pd.read_csv(input_path, nrows=0).columns
+    missing = [col for col in feature_columns(scaler) if col not in header]
+    del model, scaler # Workers load their own copies
+    if missing:
+        print(f"❌ ERROR: '{input_path}' lacks model features: {', '.join(missing)}")
+        return None
+
+    usecols = [col for col in header if col in KNOWN_COLUMNS]
+    reader = pd.read_csv(input_path, usecols=usecols, dtype=str, chunksize=chunksize)
+    workers = max(1, workers)
+    tmp_output = output_path + '.tmp'
+    chunks = 0; scored_total = 0; start = time.perf_counter()
+    print(f"--- Scoring '{input_path}' in chunks of {chunksize} rows on {workers} processes ---")
+    try:
+        with open(tmp_output, 'w', newline='') as out, \
+             ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(model_path, scaler_path)) as pool:
+            pending = deque(); total = 0
+            for chunk in reader:
+                pending.append(pool.submit(score_chunk, chunk, chunks == 0)); chunks += 1; total += len(chunk)
+                while len(pending) > workers or (pending and pending[0].done()):
+                    text, n = pending.popleft().result() # Written in submission order
+                    out.write(text); scored_total += n
+            while pending:
+                text, n = pending.popleft().result()
+                out.write(text); scored_total += n
+        if chunks == 0:
+            print(f"❌ ERROR: '{input_path}' has no rows.")
+            return None
+        os.replace(tmp_output, output_path)
+    finally:
+        if os.path.exists(tmp_output): os.remove(tmp_output)
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Scored {scored_total} of {total} rows into '{output_path}' in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} rows/s). "
+          f"{total - scored_total} rows lacked features.")
+    return scored_total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict moods for an unlabelled song list with the trained model.")
+    parser.add_argument('--input', default=SCORE_INPUT_PATH, help="CSV with audio feature columns")
+    parser.add_argument('--output', default=SCORE_OUTPUT_PATH, help="Scored CSV (a source for ingest.py/standardize.py)")
+    parser.add_argument('--model', default=MOOD_MODEL_PATH)
+    parser.add_argument('--scaler', default=MOOD_SCALER_PATH, help="Scaler fitted on the training features")
+    parser.add_argument('--workers', type=int, default=SCORE_WORKERS, help="Scoring processes")
+    parser.add_argument('--chunksize', type=int, default=SCORE_CHUNK_SIZE, help="Rows per chunk")
+    args = parser.parse_args()
+    score_catalog(args.input, args.output, model_path=args.model, scaler_path=args.scaler, workers=args.workers, chunksize=args.chunksize)
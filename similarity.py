@@ -0,0 +1,80 @@
+import os
+import warnings
+import numpy as np # Import numpy for the blocked distance computation
+
+# --- Configuration ---
+SIMILARITY_BLOCK_SIZE = int(os.getenv("SIMILARITY_BLOCK_SIZE", "65536")) # Candidate rows scored per matrix product
+SIMILARITY_MAX_SEEDS = int(os.getenv("SIMILARITY_MAX_SEEDS", "100")) # Playlist tracks used as seeds
+
+
+class SimilarityIndex:
+    """
+    Nearest-neighbour search over the catalog's audio features.
+
+    Features are z-scored with the catalog's own mean/std into one float32
+    matrix. Rows missing a feature keep NaN and are never used as candidates
+    or seeds (filled in at the mean they would look close to any seed). A
+    candidate's distance is its squared Euclidean distance to the closest
+    seed, computed block by block as |x|^2 - 2 x.q + |q|^2 so memory stays
+    bounded by block_size x seeds.
+    """
+
+    def __init__(self, feature_columns, block_size=SIMILARITY_BLOCK_SIZE):
+        self.feature_names = list(feature_columns)
+        self.block_size = block_size
+        raw = np.column_stack([np.asarray(feature_columns[name], dtype=np.float32) for name in self.feature_names])
+        with np.errstate(invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning) # All-NaN columns are handled below
+            self.mean = np.nan_to_num(np.nanmean(raw, axis=0))
+            std = np.nan_to_num(np.nanstd(raw, axis=0))
+        self.std = np.where(std > 0, std, 1.0).astype(np.float32)
+        self.empty_columns = np.isnan(raw).all(axis=0) if len(raw) else np.zeros(len(self.feature_names), dtype=bool) # No catalog data: ignored
+        self.matrix = self._scale(raw)
+        self.complete = np.isfinite(self.matrix).all(axis=1)
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def _scale(self, raw):
+        scaled = ((raw - self.mean) / self.std).astype(np.float32)
+        scaled[:, self.empty_columns] = 0
+        return scaled
+
+    def usable_seeds(self, seeds):
+        """The scaled seed vectors that have every feature."""
+        seeds = np.asarray(seeds, dtype=np.float32)
+        return seeds[np.isfinite(seeds).all(axis=1)]
+
+    def scale_features(self, features_df):
+        """Scales raw feature rows (DataFrame with the feature columns) into index space."""
+        return self._scale(features_df.reindex(columns=self.feature_names).to_numpy(dtype=np.float32, na_value=np.nan))
+
+    def top_k(self, seeds, candidate_rows, k, exclude_rows=None):
+        """
+        Returns up to k catalog rows from candidate_rows closest to any seed
+        vector (already scaled), nearest first. Rows and seeds missing a
+        feature are skipped.
+        """
+        seeds = self.usable_seeds(seeds)
+        candidate_rows = np.asarray(candidate_rows, dtype=np.int64)
+        candidate_rows = candidate_rows[self.complete[candidate_rows]]
+        if exclude_rows is not None and len(exclude_rows):
+            candidate_rows = candidate_rows[~np.isin(candidate_rows, exclude_rows)]
+        k = min(k, len(candidate_rows))
+        if k <= 0 or len(seeds) == 0: return np.empty(0, dtype=np.int64)
+
+        seed_sq = np.einsum('ij,ij->i', seeds, seeds)
+        best_rows = np.empty(0, dtype=np.int64); best_dist = np.empty(0, dtype=np.float32)
+        for start in range(0, len(candidate_rows), self.block_size):
+            rows = candidate_rows[start:start + self.block_size]
+            dist = (self.sq_norms[rows][:, None] - 2 * (self.matrix[rows] @ seeds.T) + seed_sq[None, :]).min(axis=1)
+            if len(dist) > k: # Keep only this block's k best before merging
+                part = np.argpartition(dist, k - 1)[:k]
+                rows, dist = rows[part], dist[part]
+            best_rows = np.concatenate([best_rows, rows]); best_dist = np.concatenate([best_dist, dist])
+            if len(best_dist) > k:
+                part = np.argpartition(best_dist, k - 1)[:k]
+                best_rows, best_dist = best_rows[part], best_dist[part]
+        order = np.lexsort((best_rows, best_dist)) # Ties broken by row for stable results
+        return best_rows[order]
@@ -1,10 +1,23 @@
 import pandas as pd
 import os
 import numpy as np # Import numpy for NaN comparison
+import argparse
+from columnar import write_columnar, read_columnar, ColumnarWriter
+from mood_inference import MOOD_FEATURES
 
 # --- Configuration ---
 INPUT_CSV_PATH = 'full_song_list.csv'
 OUTPUT_CSV_PATH = 'standardized_song_list.csv' # Name of the cleaned output file
+OUTPUT_COLUMNAR_PATH = 'standardized_song_list.bin' # Compiled, memory-mappable catalog for app.py
+
+# Output formats: 'csv' (default), 'columnar' (compiled catalog only) or 'both'
+OUTPUT_FORMATS = ['csv', 'columnar', 'both']
+
+# Incremental mode keeps a manifest of processed track_ids and row hashes next to the output
+MANIFEST_SUFFIX = '.manifest.csv'
+
+# Rows per chunk in streaming mode (peak memory is bounded by this, not by the input size)
+STREAM_CHUNK_SIZE = 200_000
 
 # Define potential column names AND the desired standardized names
 # Order within the list indicates priority (first is preferred)
@@ -13,13 +26,32 @@ COLUMN_MAPPING = {
     'track_name': ['track_name', 'name'],
     'artist_name': ['artist_name', 'track_artist', 'artists'],
     'year': ['year'],
-    'Mood': ['Mood', 'Predicted_Mood']
+    'Mood': ['Mood', 'Predicted_Mood'],
+    'genre': ['genre', 'track_genre', 'playlist_genre'], # Optional, used by the catalog's filter index
+    # Optional audio features, carried through for similarity-based selection (similarity.py)
+    **{feature: [feature] for feature in MOOD_FEATURES},
 }
 
+# Standard columns parsed as numbers instead of cleaned as strings
+NUMERIC_COLS = ['year'] + MOOD_FEATURES
+
 # Define the *absolutely* essential columns required after attempting to fill/merge.
 # If these are still missing after merging, the row will be dropped.
 CRITICAL_COLS_STANDARDIZED = ['track_id', 'track_name', 'artist_name', 'Mood']
 
+# Column order of the standardized output (optional columns only when found)
+OUTPUT_COLUMNS = CRITICAL_COLS_STANDARDIZED + ['year', 'genre', 'canonical_key'] + MOOD_FEATURES
+
+# Song identity: the same recording shows up under several track_ids across the
+# merged datasets (remasters, "feat." variants, re-releases). These patterns are
+# dropped before artist and title are compared.
+TITLE_VERSION_PATTERNS = [
+    r'[\(\[][^\)\]]*[\)\]]',                 # "(Remastered 2011)", "[Live]", "(feat. X)"
+    r'\s+-\s+.*$',                           # " - Radio Edit", " - 2011 Remaster"
+    r'\s+(?:feat\.?|ft\.?|featuring)\s.*$',   # "Song feat. X" without brackets
+]
+ARTIST_SEPARATORS = r',|;|\s+&\s+|\s+(?:feat\.?|ft\.?|featuring|with|x)\s+' # Only the primary artist is kept
+
 
 def find_col(df_cols_set, options):
     """Helper to find the first existing column from a list of options."""
@@ -35,10 +67,266 @@ def clean_column(series):
     cleaned = series.astype(str).str.strip().replace(['nan', 'NaN', 'None', '', '.'], np.nan, regex=False)
     return cleaned
 
-def standardize_data(input_path, output_path):
+def normalize_names(series, patterns=()):
+    """Lower-cases, drops the given patterns, strips accents and punctuation and collapses whitespace."""
+    names = series.fillna('').astype(str).str.lower()
+    for pattern in patterns: names = names.str.replace(pattern, '', regex=True)
+    names = names.str.normalize('NFKD').str.replace(r'[\u0300-\u036f]', '', regex=True).str.normalize('NFKC') # Latin accents only, other scripts stay
+    names = names.str.replace(r'[^\w\s]|_', ' ', regex=True).str.replace(r'\s+', ' ', regex=True).str.strip()
+    return names
+
+def canonical_keys(artists, titles):
+    """
+    Vectorized song identity key 'artist|title' for aligned artist and title
+    sequences: primary artist only, version/feature suffixes removed. A part that
+    normalizes to nothing (e.g. a title that is all brackets) keeps its plain form.
+    """
+    artists = pd.Series(artists, dtype=object).reset_index(drop=True)
+    titles = pd.Series(titles, dtype=object).reset_index(drop=True)
+    primary = artists.fillna('').astype(str).str.strip().str.lstrip("[('\"").str.split(ARTIST_SEPARATORS, n=1, regex=True).str[0]
+    artist_keys = normalize_names(primary)
+    title_keys = normalize_names(titles, TITLE_VERSION_PATTERNS)
+    artist_keys = artist_keys.where(artist_keys != '', normalize_names(artists))
+    title_keys = title_keys.where(title_keys != '', normalize_names(titles))
+    return (artist_keys + '|' + title_keys).to_numpy(dtype=object)
+
+def canonical_key(artist, title):
+    """canonical_keys for a single song."""
+    return canonical_keys([artist], [title])[0]
+
+def identify_columns(df_cols_set):
+    """
+    Finds the available source columns for each standard field, in priority order.
+    Returns None (after printing why) if a critical field has no source column.
+    """
+    found_columns_options = {}
+    missing_critical_flag = False
+    print("\n--- Identifying Available Columns ---")
+    for standard_name, options in COLUMN_MAPPING.items():
+        existing_options = [col for col in options if col in df_cols_set]
+        if existing_options:
+            found_columns_options[standard_name] = existing_options
+            print(f"Found options for '{standard_name}': {existing_options}")
+        elif standard_name in CRITICAL_COLS_STANDARDIZED:
+            print(f"❌ ERROR: Could not find ANY suitable column for critical field '{standard_name}' from options: {options}")
+            missing_critical_flag = True
+        else:
+             print(f"Optional field '{standard_name}' not found (options: {options}).")
+
+    if missing_critical_flag:
+        print("Processing stopped due to missing critical columns.")
+        return None
+    return found_columns_options
+
+def standardize_chunk(chunk, found_columns_options):
+    """
+    Vectorized clean + coalesce of one chunk: each standard column is its primary
+    source with NAs filled from lower-priority sources. Rows missing critical
+    data are dropped and year becomes nullable Int64.
+    """
+    out = pd.DataFrame(index=chunk.index)
+    for standard_name, options in found_columns_options.items():
+        if standard_name in NUMERIC_COLS:
+            merged = pd.to_numeric(chunk[options[0]], errors='coerce')
+            for alt_col in options[1:]: merged = merged.fillna(pd.to_numeric(chunk[alt_col], errors='coerce'))
+        else:
+            merged = clean_column(chunk[options[0]])
+            for alt_col in options[1:]: merged = merged.fillna(clean_column(chunk[alt_col]))
+        out[standard_name] = merged
+
+    out = out.dropna(subset=[col for col in CRITICAL_COLS_STANDARDIZED if col in out.columns])
+    out['canonical_key'] = canonical_keys(out['artist_name'], out['track_name'])
+    final_columns_list = [col for col in OUTPUT_COLUMNS if col in out.columns]
+    out = out[final_columns_list]
+    if 'year' in out.columns:
+        year = out['year'].to_numpy(dtype=np.float64, na_value=np.nan)
+        out['year'] = pd.array(np.where(np.isfinite(year), np.round(year), np.nan), dtype='Float64').astype('Int64')
+    return out
+
+def standardize_data_streaming(input_path, output_path, output_format='csv', columnar_path=OUTPUT_COLUMNAR_PATH, chunksize=STREAM_CHUNK_SIZE):
+    """
+    Memory-bounded version of standardize_data. Reads only the mapped columns,
+    as strings, chunksize rows at a time, standardizes each chunk and appends it
+    to the output(s). Outputs are written to temporary files and renamed at the end.
+    A first pass over the track id columns finds the last source row of every
+    track_id; only that row is kept, as in standardize_data_incremental.
+    """
+    if not os.path.exists(input_path):
+        print(f"❌ ERROR: Input file not found at '{input_path}'.")
+        return
+
+    try:
+        header = pd.read_csv(input_path, nrows=0).columns
+        found_columns_options = identify_columns(set(header))
+        if found_columns_options is None: return
+        usecols = sorted({col for options in found_columns_options.values() for col in options})
+        print(f"\n--- Streaming '{input_path}' in chunks of {chunksize} rows (columns: {usecols}) ---")
+        last_rows = last_source_rows(input_path, found_columns_options, chunksize)
+
+        write_csv = output_format in ('csv', 'both')
+        tmp_csv_path = output_path + '.tmp'
+        columnar_writer = ColumnarWriter(columnar_path) if output_format in ('columnar', 'both') else None
+        total_in = 0; total_out = 0; moods = set()
+        try:
+            reader = pd.read_csv(input_path, usecols=usecols, dtype={col: str for col in usecols}, chunksize=chunksize)
+            for chunk_number, chunk in enumerate(reader):
+                df_chunk = standardize_chunk(chunk[last_rows[chunk.index]], found_columns_options)
+                total_in += len(chunk); total_out += len(df_chunk)
+                if 'Mood' in df_chunk.columns: moods.update(df_chunk['Mood'].unique())
+                if write_csv: df_chunk.to_csv(tmp_csv_path, mode='w' if chunk_number == 0 else 'a', header=chunk_number == 0, index=False)
+                if columnar_writer is not None and not df_chunk.empty: columnar_writer.append(df_chunk)
+                print(f"Chunk {chunk_number + 1}: kept {len(df_chunk)}/{len(chunk)} rows (total {total_out}/{total_in}).")
+            if total_out == 0:
+                print("❌ ERROR: No valid data remaining after cleaning, merging, and removing missing values.")
+                return
+            if columnar_writer is not None: columnar_writer.close(); columnar_writer = None
+            if write_csv: os.replace(tmp_csv_path, output_path)
+        finally:
+            if columnar_writer is not None: columnar_writer.abort() # Only reached on failure
+            if os.path.exists(tmp_csv_path): os.remove(tmp_csv_path)
+
+        if write_csv: print(f"\n✅ Successfully streamed {total_out} standardized rows (of {total_in}) to '{output_path}'.")
+        if output_format in ('columnar', 'both'): print(f"\n✅ Successfully compiled {total_out} standardized rows to '{columnar_path}'.")
+        print(f"   Unique mood labels in final output: {sorted(moods)}")
+
+    except Exception as e:
+        print(f"❌ ERROR: An unexpected error occurred during streaming processing.")
+        import traceback; traceback.print_exc()
+
+def source_track_ids(chunk, found_columns_options):
+    """The coalesced track id of raw rows, exactly as standardize_chunk derives it."""
+    options = found_columns_options['track_id']
+    key = clean_column(chunk[options[0]])
+    for alt_col in options[1:]: key = key.fillna(clean_column(chunk[alt_col]))
+    return key
+
+def last_source_rows(input_path, found_columns_options, chunksize=STREAM_CHUNK_SIZE):
+    """Boolean mask over the source rows: True for the last row of each track_id (reads only the id columns)."""
+    id_cols = found_columns_options['track_id']
+    reader = pd.read_csv(input_path, usecols=id_cols, dtype={col: str for col in id_cols}, chunksize=chunksize)
+    chunks = [source_track_ids(chunk, found_columns_options) for chunk in reader]
+    ids = pd.concat(chunks, ignore_index=True) if chunks else pd.Series(dtype=object)
+    last = (~ids.duplicated(keep='last') & ids.notna()).to_numpy()
+    duplicates = int(ids.notna().sum() - last.sum())
+    if duplicates: print(f"Dropping {duplicates} earlier source rows of repeated track ids (the last row per track_id is kept).")
+    return last
+
+def source_row_keys(chunk, found_columns_options):
+    """
+    (track_id, row_hash) for raw rows. The key is the coalesced track id exactly
+    as standardize_chunk derives it; the hash covers every mapped source column.
+    """
+    key = source_track_ids(chunk, found_columns_options)
+    row_hash = pd.util.hash_pandas_object(chunk, index=False)
+    return pd.DataFrame({'track_id': key, 'row_hash': row_hash.astype('uint64')}, index=chunk.index)
+
+def load_manifest(manifest_path):
+    """track_id -> row_hash Series from a previous incremental run (empty if there is none)."""
+    if not os.path.exists(manifest_path): return pd.Series(dtype='uint64', name='row_hash')
+    manifest = pd.read_csv(manifest_path, dtype={'track_id': str, 'row_hash': 'uint64'})
+    return manifest.set_index('track_id')['row_hash']
+
+def standardize_data_incremental(input_path, output_path, manifest_path=None, output_format='csv',
+                                 columnar_path=OUTPUT_COLUMNAR_PATH, chunksize=STREAM_CHUNK_SIZE):
+    """
+    Re-standardizes only source rows whose track_id is new or whose content hash
+    changed since the last run, and merges them into the existing output.
+    Output rows are unique by track_id (the last source row wins); tracks that
+    disappeared from the source are dropped. The merge base is the output this
+    run writes (the CSV, or the compiled catalog with output_format 'columnar'),
+    and its manifest defaults to <that output>.manifest.csv. Without a manifest
+    (or an existing base) this falls back to processing every row once.
+    """
+    write_csv = output_format in ('csv', 'both')
+    base_path = output_path if write_csv else columnar_path # Only an output this run rewrites can be the merge base
+    manifest_path = manifest_path or base_path + MANIFEST_SUFFIX
+    # Every output written gets its own manifest, so a later run merging into it never trusts a stale one
+    manifest_paths = [manifest_path] + ([columnar_path + MANIFEST_SUFFIX] if output_format == 'both' else [])
+    if not os.path.exists(input_path):
+        print(f"❌ ERROR: Input file not found at '{input_path}'.")
+        return
+
+    try:
+        header = pd.read_csv(input_path, nrows=0).columns
+        found_columns_options = identify_columns(set(header))
+        if found_columns_options is None: return
+        usecols = sorted({col for options in found_columns_options.values() for col in options})
+
+        # The existing output is only trusted together with the manifest that describes it
+        have_previous = os.path.exists(manifest_path) and os.path.exists(base_path)
+        previous_hashes = load_manifest(manifest_path) if have_previous else load_manifest('')
+        print(f"\n--- Incremental run: {len(previous_hashes)} tracks in manifest '{manifest_path}' ---")
+
+        # --- 1. Hash every source row, standardize only candidates that differ from the manifest ---
+        keys = []; candidates = []
+        reader = pd.read_csv(input_path, usecols=usecols, dtype={col: str for col in usecols}, chunksize=chunksize)
+        for chunk in reader:
+            chunk = chunk[usecols]
+            chunk_keys = source_row_keys(chunk, found_columns_options).dropna(subset=['track_id'])
+            keys.append(chunk_keys)
+            known = chunk_keys['track_id'].map(previous_hashes)
+            changed = chunk_keys.index[known.isna().to_numpy() | (known != chunk_keys['row_hash']).to_numpy()]
+            if len(changed): candidates.append(standardize_chunk(chunk.loc[changed], found_columns_options))
+
+        manifest = pd.concat(keys) if keys else pd.DataFrame(columns=['track_id', 'row_hash'])
+        manifest = manifest.drop_duplicates(subset='track_id', keep='last') # Last source row per track wins
+        known = manifest['track_id'].map(previous_hashes)
+        changed_ids = set(manifest.loc[known.isna().to_numpy() | (known != manifest['row_hash']).to_numpy(), 'track_id'])
+        removed_ids = set(previous_hashes.index.difference(pd.Index(manifest['track_id'])))
+        print(f"Source rows: {len(manifest)} unique tracks, {len(changed_ids)} new or changed, {len(removed_ids)} removed.")
+
+        # Only the last occurrence of each changed track is kept (candidate rows are in source order)
+        new_rows = pd.concat(candidates) if candidates else standardize_chunk(pd.DataFrame(columns=usecols), found_columns_options)
+        new_rows = new_rows[new_rows.index.isin(manifest.index) & new_rows['track_id'].isin(changed_ids)]
+
+        # --- 2. Merge into the existing output ---
+        if have_previous:
+            if write_csv:
+                existing = pd.read_csv(base_path, dtype={'track_id': str, 'track_name': str, 'artist_name': str, 'Mood': str, 'year': 'Int64', 'canonical_key': str})
+            else:
+                existing = read_columnar(base_path)
+                if 'year' in existing.columns: existing['year'] = existing['year'].round().astype('Int64') # Stored as float32
+            stale = existing['track_id'].isin(changed_ids | removed_ids)
+            existing = existing[~stale]
+            print(f"Kept {len(existing)} unchanged rows from '{base_path}', replacing/removing {int(stale.sum())}.")
+            df_final = pd.concat([existing, new_rows], ignore_index=True)
+        else:
+            df_final = new_rows.reset_index(drop=True)
+        df_final = df_final.drop_duplicates(subset='track_id', keep='last').reset_index(drop=True)
+        missing_keys = df_final['canonical_key'].isna().to_numpy() # Rows from an output written before the column existed
+        if missing_keys.any():
+            df_final.loc[missing_keys, 'canonical_key'] = canonical_keys(df_final.loc[missing_keys, 'artist_name'], df_final.loc[missing_keys, 'track_name'])
+
+        if df_final.empty:
+            print("❌ ERROR: No valid data remaining after cleaning, merging, and removing missing values.")
+            return
+
+        # --- 3. Drop the old manifests, save outputs, then commit the new manifests ---
+        # (a crash in between leaves no manifest, so the next run rebuilds instead of trusting a stale one)
+        for path in manifest_paths:
+            if os.path.exists(path): os.remove(path)
+        if write_csv:
+            df_final.to_csv(output_path + '.tmp', index=False)
+            os.replace(output_path + '.tmp', output_path)
+            print(f"\n✅ Successfully saved {len(df_final)} standardized rows to '{output_path}' ({len(new_rows)} re-standardized).")
+        if output_format in ('columnar', 'both'):
+            write_columnar(df_final, columnar_path)
+            print(f"\n✅ Successfully compiled {len(df_final)} standardized rows to '{columnar_path}'.")
+        for path in manifest_paths:
+            manifest[['track_id', 'row_hash']].to_csv(path + '.tmp', index=False)
+            os.replace(path + '.tmp', path)
+            print(f"   Manifest updated: '{path}'.")
+
+    except Exception as e:
+        print(f"❌ ERROR: An unexpected error occurred during incremental processing.")
+        import traceback; traceback.print_exc()
+
+def standardize_data(input_path, output_path, output_format='csv', columnar_path=OUTPUT_COLUMNAR_PATH):
     """
     Loads, cleans, merges alternative columns using defined priorities,
     drops rows missing critical data, ensures standard column names, and saves.
+    With output_format 'columnar' or 'both' a compiled catalog is written to
+    columnar_path as well (see columnar.py).
     """
     if not os.path.exists(input_path):
         print(f"❌ ERROR: Input file not found at '{input_path}'.")
@@ -47,26 +335,22 @@ def standardize_data(input_path, output_path):
     try:
         df = pd.read_csv(input_path, low_memory=False)
         print(f"Loaded {len(df)} initial rows from '{input_path}'.")
+    except Exception as e:
+        print(f"❌ ERROR: Could not read the CSV file. {e}")
+        return
+    standardize_dataframe(df, output_path, output_format=output_format, columnar_path=columnar_path)
+
+def standardize_dataframe(df, output_path, output_format='csv', columnar_path=OUTPUT_COLUMNAR_PATH):
+    """
+    The in-memory part of standardize_data, for callers that already hold the
+    raw rows (e.g. ingest.py). Returns the standardized DataFrame, or None.
+    """
+    try:
         df_cols_set = set(df.columns)
 
         # --- 1. Identify Existing Columns for Each Standard Field ---
-        found_columns_options = {}
-        missing_critical_flag = False
-        print("\n--- Identifying Available Columns ---")
-        for standard_name, options in COLUMN_MAPPING.items():
-            existing_options = [col for col in options if col in df_cols_set]
-            if existing_options:
-                found_columns_options[standard_name] = existing_options
-                print(f"Found options for '{standard_name}': {existing_options}")
-            elif standard_name in CRITICAL_COLS_STANDARDIZED:
-                print(f"❌ ERROR: Could not find ANY suitable column for critical field '{standard_name}' from options: {options}")
-                missing_critical_flag = True
-            else:
-                 print(f"Optional field '{standard_name}' not found (options: {options}).")
-
-        if missing_critical_flag:
-            print("Processing stopped due to missing critical columns.")
-            return
+        found_columns_options = identify_columns(df_cols_set)
+        if found_columns_options is None: return None
 
         # --- 2. Clean All Identified Columns ---
         print("\n--- Cleaning Identified Columns ---")
@@ -82,6 +366,8 @@ def standardize_data(input_path, output_path):
                  if col in df.columns: # Check if column still exists (it should)
                      valid_year_count = df[col].notna().sum()
                      print(f"   -> Found {valid_year_count} valid numeric years in '{col}' after cleaning.")
+            elif any(col in found_columns_options.get(feature, []) for feature in MOOD_FEATURES):
+                 df[col] = pd.to_numeric(df[col], errors='coerce')
             else:
                  df[col] = clean_column(df[col])
 
@@ -109,9 +395,10 @@ def standardize_data(input_path, output_path):
                          else:
                             print(f"   -> No values to fill from '{alt_col}' for '{standard_name}'.")
 
-        # Specific check for 'year' column type after merging
-        if 'year' in df_merged.columns:
-             df_merged['year'] = pd.to_numeric(df_merged['year'], errors='coerce') # Ensure float for NA support
+        # Specific check for 'year' (and audio feature) column types after merging
+        for col in NUMERIC_COLS:
+            if col in df_merged.columns:
+                df_merged[col] = pd.to_numeric(df_merged[col], errors='coerce') # Ensure float for NA support
 
         print(f"\nColumns available after merging: {list(df_merged.columns)}")
         print(f"DataFrame shape after merging columns: {df_merged.shape}")
@@ -133,7 +420,9 @@ def standardize_data(input_path, output_path):
 
         if df_merged.empty:
             print("❌ ERROR: No valid data remaining after cleaning, merging, and removing missing values.")
-            return
+            return None
+        df_merged['canonical_key'] = canonical_keys(df_merged['artist_name'], df_merged['track_name'])
+        print(f"Found {df_merged['canonical_key'].nunique()} distinct songs among {len(df_merged)} tracks.")
 
         # --- 5. Final Column Selection & Type Conversion ---
         # Select the desired standard columns plus 'year' if it exists
@@ -143,6 +432,7 @@ def standardize_data(input_path, output_path):
                 final_columns_list.append('year')
         else:
             print("   -> 'year' column is missing from df_merged before final selection.")
+        final_columns_list += [col for col in ['genre', 'canonical_key'] + MOOD_FEATURES if col in df_merged.columns] # Optional genre, song key and audio features
 
         # Ensure only existing columns are selected
         final_columns_list = [col for col in final_columns_list if col in df_merged.columns]
@@ -154,7 +444,7 @@ def standardize_data(input_path, output_path):
         # Optional: Convert year to nullable integer type
         if 'year' in df_final.columns:
             # Check if dtype is float and if there are non-finite values before conversion
-            if pd.api.types.is_float_dtype(df_final['year']) and not df_final['year'].map(lambda x: pd.isna(x) or np.isfinite(x)).all():
+            if pd.api.types.is_float_dtype(df_final['year']) and np.isinf(df_final['year'].to_numpy(dtype=np.float64, na_value=np.nan)).any():
                 print("Warning: Non-finite float values found in year column before Int64 conversion. Setting them to NA.")
                 df_final['year'] = df_final['year'].replace([np.inf, -np.inf], pd.NA)
 
@@ -167,21 +457,42 @@ def standardize_data(input_path, output_path):
 
 
         # --- 6. Save the standardized data ---
-        df_final.to_csv(output_path, index=False)
-        print(f"\n✅ Successfully saved {len(df_final)} standardized rows to '{output_path}'.")
+        if output_format in ('csv', 'both'):
+            df_final.to_csv(output_path, index=False)
+            print(f"\n✅ Successfully saved {len(df_final)} standardized rows to '{output_path}'.")
+        if output_format in ('columnar', 'both'):
+            write_columnar(df_final, columnar_path)
+            print(f"\n✅ Successfully compiled {len(df_final)} standardized rows to '{columnar_path}'.")
         print(f"   Final Columns: {list(df_final.columns)}")
 
         # Optional: Display unique moods from the final data
         if 'Mood' in df_final.columns:
             final_unique_moods = list(df_final['Mood'].unique())
             print(f"   Unique mood labels in final output: {final_unique_moods}")
-
+        return df_final
 
     except Exception as e:
         print(f"❌ ERROR: An unexpected error occurred during processing.")
         import traceback; traceback.print_exc()
+        return None
 
 # --- Run the standardization ---
 if __name__ == "__main__":
-    standardize_data(INPUT_CSV_PATH, OUTPUT_CSV_PATH)
+    parser = argparse.ArgumentParser(description="Clean and standardize the raw song list.")
+    parser.add_argument('--input', default=INPUT_CSV_PATH, help="Raw input CSV")
+    parser.add_argument('--output', default=OUTPUT_CSV_PATH, help="Standardized CSV output")
+    parser.add_argument('--format', default='csv', choices=OUTPUT_FORMATS, help="Output format(s) to write")
+    parser.add_argument('--columnar-output', default=OUTPUT_COLUMNAR_PATH, help="Compiled catalog output")
+    parser.add_argument('--stream', action='store_true', help="Process the input in chunks with bounded memory")
+    parser.add_argument('--chunksize', type=int, default=STREAM_CHUNK_SIZE, help="Rows per chunk in --stream/--incremental mode")
+    parser.add_argument('--incremental', action='store_true', help="Only re-standardize new or changed rows and merge them into the existing output")
+    parser.add_argument('--manifest', default=None, help=f"Manifest for --incremental (default: <output>{MANIFEST_SUFFIX}, <columnar-output>{MANIFEST_SUFFIX} with --format columnar)")
+    args = parser.parse_args()
+    if args.incremental:
+        standardize_data_incremental(args.input, args.output, manifest_path=args.manifest, output_format=args.format,
+                                     columnar_path=args.columnar_output, chunksize=args.chunksize)
+    elif args.stream:
+        standardize_data_streaming(args.input, args.output, output_format=args.format, columnar_path=args.columnar_output, chunksize=args.chunksize)
+    else:
+        standardize_data(args.input, args.output, output_format=args.format, columnar_path=args.columnar_output)
 
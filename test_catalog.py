@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from columnar import open_columnar, write_columnar
+from catalog import TrackCatalog
+
+
+def make_tracks(n=2000):
+    df = pd.DataFrame({
+        'track_id': [f'id{i}' for i in range(n)],
+        'track_name': [f'Song {i % 500}' for i in range(n)],
+        'artist_name': [f'Artist {i % 40}' if i % 3 else f' ARTIST {i % 40} ' for i in range(n)],
+        'Mood': ['Happy', 'Sad', 'Calm'] * (n // 3) + ['Happy'] * (n % 3),
+        'year': [1960.0 + i % 60 for i in range(n)],
+        'genre': 'pop',
+    })
+    df.loc[7, 'track_id'] = 'id3' # Duplicate id: the first row wins
+    df.loc[::97, 'year'] = np.nan
+    df['canonical_key'] = [f'artist {i % 40}|song {i % 500}' for i in range(n)]
+    return df
+
+
+@pytest.mark.parametrize('old_format', [False, True], ids=['key-indexes', 'old-format'])
+def test_mmap_lookups_match_the_in_memory_catalog(tmp_path, old_format):
+    df = make_tracks()
+    path = str(tmp_path / 'catalog.bin')
+    write_columnar(df, path, **({'index_columns': {}, 'sorted_columns': ()} if old_format else {}))
+    mapped = TrackCatalog.from_columnar(open_columnar(path))
+    resident = TrackCatalog.from_dataframe(df)
+    assert bool(mapped.key_indexes) == (mapped._year_index is not None) == (not old_format)
+
+    ids = ['id5', 'id3', 'missing', 'id1999']
+    assert mapped.rows_for_ids(ids).tolist() == resident.rows_for_ids(ids).tolist() == [5, 3, -1, 1999]
+    artists = ['artist 12', 'Artist 7 ', 'nobody']
+    np.testing.assert_array_equal(mapped.artist_rows(artists), resident.artist_rows(artists))
+    songs = ['artist 1|song 1', 'artist 2|song 42', 'unknown|song']
+    np.testing.assert_array_equal(mapped.rows_for_songs(songs), resident.rows_for_songs(songs))
+    rows = np.arange(0, len(df), 3)
+    np.testing.assert_array_equal(mapped.distinct_rows(rows), resident.distinct_rows(rows))
+    assert [mapped.track_at(row) for row in (0, 41, 1999)] == [resident.track_at(row) for row in (0, 41, 1999)]
+    for year_min, year_max in [(1970, 1979), (None, 1965), (2010, None), (1990.5, 1991), (None, None)]:
+        np.testing.assert_array_equal(mapped.year_rows(year_min, year_max), resident.year_rows(year_min, year_max))
+    assert 0 not in mapped.year_rows() and len(mapped.year_rows()) == len(df) - df['year'].isna().sum()
+
+
+@pytest.mark.parametrize('source', ['csv', 'mmap'])
+def test_song_keys_missing_from_the_file_are_computed_at_load(tmp_path, capsys, source):
+    df = make_tracks(30).drop(columns='canonical_key') # Standardized before the column existed
+    df.loc[1, ['artist_name', 'track_name']] = ['Artist 0', 'Song 0 - Remastered']
+    if source == 'mmap':
+        path = str(tmp_path / 'catalog.bin')
+        write_columnar(df, path)
+        catalog = TrackCatalog.from_columnar(open_columnar(path))
+    else:
+        catalog = TrackCatalog.from_dataframe(df)
+    assert "have no canonical_key" in capsys.readouterr().out
+    assert not pd.isna(catalog.song_keys).any() # Filled in before any request
+    assert catalog.rows_for_songs(['artist 0|song 0']).tolist() == [0, 1]
+    assert catalog.song_key_at(1) == 'artist 0|song 0'
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+import pytest
+from columnar import open_columnar, read_columnar, write_columnar
+
+
+@pytest.mark.parametrize('categories, dtype', [(32768, '<i2'), (32769, '<i4')], ids=['fits-int16', 'needs-int32'])
+def test_dict_codes_widen_past_the_int16_range(tmp_path, categories, dtype):
+    labels = [f'genre {i}' for i in range(categories)]
+    df = pd.DataFrame({'track_id': [f'id{i}' for i in range(categories + 1)], 'genre': labels + [None]})
+    path = str(tmp_path / 'catalog.bin')
+    write_columnar(df, path)
+
+    table = open_columnar(path)
+    codes = table.column('genre')
+    assert codes.dtype == np.dtype(dtype)
+    assert codes[-2] == categories - 1 and codes[-1] == -1 # The last category keeps its code, no wrap-around
+    assert table.grouped_rows('genre')[labels[-1]].tolist() == [categories - 1]
+    genres = read_columnar(path)['genre']
+    assert genres[:-1].tolist() == labels and pd.isna(genres.iloc[-1])
@@ -0,0 +1,94 @@
+import time
+import pandas as pd
+import pytest
+import enrich
+from bench_fakes import FakeSpotify, serve_fake_spotify
+from enrich import CHECKPOINT_SUFFIX, SpotifyBatchClient, enrich_tracks
+
+
+@pytest.fixture
+def fake_api():
+    """start(**serve_fake_spotify options) runs a local fake Spotify Web API and returns its base URL."""
+    servers = []
+
+    def start(**kwargs):
+        server, api_base = serve_fake_spotify(FakeSpotify(playlist_size=0, latency=0.0), **kwargs)
+        servers.append(server)
+        return api_base
+    yield start
+    for server in servers: server.shutdown()
+
+
+def write_ids(path, ids):
+    pd.DataFrame({'track_id': ids}).to_csv(path, index=False)
+    return str(path)
+
+def token_failing_after(calls):
+    """Token provider that raises (failing the batch) once it has handed out calls tokens."""
+    count = [0]
+
+    def token():
+        count[0] += 1
+        if count[0] > calls: raise RuntimeError("token endpoint down")
+        return 'token'
+    return token
+
+def run(input_path, output_path, api_base, token=lambda: 'token', **kwargs):
+    return enrich_tracks(input_path, output_path, token_provider=token, api_base=api_base,
+                         workers=1, batch_size=10, with_tracks=False, **kwargs)
+
+def output_ids(output_path):
+    return pd.read_csv(output_path, dtype={'track_id': str})['track_id'].tolist()
+
+
+def test_429_pauses_for_retry_after(fake_api):
+    api_base = fake_api(throttle_rate=0.5, retry_after=1, seed=1) # First request throttled, the retry not
+    client = SpotifyBatchClient(lambda: 'token', api_base=api_base, backoff=30)
+    started = time.monotonic()
+    rows = client.enrich_batch(['a', 'b', 'unknown1'], with_tracks=False)
+    assert client.throttled == 1 and client.retries == 0 # A 429 is not a backoff retry
+    assert 1 <= time.monotonic() - started < 10
+    assert rows['danceability'].notna().tolist() == [True, True, False]
+
+
+def test_interrupted_run_resumes_from_its_checkpoint(tmp_path, fake_api, monkeypatch):
+    monkeypatch.setattr(enrich, 'CHECKPOINT_EVERY', 1)
+    api_base = fake_api()
+    ids = [f'trk{i}' for i in range(50)]
+    input_path = write_ids(tmp_path / 'input.csv', ids)
+    output_path = str(tmp_path / 'enriched.csv')
+
+    stopped = run(input_path, output_path, api_base, token=token_failing_after(2))
+    assert stopped['failed'] and output_ids(output_path) == ids[:20]
+    with open(output_path, 'a') as f: f.write('trk20,half a row') # Written after the last checkpoint
+
+    resumed = run(input_path, output_path, api_base)
+    assert resumed['ids'] == 30 and not resumed['failed']
+    assert output_ids(output_path) == ids
+
+
+def test_checkpoint_of_another_input_is_refused(tmp_path, fake_api):
+    api_base = fake_api()
+    input_path = write_ids(tmp_path / 'input.csv', [f'trk{i}' for i in range(30)])
+    output_path = str(tmp_path / 'enriched.csv')
+    run(input_path, output_path, api_base, token=token_failing_after(1))
+    before = open(output_path).read()
+
+    other = write_ids(tmp_path / 'other.csv', [f'other{i}' for i in range(30)])
+    assert run(other, output_path, api_base) is None
+    assert open(output_path).read() == before
+    assert run(other, output_path, api_base, restart=True)['ids'] == 30
+
+
+def test_edited_input_resumes_per_id(tmp_path, fake_api):
+    api_base = fake_api()
+    ids = [f'trk{i}' for i in range(30)]
+    input_path = write_ids(tmp_path / 'input.csv', ids)
+    output_path = str(tmp_path / 'enriched.csv')
+    run(input_path, output_path, api_base)
+
+    write_ids(tmp_path / 'input.csv', ids + ['new1', 'new2']) # Two rows added since the checkpoint
+    resumed = run(input_path, output_path, api_base)
+    assert resumed['ids'] == 2
+    assert output_ids(output_path) == ids + ['new1', 'new2']
+    assert tmp_path.joinpath('enriched.csv' + CHECKPOINT_SUFFIX).exists()
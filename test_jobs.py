@@ -0,0 +1,98 @@
+import json
+import threading
+import pytest
+import app as app_module
+from jobs import JobRegistry, stream_events
+from mix_store import MixStore
+
+
+def parse_events(body):
+    """(event, data) pairs of an SSE response body (keep-alive comments skipped)."""
+    events = []
+    for block in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if line and not line.startswith(':'))
+        if 'event' in fields: events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    """Two workers' mix stores over the same SQLite file, and a client for the app as either worker."""
+    path = str(tmp_path / 'mixes.sqlite3')
+    stores = [MixStore(path), MixStore(path)]
+
+    def client_on(worker, uuid='user-1'):
+        monkeypatch.setattr(app_module, 'mix_store', stores[worker])
+        client = app_module.app.test_client()
+        with client.session_transaction() as session: session['uuid'] = uuid
+        return client
+    return stores, client_on
+
+
+def start_job(store, mix_id, release):
+    """Runs a generation job on a worker whose events go to store; it finishes once release is set."""
+    store.reserve(mix_id, owner='user-1', mood='Happy')
+
+    def job_fn(job):
+        job.publish('status', {'message': "Finding videos for 2 tracks..."})
+        job.publish('track', {'video_id': 'v1', 'track_name': 'A - One', 'youtube_title': 'One'})
+        release.wait(5)
+        job.publish('track', {'video_id': 'v2', 'track_name': 'B - Two', 'youtube_title': 'Two'})
+        job.finish('done', {'count': 2, 'quota_exceeded': False})
+        store.complete(job.id, [track for event, track in job.events if event == 'track'])
+    return JobRegistry(max_workers=1, sink=store.append_event).submit(job_fn, owner='user-1', job_id=mix_id)
+
+
+@pytest.mark.parametrize('stream_worker', [0, 1], ids=['same-worker', 'other-worker'])
+def test_stream_works_on_either_worker(workers, stream_worker):
+    stores, client_on = workers
+    release = threading.Event()
+    start_job(stores[0], 'mix1', release)
+    threading.Timer(0.3, release.set).start() # The second track arrives while the stream is open
+    client = client_on(stream_worker)
+
+    page = client.get('/mix/mix1')
+    assert page.status_code == 200 and b'/generate/stream/mix1' in page.data
+    events = parse_events(client.get('/generate/stream/mix1').get_data(as_text=True))
+    assert [event for event, _ in events] == ['status', 'track', 'track', 'done']
+    assert [data['video_id'] for event, data in events if event == 'track'] == ['v1', 'v2']
+
+    # Reconnecting with Last-Event-ID replays only what was missed
+    replay = parse_events(client.get('/generate/stream/mix1', headers={'Last-Event-ID': '1'}).get_data(as_text=True))
+    assert [event for event, _ in replay] == ['track', 'done']
+
+
+def test_other_users_cannot_stream_a_job(workers):
+    stores, client_on = workers
+    release = threading.Event()
+    start_job(stores[0], 'mix2', release)
+    client = client_on(1, uuid='someone-else')
+    assert client.get('/generate/stream/mix2').status_code == 404
+    assert client.get('/mix/mix2').status_code == 202 # Still being generated, and not theirs to stream
+    release.set()
+
+
+def test_stream_ends_when_the_job_was_lost(tmp_path):
+    store = MixStore(str(tmp_path / 'mixes.sqlite3'), pending_timeout=0) # Its worker died: pending past the timeout
+    store.reserve('mix3', owner='user-1')
+    store.append_event('mix3', 0, 'status', {'message': "Finding videos..."})
+    events = parse_events(''.join(stream_events(store, 'mix3', poll=0.01, keepalive=0)))
+    assert [event for event, _ in events] == ['status', 'error']
+
+
+def test_finished_mix_page_escapes_titles(workers):
+    stores, client_on = workers
+    stores[0].reserve('mix4', owner='user-1')
+    evil = '</script><script>alert(1)</script>'
+    stores[0].complete('mix4', [{'video_id': 'v1', 'track_name': f'A - {evil}', 'youtube_title': evil}])
+    page = client_on(1, uuid='viewer').get('/mix/mix4').get_data(as_text=True)
+    assert '<script>alert(1)' not in page
+    assert '\\u003c/script\\u003e\\u003cscript\\u003ealert(1)' in page # Still in the data, as JSON escapes
+
+
+def test_playlist_player_escapes_track_names():
+    evil = '</script><script>alert(1)</script>'
+    with app_module.app.test_request_context():
+        page = app_module.render_template('playlist_player.html', track_names=[evil], playlist_title='P',
+                                          window={'start': 0, 'end': 1, 'videos': [{'id': 'v1', 'title': evil}]})
+    assert '<script>alert(1)' not in page
@@ -0,0 +1,41 @@
+import re
+import time
+import threading
+from flask import Response
+import app as app_module
+import metrics
+from metrics import span
+
+
+def timed_response(work):
+    """Runs work inside a request through the app's before/after request hooks; returns the response."""
+    flask_app = app_module.app
+    with flask_app.test_request_context('/'):
+        flask_app.preprocess_request()
+        work()
+        return flask_app.process_response(Response('ok'))
+
+def durations(header):
+    return {stage: float(ms) for stage, ms in re.findall(r'([\w-]+);dur=([\d.]+)', header)}
+
+
+def test_server_timing_sums_repeated_stages():
+    def work():
+        with span('youtube.search'): time.sleep(0.01)
+        with span('youtube.search'): time.sleep(0.01)
+        with span('generate.select'): pass
+    header = timed_response(work).headers['Server-Timing']
+    assert list(durations(header)) == ['youtube-search', 'generate-select'] # In first-run order, dots swapped for dashes
+    assert durations(header)['youtube-search'] >= 20
+
+
+def test_background_spans_stay_out_of_the_header():
+    def job():
+        with span('test.background'): pass
+
+    def work():
+        background = threading.Thread(target=job) # e.g. a generation job started by the request
+        background.start(); background.join()
+    response = timed_response(work)
+    assert 'Server-Timing' not in response.headers # Nothing ran on the request thread
+    assert f'{metrics.stage_seconds.name}_count{{stage="test.background"}} 1' in metrics.render_prometheus() # Still in /metrics
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+import pytest
+import mix_store
+from mix_store import MixStore, new_mix_id
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable time.time() for the mix store module."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(mix_store, 'time', SimpleNamespace(time=lambda: now[0]))
+    return now
+
+@pytest.fixture
+def store(tmp_path, clock):
+    return MixStore(str(tmp_path / 'mixes.sqlite3'), pending_timeout=60)
+
+
+def test_pending_mix_completes(store, clock):
+    mix_id = new_mix_id()
+    store.reserve(mix_id, owner='user-1', mood='Happy')
+    assert store.get(mix_id)['status'] == 'pending' and store.get(mix_id)['tracks'] == []
+
+    tracks = [{'video_id': 'v1', 'track_name': 'A - One', 'youtube_title': 'One'},
+              {'video_id': 'v2', 'track_name': 'B - Two', 'youtube_title': 'Two'}]
+    clock[0] += 30
+    store.complete(mix_id, tracks)
+    clock[0] += 3600 # Done mixes never time out
+    mix = MixStore(store.path).get(mix_id) # Served by any worker
+    assert (mix['status'], mix['owner'], mix['mood'], mix['tracks']) == ('done', 'user-1', 'Happy', tracks)
+    assert store.get('unknown') is None
+
+
+def test_failed_and_abandoned_mixes_are_errors(store, clock):
+    store.reserve('failed'); store.reserve('abandoned')
+    store.fail('failed', "Quota exceeded.")
+    assert (store.get('failed')['status'], store.get('failed')['message']) == ('error', "Quota exceeded.")
+
+    clock[0] += 59
+    assert store.get('abandoned')['status'] == 'pending'
+    clock[0] += 2 # Its worker never finished it
+    assert (store.get('abandoned')['status'], store.get('abandoned')['message']) == ('error', "This mix was never finished.")
+
+
+def test_events_replay_after_an_id(store):
+    store.reserve('mix1')
+    for event_id, (event, data) in enumerate([('status', {'message': 'Searching'}), ('track', {'video_id': 'v1'}), ('done', {'count': 1})]):
+        store.append_event('mix1', event_id, event, data)
+    assert [event for _, event, _ in store.events('mix1')] == ['status', 'track', 'done']
+    assert store.events('mix1', after=1) == [(2, 'done', {'count': 1})]
+    assert store.events('other') == []
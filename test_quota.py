@@ -0,0 +1,54 @@
+import datetime
+from types import SimpleNamespace
+import pytest
+import app as app_module
+import quota
+from bench_fakes import FakeYouTube
+from quota import YOUTUBE_SEARCH_COST, QuotaLedger, quota_day
+
+UTC = datetime.timezone.utc
+# 23:59 on 2026-01-14 in Los Angeles (PST, UTC-8), already the 15th in UTC
+BEFORE_PACIFIC_MIDNIGHT = datetime.datetime(2026, 1, 15, 7, 59, tzinfo=UTC).timestamp()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable time.time() for the quota module."""
+    now = [BEFORE_PACIFIC_MIDNIGHT]
+    monkeypatch.setattr(quota, 'time', SimpleNamespace(time=lambda: now[0]))
+    return now
+
+@pytest.fixture
+def ledger(tmp_path, clock):
+    return QuotaLedger(path=str(tmp_path / 'quota.sqlite3'), daily_budget=3 * YOUTUBE_SEARCH_COST, cooldown=600)
+
+
+def test_budget_resets_at_pacific_midnight(ledger, clock):
+    assert quota_day() == '2026-01-14'
+    assert [ledger.try_spend() for _ in range(4)] == [True, True, True, False]
+    assert ledger.remaining() == 0
+
+    clock[0] += 60 # 00:00 Pacific, still 08:00 on the same UTC day
+    assert quota_day() == '2026-01-15'
+    assert ledger.remaining() == 3 * YOUTUBE_SEARCH_COST and ledger.try_spend()
+    assert ledger.status()['spent'] == YOUTUBE_SEARCH_COST
+
+
+def test_pacific_day_follows_daylight_saving():
+    summer = datetime.datetime(2026, 7, 1, 6, 59, tzinfo=UTC).timestamp() # 23:59 PDT (UTC-7)
+    assert [quota_day(summer), quota_day(summer + 60)] == ['2026-06-30', '2026-07-01']
+
+
+def test_a_403_opens_the_breaker_for_every_worker_until_the_cooldown(ledger, clock, monkeypatch):
+    other_worker = QuotaLedger(path=ledger.path, daily_budget=ledger.daily_budget, cooldown=600)
+    monkeypatch.setattr(app_module, 'quota_ledger', ledger)
+    app_module.note_youtube_error(FakeYouTube(error_status=500)._error()) # Other errors leave it closed
+    assert not ledger.is_open()
+
+    app_module.note_youtube_error(FakeYouTube(error_status=403)._error())
+    assert other_worker.is_open() and not other_worker.try_spend()
+    assert other_worker.status()['breaker_retry_in'] == 600
+    assert ledger.remaining() == 3 * YOUTUBE_SEARCH_COST # Refusals spend nothing
+
+    clock[0] += 601
+    assert not other_worker.is_open() and other_worker.try_spend()
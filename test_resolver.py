@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from googleapiclient.errors import HttpError
+from bench_fakes import FakeYouTube
+from resolver import resolve_tracks, resolve_tracks_async
+
+
+def make_tracks(n):
+    return [{'id': f'trk{i}', 'name': f'Song {i}', 'artist': f'Artist {i}'} for i in range(n)]
+
+def query(track):
+    return f"{track['artist']} - {track['name']}"
+
+def video_from(response):
+    items = response['items']
+    return ({'id': items[0]['id']['videoId'], 'title': items[0]['snippet']['title']} if items else None), False
+
+def is_quota_error(e):
+    return isinstance(e, HttpError) and e.resp.status == 403
+
+
+def run_resolver(mode, youtube, tracks, **kwargs):
+    """Runs the sync or async resolver against a FakeYouTube with the same arguments."""
+    if mode == 'sync':
+        return resolve_tracks(tracks, lambda track: video_from(youtube.execute_search(query(track))), log=lambda message: None, **kwargs)
+
+    async def resolve(track):
+        return video_from(await asyncio.to_thread(youtube.execute_search, query(track)))
+    if 'max_workers' in kwargs: kwargs['max_concurrency'] = kwargs.pop('max_workers')
+    return asyncio.run(resolve_tracks_async(tracks, resolve, log=lambda message: None, **kwargs))
+
+
+@pytest.mark.parametrize('mode', ['sync', 'async'])
+def test_hits_are_released_in_candidate_order(mode):
+    youtube = FakeYouTube(latency=0.01, jitter=0.01, seed=3) # Searches finish out of order
+    tracks = make_tracks(12)
+    released = []
+    result = run_resolver(mode, youtube, tracks, max_workers=4, on_hit=lambda track, video: released.append(track['id']))
+    assert [track['id'] for track, _ in result.hits] == [track['id'] for track in tracks]
+    assert released == [track['id'] for track in tracks]
+    assert result.attempts == 12 and not result.stopped
+
+
+@pytest.mark.parametrize('mode', ['sync', 'async'])
+def test_not_found_falls_through_to_spare_candidates(mode):
+    youtube = FakeYouTube(latency=0.005, jitter=0.005, not_found_rate=0.5)
+    tracks = make_tracks(30)
+    found = [track['id'] for track in tracks if youtube.search_result(query(track))['items']]
+    assert 5 <= len(found) < len(tracks) # Some candidates miss, enough remain
+    result = run_resolver(mode, youtube, tracks, target=5, max_workers=3)
+    assert [track['id'] for track, _ in result.hits] == found[:5]
+    assert result.attempts < len(tracks) # Stopped searching once the target was reachable
+
+
+@pytest.mark.parametrize('mode', ['sync', 'async'])
+def test_quota_403_stops_the_batch(mode):
+    youtube = FakeYouTube(latency=0.005, error_rate=1.0, error_status=403)
+    result = run_resolver(mode, youtube, make_tracks(20), target=10, max_workers=2, stop_on=is_quota_error)
+    assert result.stopped
+    assert result.hits == []
+    assert result.attempts == 2 # Only the searches already in flight, none started after the 403
+
+
+@pytest.mark.parametrize('mode', ['sync', 'async'])
+def test_other_errors_fall_through(mode):
+    youtube = FakeYouTube(latency=0.0, error_rate=1.0, error_status=500)
+    result = run_resolver(mode, youtube, make_tracks(4), max_workers=2, stop_on=is_quota_error)
+    assert not result.stopped and result.hits == [] and result.attempts == 4
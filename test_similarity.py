@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from similarity import SimilarityIndex
+
+
+def make_features(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    features = {'energy': rng.random(n), 'valence': rng.random(n), 'tempo': 60 + 120 * rng.random(n)}
+    features['energy'][::10] = np.nan # Incomplete rows
+    return features
+
+def brute_force(index, seeds, rows, k):
+    seeds = index.usable_seeds(seeds)
+    rows = np.asarray([row for row in rows if index.complete[row]])
+    dist = ((index.matrix[rows][:, None, :].astype(np.float64) - seeds[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+    return rows[np.lexsort((rows, dist))][:k]
+
+
+@pytest.mark.parametrize('block_size', [7, 65536], ids=['many-blocks', 'one-block'])
+def test_top_k_is_nearest_first_across_blocks(block_size):
+    index = SimilarityIndex(make_features(), block_size=block_size)
+    seeds = index.matrix[[1, 2, 3]]
+    rows = np.arange(0, 500, 2)
+    result = index.top_k(seeds, rows, 15)
+    np.testing.assert_array_equal(result, brute_force(index, seeds, rows, 15))
+    assert result[0] == 2 # A seed's own row is at distance zero
+
+
+def test_incomplete_rows_and_seeds_are_skipped():
+    index = SimilarityIndex(make_features())
+    assert not index.complete[::10].any() and index.complete[1:10].all()
+    seeds = index.matrix[[10, 1]] # The first seed misses a feature and is ignored
+    result = index.top_k(seeds, np.arange(500), 500)
+    assert len(result) == 450 and not np.isin(result, np.arange(0, 500, 10)).any()
+    assert result[0] == 1
+    assert len(index.top_k(index.matrix[[10]], np.arange(500), 5)) == 0 # No usable seed
+
+
+def test_excluded_rows_and_empty_feature_columns():
+    features = make_features(100)
+    features['danceability'] = np.full(100, np.nan) # No catalog data: ignored rather than making every row incomplete
+    index = SimilarityIndex(features)
+    assert index.complete.sum() == 90
+    result = index.top_k(index.matrix[[1]], np.arange(100), 5, exclude_rows=[1, 2])
+    assert len(result) == 5 and not np.isin(result, [1, 2]).any()
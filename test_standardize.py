@@ -0,0 +1,22 @@
+from standardize import canonical_key, canonical_keys
+
+
+def test_versions_and_features_are_the_same_song():
+    keys = canonical_keys(
+        ['The Beatles', 'The Beatles', 'Beyoncé feat. JAY-Z', 'Beyonce, Jay-Z', 'Daft Punk & Pharrell Williams'],
+        ['Let It Be', 'Let It Be - Remastered 2009', 'Crazy In Love (feat. Jay-Z)', 'Crazy in Love feat. Jay-Z', 'Get Lucky [Radio Edit]'])
+    assert keys.tolist() == ['the beatles|let it be', 'the beatles|let it be', 'beyonce|crazy in love',
+                             'beyonce|crazy in love', 'daft punk|get lucky']
+
+
+def test_accents_and_punctuation_are_dropped():
+    assert canonical_key('Sigur Rós', 'Hoppípolla') == 'sigur ros|hoppipolla'
+    assert canonical_key('AC/DC', 'Back In Black') == 'ac dc|back in black'
+    assert canonical_key("Guns N' Roses", "Sweet Child O' Mine!") == 'guns n roses|sweet child o mine'
+    assert canonical_key('  Queen ', 'Bohemian   Rhapsody') == 'queen|bohemian rhapsody'
+    assert canonical_key('Кино', 'Группа крови') == 'кино|группа крови' # Other scripts are kept
+
+
+def test_titles_that_are_only_a_suffix_keep_their_plain_form():
+    assert canonical_key('Artist', '(Intro)') == 'artist|intro'
+    assert canonical_key(None, 'Song') == '|song'
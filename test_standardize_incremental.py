@@ -0,0 +1,96 @@
+import os
+import pandas as pd
+import pytest
+from columnar import read_columnar
+from standardize import MANIFEST_SUFFIX, standardize_data_incremental, standardize_data_streaming
+
+
+def write_source(path, rows):
+    pd.DataFrame(rows, columns=['track_id', 'track_name', 'artist_name', 'year', 'Mood', 'genre', 'energy']).to_csv(path, index=False)
+
+def source_rows():
+    return [[f'trk{i}', f'Song {i}', f'Artist {i % 7}', 1990 + i % 30, ['Happy', 'Sad', 'Calm'][i % 3], 'pop', i / 50] for i in range(50)]
+
+
+def run(tmp_path, output_format, source):
+    """One incremental run; returns (its output as a DataFrame, the manifest path)."""
+    output = str(tmp_path / 'out.csv'); columnar = str(tmp_path / 'out.bin')
+    standardize_data_incremental(source, output, output_format=output_format, columnar_path=columnar, chunksize=16)
+    if output_format == 'csv': return pd.read_csv(output, dtype={'track_id': str}), output + MANIFEST_SUFFIX
+    return read_columnar(columnar), columnar + MANIFEST_SUFFIX
+
+def full_rebuild(tmp_path, output_format, source):
+    """The same source standardized from scratch, for comparison."""
+    output = str(tmp_path / 'full.csv'); columnar = str(tmp_path / 'full.bin')
+    standardize_data_streaming(source, output, output_format=output_format, columnar_path=columnar)
+    return pd.read_csv(output, dtype={'track_id': str}) if output_format == 'csv' else read_columnar(columnar)
+
+def by_id(df):
+    return df.sort_values('track_id').reset_index(drop=True)
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'columnar'])
+def test_incremental_runs_track_edits_and_deletes(tmp_path, capsys, output_format):
+    source = str(tmp_path / 'source.csv')
+    rows = source_rows()
+    write_source(source, rows)
+    first, manifest_path = run(tmp_path, output_format, source)
+    assert os.path.exists(manifest_path) and len(first) == 50
+
+    # No change: nothing is re-standardized and the output stays the same
+    capsys.readouterr()
+    unchanged, _ = run(tmp_path, output_format, source)
+    assert "0 new or changed, 0 removed" in capsys.readouterr().out
+    pd.testing.assert_frame_equal(by_id(unchanged), by_id(first))
+
+    # One edited row replaces its old version
+    rows[10][1] = 'Song 10 (Edited)'
+    write_source(source, rows)
+    capsys.readouterr()
+    edited, _ = run(tmp_path, output_format, source)
+    assert "1 new or changed, 0 removed" in capsys.readouterr().out
+    assert edited.loc[edited['track_id'] == 'trk10', 'track_name'].tolist() == ['Song 10 (Edited)']
+    pd.testing.assert_frame_equal(by_id(edited), by_id(full_rebuild(tmp_path, output_format, source)), check_dtype=False)
+
+    # One deleted row disappears, the edit from the previous run is kept
+    del rows[20]
+    write_source(source, rows)
+    capsys.readouterr()
+    deleted, _ = run(tmp_path, output_format, source)
+    assert "0 new or changed, 1 removed" in capsys.readouterr().out
+    assert 'trk20' not in set(deleted['track_id']) and len(deleted) == 49
+    assert deleted.loc[deleted['track_id'] == 'trk10', 'track_name'].tolist() == ['Song 10 (Edited)']
+    pd.testing.assert_frame_equal(by_id(deleted), by_id(full_rebuild(tmp_path, output_format, source)), check_dtype=False)
+
+
+def test_columnar_runs_ignore_a_stale_csv(tmp_path):
+    source = str(tmp_path / 'source.csv')
+    rows = source_rows()
+    write_source(source, rows)
+    run(tmp_path, 'csv', source) # Leaves out.csv and its manifest behind
+    rows[5][1] = 'Song 5 (Edited)'
+    write_source(source, rows)
+    run(tmp_path, 'columnar', source)
+    rows[6][1] = 'Song 6 (Edited)'
+    write_source(source, rows)
+    latest, _ = run(tmp_path, 'columnar', source)
+    # The earlier edit lives only in out.bin; merging into the stale out.csv would undo it
+    assert latest.loc[latest['track_id'] == 'trk5', 'track_name'].tolist() == ['Song 5 (Edited)']
+    assert latest.loc[latest['track_id'] == 'trk6', 'track_name'].tolist() == ['Song 6 (Edited)']
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'columnar'])
+def test_streaming_keeps_the_last_row_of_repeated_ids_like_incremental(tmp_path, output_format):
+    source = str(tmp_path / 'source.csv')
+    rows = source_rows()
+    rows += [['trk3', 'Song 3 (Later)', 'Artist 3', 2001, 'Calm', 'pop', 0.5], # Repeats in a later chunk
+             ['trk40', 'Song 40', 'Artist 5', 2002, None, 'pop', 0.1]] # Last row of trk40 is dropped by cleaning
+    write_source(source, rows)
+    output = str(tmp_path / 'streamed.csv'); columnar = str(tmp_path / 'streamed.bin')
+    standardize_data_streaming(source, output, output_format=output_format, columnar_path=columnar, chunksize=16)
+    streamed = pd.read_csv(output, dtype={'track_id': str}) if output_format == 'csv' else read_columnar(columnar)
+
+    assert streamed['track_id'].is_unique and len(streamed) == 49
+    assert streamed.loc[streamed['track_id'] == 'trk3', 'track_name'].tolist() == ['Song 3 (Later)']
+    incremental, _ = run(tmp_path, output_format, source)
+    pd.testing.assert_frame_equal(by_id(streamed), by_id(incremental), check_dtype=False)
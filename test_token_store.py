@@ -0,0 +1,54 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from token_store import MemoryTokenStore, SQLiteTokenStore, TokenManager
+
+
+def expired_token():
+    return {'access_token': 'old', 'refresh_token': 'refresh-1', 'expires_at': int(time.time()) - 10}
+
+
+@pytest.fixture
+def stores(tmp_path):
+    """Two workers' token stores over the same SQLite file."""
+    path = str(tmp_path / 'tokens.sqlite3')
+    return SQLiteTokenStore(path), SQLiteTokenStore(path)
+
+
+def test_refresh_lease_is_held_by_one_worker(stores):
+    first, second = stores
+    first.set('user-1', expired_token())
+    assert first.try_lease('user-1', seconds=30)
+    assert not second.try_lease('user-1', seconds=30) # Held by the first worker
+    first.set('user-1', {'access_token': 'new', 'expires_at': int(time.time()) + 3600}) # Saving the new token releases it
+    assert second.try_lease('user-1', seconds=0)
+    assert first.try_lease('user-1', seconds=30) # A lease that ran out can be taken over
+    assert not first.try_lease('nobody') # Nothing to refresh
+
+
+def test_concurrent_requests_refresh_once_across_workers(stores):
+    stores[0].set('user-1', expired_token())
+    calls = []; lock = threading.Lock()
+
+    def refresh(refresh_token):
+        with lock: calls.append(refresh_token)
+        time.sleep(0.3) # Slow token endpoint: everyone else arrives meanwhile
+        return {'access_token': 'new', 'expires_at': int(time.time()) + 3600}
+    managers = [TokenManager(store, refresh, lease_seconds=5) for store in stores]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        tokens = list(pool.map(lambda i: managers[i % 2].get('user-1'), range(8)))
+    assert calls == ['refresh-1']
+    assert [token['access_token'] for token in tokens] == ['new'] * 8
+    assert stores[1].get('user-1')['refresh_token'] == 'refresh-1' # Kept when the response has none
+
+
+@pytest.mark.parametrize('kind', ['memory', 'sqlite'])
+def test_failed_refresh_logs_the_user_out(tmp_path, kind):
+    store = MemoryTokenStore() if kind == 'memory' else SQLiteTokenStore(str(tmp_path / 'tokens.sqlite3'))
+    store.set('user-1', expired_token())
+
+    def refresh(refresh_token): raise RuntimeError("invalid_grant")
+    assert TokenManager(store, refresh).get('user-1') is None
+    assert store.get('user-1') is None
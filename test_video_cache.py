@@ -0,0 +1,76 @@
+import sqlite3
+from types import SimpleNamespace
+import pytest
+import app as app_module
+import video_cache
+from video_cache import MISS, VideoCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable time.time() for the cache module."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(video_cache, 'time', SimpleNamespace(time=lambda: now[0]))
+    return now
+
+def make_cache(tmp_path, **kwargs):
+    return VideoCache(path=str(tmp_path / 'youtube.sqlite3'), ttl=1000, negative_ttl=100, **kwargs)
+
+def last_access(cache, track_id):
+    return sqlite3.connect(cache.path).execute('SELECT last_access FROM videos WHERE track_id = ?', (track_id,)).fetchone()[0]
+
+
+def test_get_put_and_expiry(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    assert cache.get('song:a|one') is MISS
+    cache.put('song:a|one', {'id': 'v1', 'title': 'One'})
+    cache.put('song:b|two', None)
+    assert cache.get('song:a|one') == {'id': 'v1', 'title': 'One'}
+    assert cache.get('song:b|two') is None # Cached as not found
+
+    clock[0] += 101 # Negative entries expire first
+    assert cache.get('song:b|two') is MISS and cache.get('song:a|one') is not MISS
+    clock[0] += 1000
+    assert cache.get('song:a|one') is MISS
+
+
+def test_hits_touch_at_most_once_per_interval_and_in_batches(tmp_path, clock):
+    cache = make_cache(tmp_path, touch_interval=60)
+    cache.put('song:a|one', {'id': 'v1', 'title': 'One'})
+    put_at = clock[0]
+
+    clock[0] += 10
+    cache.get('song:a|one') # Touched too recently to count
+    assert not cache._touches
+    clock[0] += 60
+    for _ in range(5): cache.get('song:a|one')
+    assert cache._touches == {'song:a|one': put_at + 70} # One buffered touch, nothing written yet
+    assert last_access(cache, 'song:a|one') == put_at
+
+    cache.put('song:b|two', None) # Writes flush the buffer
+    assert not cache._touches and last_access(cache, 'song:a|one') == put_at + 70
+
+
+def test_eviction_keeps_recently_hit_entries(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=3, touch_interval=0)
+    for i in range(4):
+        cache.put(f'song:{i}', {'id': f'v{i}', 'title': str(i)})
+        clock[0] += 1
+    cache.get('song:0') # Buffered only; eviction must still see it
+    cache.evict()
+    assert cache.get('song:0') is not MISS
+    assert cache.get('song:1') is MISS # The least recently used one went
+    assert [cache.get(f'song:{i}') is not MISS for i in (2, 3)] == [True, True]
+
+
+def test_existing_cache_files_and_track_id_entries_still_serve(tmp_path, clock, monkeypatch):
+    legacy = make_cache(tmp_path)
+    legacy.put('trk1', {'id': 'v1', 'title': 'One'}) # Cached per track id, before songs were keyed
+    reopened = make_cache(tmp_path) # A restarted worker reuses the file as is
+    monkeypatch.setattr(app_module, 'video_cache', reopened)
+
+    track = {'id': 'trk1', 'name': 'One', 'artist': 'A', 'canonical_key': 'a|one'}
+    assert app_module.lookup_track_video(track) == ({'id': 'v1', 'title': 'One'}, True)
+    reopened.put(app_module.video_cache_key(track), {'id': 'v2', 'title': 'One (song)'})
+    assert app_module.lookup_track_video(track) == ({'id': 'v2', 'title': 'One (song)'}, True) # Song entries win
+    assert app_module.lookup_track_video({'id': 'trk9', 'name': 'Nine', 'artist': 'B'}) is None
@@ -0,0 +1,54 @@
+import random
+import pandas as pd
+import pytest
+from catalog import TrackCatalog
+from quota import YOUTUBE_SEARCH_COST
+from warm_pool import WarmPool
+
+
+class OpenLedger:
+    """Quota ledger with plenty left and the breaker closed."""
+    def remaining(self): return 10**6
+    def is_open(self): return False
+
+
+def make_catalog(n=200):
+    return TrackCatalog.from_dataframe(pd.DataFrame({
+        'track_id': [f'trk{i}' for i in range(n)], 'track_name': [f'Song {i}' for i in range(n)],
+        'artist_name': [f'Artist {i}' for i in range(n)], 'Mood': 'Happy', 'year': 2000.0,
+        'canonical_key': [f'artist {i}|song {i}' for i in range(n)],
+    }))
+
+
+@pytest.fixture
+def pool(tmp_path):
+    return WarmPool(path=str(tmp_path / 'pool.sqlite3'), pool_size=20, quota_reserve=0, max_share=0.5)
+
+
+def searched(track):
+    return {'id': f"vid-{track['id']}", 'title': track['name']}, False
+
+
+def test_draws_use_up_entries_and_refills_rotate_the_pool(pool):
+    catalog = make_catalog(); rng = random.Random(1)
+    assert pool.refill(catalog, ['Happy'], searched, OpenLedger(), rng=rng) == 20
+    rows = catalog.mood_rows('happy')
+    before = set(pool.entries('happy'))
+
+    first = pool.draw('Happy', 10, catalog, rows, rng=rng)
+    second = pool.draw('Happy', 10, catalog, rows, rng=rng)
+    assert len(first) == len(second) == 5 # Capped at max_share of the catalog share
+    assert all(t['video']['id'] == f"vid-{t['id']}" for t in first + second)
+    assert not {t['id'] for t in first} & {t['id'] for t in second} # Drawn entries are gone
+    assert len(pool.entries('happy')) == 10
+
+    pool.refill(catalog, ['Happy'], searched, OpenLedger(), rng=rng)
+    after = set(pool.entries('happy'))
+    assert len(after) == 20 and after != before # Topped up with other catalog tracks
+
+
+def test_refused_searches_are_not_charged(pool):
+    catalog = make_catalog()
+    outcomes = iter([(None, None)] * 5 + [({'id': 'v', 'title': 't'}, False)] + [({'id': 'w', 'title': 't'}, True)] * 100)
+    pool.refill(catalog, ['Happy'], lambda track: next(outcomes), OpenLedger(), rng=random.Random(0))
+    assert pool.spent_today() == YOUTUBE_SEARCH_COST # One real search; refusals and cache hits are free
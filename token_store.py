@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import weakref
+
+# --- Configuration ---
+TOKEN_STORE = os.getenv("TOKEN_STORE", "sqlite") # 'sqlite' (shared by all workers) or 'memory' (single process)
+TOKEN_STORE_PATH = os.getenv("TOKEN_STORE_PATH", "spotify_tokens.sqlite3")
+TOKEN_MAX_AGE = int(os.getenv("TOKEN_MAX_AGE", str(30 * 24 * 3600))) # Tokens untouched this long are pruned
+TOKEN_REFRESH_MARGIN = 60 # Refresh tokens that expire within this many seconds
+TOKEN_REFRESH_LEASE = 15 # Seconds one worker may hold a refresh before others may take over
+PRUNE_EVERY = 200 # Prune stale tokens every N writes
+
+
+def token_expired(token_info, margin=TOKEN_REFRESH_MARGIN):
+    return token_info.get('expires_at', 0) - int(time.time()) < margin
+
+
+class MemoryTokenStore:
+    """Session uuid -> Spotify token_info, held in this process only."""
+
+    def __init__(self, max_age=TOKEN_MAX_AGE):
+        self.max_age = max_age
+        self._tokens = {} # key -> (token_info, updated_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._tokens.get(key)
+        return dict(entry[0]) if entry else None
+
+    def set(self, key, token_info):
+        now = time.time()
+        with self._lock:
+            self._tokens[key] = (dict(token_info), now)
+            for stale in [k for k, (_, updated_at) in self._tokens.items() if updated_at < now - self.max_age]:
+                del self._tokens[stale]
+
+    def delete(self, key):
+        with self._lock: self._tokens.pop(key, None)
+
+    def try_lease(self, key, seconds=TOKEN_REFRESH_LEASE):
+        return True # The per-key lock in TokenManager already serializes refreshes within the process
+
+
+class SQLiteTokenStore:
+    """
+    Session uuid -> Spotify token_info in a SQLite file shared by every worker.
+    A refresh lease column lets one worker refresh a token while the others
+    wait for its result instead of refreshing it again.
+    """
+
+    def __init__(self, path=TOKEN_STORE_PATH, max_age=TOKEN_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._local = threading.local()
+        self._writes = 0
+        self._connect().execute('''CREATE TABLE IF NOT EXISTS spotify_tokens (
+                                       session_id TEXT PRIMARY KEY,
+                                       token_info TEXT NOT NULL,
+                                       updated_at REAL NOT NULL,
+                                       lease_until REAL NOT NULL DEFAULT 0)''')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._connect().execute('SELECT token_info FROM spotify_tokens WHERE session_id = ?', (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Warning: Token store read failed. Error: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, token_info):
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute('INSERT OR REPLACE INTO spotify_tokens (session_id, token_info, updated_at, lease_until) VALUES (?, ?, ?, 0)',
+                         (key, json.dumps(token_info), now))
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM spotify_tokens WHERE updated_at < ?', (now - self.max_age,))
+        except sqlite3.Error as e:
+            print(f"Warning: Token store write failed. Error: {e}")
+
+    def delete(self, key):
+        try: self._connect().execute('DELETE FROM spotify_tokens WHERE session_id = ?', (key,))
+        except sqlite3.Error as e: print(f"Warning: Token store delete failed. Error: {e}")
+
+    def try_lease(self, key, seconds=TOKEN_REFRESH_LEASE):
+        """Claims the right to refresh key's token. False if another worker holds an unexpired lease."""
+        now = time.time()
+        try:
+            cursor = self._connect().execute('UPDATE spotify_tokens SET lease_until = ? WHERE session_id = ? AND lease_until < ?',
+                                             (now + seconds, key, now))
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            print(f"Warning: Token refresh lease unavailable, refreshing anyway. Error: {e}")
+            return True
+
+
+class TokenManager:
+    """
+    Hands out valid tokens for a session uuid, refreshing expired ones at most
+    once at a time per user: concurrent requests in this process wait on a
+    per-key lock, and other workers wait for the store's refresh lease.
+    """
+
+    def __init__(self, store, refresh_fn, lease_seconds=TOKEN_REFRESH_LEASE):
+        self.store = store
+        self.refresh_fn = refresh_fn # refresh_token -> new token_info
+        self.lease_seconds = lease_seconds
+        self._locks = weakref.WeakValueDictionary() # key -> Lock, dropped once no request holds it
+        self._locks_guard = threading.Lock()
+        self.refresh_calls = 0
+
+    def _lock_for(self, key):
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks[key] = lock
+            return lock
+
+    def save(self, key, token_info):
+        self.store.set(key, token_info)
+
+    def forget(self, key):
+        self.store.delete(key)
+
+    def get(self, key):
+        """Returns a non-expired token_info for key, or None if the user has to log in again."""
+        if not key: return None
+        token_info = self.store.get(key)
+        if not token_info or not token_expired(token_info): return token_info
+
+        with self._lock_for(key):
+            deadline = time.time() + 2 * self.lease_seconds
+            while True:
+                token_info = self.store.get(key) # Another request or worker may have refreshed it meanwhile
+                if not token_info or not token_expired(token_info): return token_info
+                if self.store.try_lease(key, self.lease_seconds): return self._refresh(key, token_info)
+                if time.time() > deadline: return None
+                time.sleep(0.1) # Another worker holds the lease; wait for its result
+
+    def _refresh(self, key, token_info):
+        """Refreshes while holding the lease. The new token (or the deletion) releases the lease."""
+        refresh_token = token_info.get('refresh_token')
+        if not refresh_token:
+            print("No refresh token found. User needs to re-authenticate.")
+            self.store.delete(key)
+            return None
+        try:
+            self.refresh_calls += 1
+            new_token = self.refresh_fn(refresh_token)
+        except Exception as e:
+            print(f"Error refreshing token: {e}. User needs to re-authenticate.")
+            self.store.delete(key)
+            return None
+        new_token.setdefault('refresh_token', refresh_token)
+        self.store.set(key, new_token)
+        print("Spotify token refreshed.")
+        return new_token
+
+
+def create_token_store(kind=TOKEN_STORE):
+    if kind == 'memory': return MemoryTokenStore()
+    if kind == 'sqlite': return SQLiteTokenStore()
+    raise ValueError(f"Unknown TOKEN_STORE '{kind}' (expected 'memory' or 'sqlite').")
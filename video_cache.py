@@ -0,0 +1,131 @@
+import os
+import time
+import sqlite3
+import threading
+
+# --- Configuration ---
+YOUTUBE_CACHE_PATH = os.getenv("YOUTUBE_CACHE_PATH", "youtube_cache.sqlite3")
+YOUTUBE_CACHE_TTL = int(os.getenv("YOUTUBE_CACHE_TTL", str(30 * 24 * 3600))) # Found videos: 30 days
+YOUTUBE_CACHE_NEGATIVE_TTL = int(os.getenv("YOUTUBE_CACHE_NEGATIVE_TTL", str(24 * 3600))) # "Not found": 1 day
+YOUTUBE_CACHE_MAX_ENTRIES = int(os.getenv("YOUTUBE_CACHE_MAX_ENTRIES", "200000"))
+YOUTUBE_CACHE_TOUCH_INTERVAL = int(os.getenv("YOUTUBE_CACHE_TOUCH_INTERVAL", "600")) # Refresh an entry's last_access at most this often
+EVICTION_CHECK_EVERY = 200 # Run the LRU eviction every N writes
+TOUCH_FLUSH_EVERY = 100 # Write buffered last_access touches once this many are pending
+
+# Returned by VideoCache.get when nothing usable is stored (None means "cached as not found")
+MISS = object()
+
+
+class VideoCache:
+    """
+    Durable track key -> YouTube video cache shared by all worker processes.
+    app.py keys entries by song ('song:<canonical_key>'), older entries by track_id.
+
+    Backed by a SQLite file in WAL mode. Entries expire after a TTL (shorter for
+    "not found" results) and the least recently used entries are evicted once
+    the table grows past max_entries.
+
+    Hits don't write: last_access is refreshed at most once per touch_interval per
+    entry, and those touches are buffered and written in one batch on put, eviction
+    or once TOUCH_FLUSH_EVERY of them are pending.
+    """
+
+    def __init__(self, path=YOUTUBE_CACHE_PATH, ttl=YOUTUBE_CACHE_TTL,
+                 negative_ttl=YOUTUBE_CACHE_NEGATIVE_TTL, max_entries=YOUTUBE_CACHE_MAX_ENTRIES,
+                 touch_interval=YOUTUBE_CACHE_TOUCH_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+        self._lock = threading.Lock() # Guards _writes and _touches, shared by all request threads
+        self._writes = 0
+        self._touches = {} # track_id -> last_access waiting to be written
+        self._init_schema()
+
+    def _connect(self):
+        """One connection per thread; SQLite connections must not be shared across threads."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute('''CREATE TABLE IF NOT EXISTS videos (
+                            track_id TEXT PRIMARY KEY,
+                            video_id TEXT,
+                            title TEXT,
+                            expires_at REAL NOT NULL,
+                            last_access REAL NOT NULL)''')
+        conn.execute('CREATE INDEX IF NOT EXISTS videos_last_access ON videos(last_access)')
+
+    def get(self, track_id):
+        """Returns {'id', 'title'}, None for a cached miss, or MISS if nothing valid is stored."""
+        if not track_id: return MISS
+        try:
+            conn = self._connect()
+            row = conn.execute('SELECT video_id, title, expires_at, last_access FROM videos WHERE track_id = ?', (track_id,)).fetchone()
+            now = time.time()
+            if row is None or row[2] < now: return MISS
+            if now - row[3] >= self.touch_interval: self._touch(track_id, now)
+            if row[0] is None: return None
+            return {'id': row[0], 'title': row[1]}
+        except sqlite3.Error as e:
+            print(f"Warning: YouTube cache read failed for '{track_id}'. Error: {e}")
+            return MISS
+
+    def put(self, track_id, video_info):
+        """Stores a resolved video, or a negative entry when video_info is None."""
+        if not track_id: return
+        now = time.time()
+        ttl = self.ttl if video_info else self.negative_ttl
+        video_id = video_info['id'] if video_info else None
+        title = video_info['title'] if video_info else None
+        with self._lock:
+            self._touches.pop(track_id, None) # The new row carries a fresh last_access
+            self._writes += 1
+            evict_due = self._writes % EVICTION_CHECK_EVERY == 0
+        try:
+            self._connect().execute('INSERT OR REPLACE INTO videos (track_id, video_id, title, expires_at, last_access) VALUES (?, ?, ?, ?, ?)',
+                                    (track_id, video_id, title, now + ttl, now))
+            if evict_due: self.evict()
+            else: self.flush_touches()
+        except sqlite3.Error as e:
+            print(f"Warning: YouTube cache write failed for '{track_id}'. Error: {e}")
+
+    def _touch(self, track_id, now):
+        """Buffers a last_access refresh; writes the batch once enough are pending."""
+        with self._lock:
+            self._touches[track_id] = now
+            flush_due = len(self._touches) >= TOUCH_FLUSH_EVERY
+        if flush_due: self.flush_touches()
+
+    def flush_touches(self):
+        """Writes the buffered last_access refreshes in one transaction."""
+        with self._lock:
+            touches, self._touches = self._touches, {}
+        if not touches: return
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN')
+            conn.executemany('UPDATE videos SET last_access = MAX(last_access, ?) WHERE track_id = ?',
+                             [(at, track_id) for track_id, at in touches.items()])
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            if conn.in_transaction: conn.execute('ROLLBACK')
+            print(f"Warning: YouTube cache could not record {len(touches)} cache hits. Error: {e}")
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones above max_entries."""
+        self.flush_touches() # Recent hits must count before picking what to evict
+        conn = self._connect()
+        conn.execute('DELETE FROM videos WHERE expires_at < ?', (time.time(),))
+        excess = conn.execute('SELECT COUNT(*) FROM videos').fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute('DELETE FROM videos WHERE track_id IN (SELECT track_id FROM videos ORDER BY last_access LIMIT ?)', (excess,))
+            print(f"YouTube cache: evicted {excess} least recently used entries.")
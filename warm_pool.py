@@ -0,0 +1,199 @@
+import os
+import math
+import time
+import random
+import sqlite3
+import datetime
+import threading
+import numpy as np # Import numpy for row filtering
+from video_cache import YOUTUBE_CACHE_PATH, YOUTUBE_CACHE_TTL
+from quota import QUOTA_TIMEZONE, YOUTUBE_SEARCH_COST, quota_day
+
+# --- Configuration ---
+WARM_POOL_ENABLED = os.getenv("WARM_POOL_ENABLED", "1") == "1"
+WARM_POOL_PATH = os.getenv("WARM_POOL_PATH", YOUTUBE_CACHE_PATH) # Shared SQLite file (same as the video cache by default)
+WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", "300")) # Pre-resolved tracks kept per mood
+WARM_POOL_MAX_SHARE = float(os.getenv("WARM_POOL_MAX_SHARE", "0.5")) # Most of a mix's catalog share drawn from the pool; the rest is sampled
+WARM_POOL_DAILY_BUDGET = int(os.getenv("WARM_POOL_DAILY_BUDGET", "3000")) # Quota units the refiller may spend per day
+WARM_POOL_QUOTA_RESERVE = int(os.getenv("WARM_POOL_QUOTA_RESERVE", "2000")) # Units always left for live requests
+WARM_POOL_HOURS = os.getenv("WARM_POOL_HOURS", "1-7") # Off-peak refill window, Pacific hours [start, end); empty = always
+WARM_POOL_INTERVAL = int(os.getenv("WARM_POOL_INTERVAL", "300")) # Seconds between refill passes
+WARM_POOL_TTL = YOUTUBE_CACHE_TTL # Entries expire with the cached video they point to
+WARM_POOL_LEASE = 600 # Seconds one worker may hold the refill lease
+
+
+def in_refill_window(hours=WARM_POOL_HOURS, now=None):
+    """True if the current Pacific hour lies in the 'start-end' window (wrapping past midnight allowed)."""
+    if not hours: return True
+    start, end = (int(part) for part in hours.split('-'))
+    hour = datetime.datetime.fromtimestamp(now or time.time(), QUOTA_TIMEZONE).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+class WarmPool:
+    """
+    Per-mood pools of catalog tracks whose YouTube videos are already resolved.
+
+    A background refiller (one worker at a time, via a lease row) tops every
+    mood up to pool_size during off-peak hours, spending at most its own daily
+    budget and never the reserve kept for live requests. /generate draws up to
+    max_share of its catalog share from the pool so those tracks need no live
+    search. Drawn entries leave the pool, so it keeps rotating through the
+    catalog instead of serving the same tracks until they expire.
+    """
+
+    def __init__(self, path=WARM_POOL_PATH, pool_size=WARM_POOL_SIZE, daily_budget=WARM_POOL_DAILY_BUDGET,
+                 quota_reserve=WARM_POOL_QUOTA_RESERVE, hours=WARM_POOL_HOURS, interval=WARM_POOL_INTERVAL, ttl=WARM_POOL_TTL,
+                 max_share=WARM_POOL_MAX_SHARE):
+        self.path = path
+        self.pool_size = pool_size
+        self.max_share = max_share
+        self.daily_budget = daily_budget
+        self.quota_reserve = quota_reserve
+        self.hours = hours
+        self.interval = interval
+        self.ttl = ttl
+        self._local = threading.local()
+        self._thread = None
+        self._stop = threading.Event()
+        self._owner = os.urandom(8).hex() # Identifies this process in the refill lease
+        conn = self._connect()
+        conn.execute('''CREATE TABLE IF NOT EXISTS warm_pool (
+                            mood TEXT NOT NULL,
+                            track_id TEXT NOT NULL,
+                            video_id TEXT NOT NULL,
+                            title TEXT,
+                            expires_at REAL NOT NULL,
+                            PRIMARY KEY (mood, track_id))''')
+        conn.execute('CREATE TABLE IF NOT EXISTS warm_pool_spend (day TEXT PRIMARY KEY, spent INTEGER NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS warm_pool_lease (id INTEGER PRIMARY KEY CHECK (id = 1), owner TEXT, lease_until REAL NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    # --- Drawing (request path) ---
+    def entries(self, mood):
+        """{track_id: {'id', 'title'}} of unexpired pool entries for a mood."""
+        try:
+            rows = self._connect().execute('SELECT track_id, video_id, title FROM warm_pool WHERE mood = ? AND expires_at > ?',
+                                           ((mood or '').strip().lower(), time.time())).fetchall()
+        except sqlite3.Error as e:
+            print(f"Warning: Warm pool unavailable. Error: {e}")
+            return {}
+        return {track_id: {'id': video_id, 'title': title} for track_id, video_id, title in rows}
+
+    def draw(self, mood, k, catalog, candidate_rows, rng=random):
+        """
+        Picks up to max_share of k random pooled tracks of mood that are still in
+        the catalog and within candidate_rows (the request's filters), one per song,
+        and removes them from the pool. Each returned track carries its resolved
+        'video', so resolution skips the API for it.
+        """
+        k = min(k, math.ceil(k * self.max_share))
+        pooled = self.entries(mood)
+        if not pooled or k <= 0: return []
+        track_ids = list(pooled)
+        rows = catalog.rows_for_ids(track_ids)
+        usable = (rows >= 0) & np.isin(rows, candidate_rows)
+        picks = np.flatnonzero(usable)
+        picks = picks[np.isin(rows[picks], catalog.distinct_rows(rows[picks]))].tolist()
+        picks = rng.sample(picks, min(k, len(picks)))
+        if picks: # Used up: the refiller replaces them with other tracks
+            try:
+                self._connect().executemany('DELETE FROM warm_pool WHERE mood = ? AND track_id = ?',
+                                            [((mood or '').strip().lower(), track_ids[i]) for i in picks])
+            except sqlite3.Error as e:
+                print(f"Warning: Could not remove drawn warm pool entries. Error: {e}")
+        return [dict(catalog.track_at(rows[i]), video=pooled[track_ids[i]]) for i in picks]
+
+    def sizes(self):
+        """Unexpired entries per mood, for logging and /quota."""
+        try:
+            return dict(self._connect().execute('SELECT mood, COUNT(*) FROM warm_pool WHERE expires_at > ? GROUP BY mood', (time.time(),)).fetchall())
+        except sqlite3.Error: return {}
+
+    # --- Refilling (background) ---
+    def _try_lease(self):
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute('INSERT OR IGNORE INTO warm_pool_lease (id, owner, lease_until) VALUES (1, NULL, 0)')
+            cursor = conn.execute('UPDATE warm_pool_lease SET owner = ?, lease_until = ? WHERE id = 1 AND (lease_until < ? OR owner = ?)',
+                                  (self._owner, now + WARM_POOL_LEASE, now, self._owner))
+            return cursor.rowcount > 0
+        except sqlite3.Error: return False
+
+    def _release_lease(self):
+        try: self._connect().execute('UPDATE warm_pool_lease SET lease_until = 0 WHERE id = 1 AND owner = ?', (self._owner,))
+        except sqlite3.Error: pass
+
+    def spent_today(self):
+        try: row = self._connect().execute('SELECT spent FROM warm_pool_spend WHERE day = ?', (quota_day(),)).fetchone()
+        except sqlite3.Error: row = None
+        return row[0] if row else 0
+
+    def _record_spend(self, units):
+        self._connect().execute('INSERT INTO warm_pool_spend (day, spent) VALUES (?, ?) ON CONFLICT(day) DO UPDATE SET spent = spent + ?',
+                                (quota_day(), units, units))
+
+    def _can_spend(self, quota_ledger):
+        if self.spent_today() + YOUTUBE_SEARCH_COST > self.daily_budget: return False
+        return quota_ledger.remaining() - YOUTUBE_SEARCH_COST >= self.quota_reserve and not quota_ledger.is_open()
+
+    def refill(self, catalog, moods, resolve_fn, quota_ledger, rng=random):
+        """
+        One refill pass. resolve_fn(track) -> (video_info or None, from_cache) is
+        the app's cached, quota-aware resolver; from_cache is None when it made no
+        search (quota refused). Returns the number of tracks added.
+        """
+        if catalog is None or len(catalog) == 0: return 0
+        self._connect().execute('DELETE FROM warm_pool WHERE expires_at <= ?', (time.time(),))
+        added = 0
+        for mood in moods:
+            key = mood.strip().lower()
+            pooled = self.entries(key)
+            rows = catalog.mood_rows(key)
+            # Oversample: some candidates are already pooled or have no video
+            for row in rng.sample(range(len(rows)), min(len(rows), 2 * max(0, self.pool_size - len(pooled)))):
+                if len(pooled) >= self.pool_size: break
+                track = catalog.track_at(rows[row])
+                if track['id'] in pooled: continue
+                if not self._can_spend(quota_ledger):
+                    print(f"Warm pool refill paused: budget or quota reserve reached ({self.spent_today()} units spent today).")
+                    return added
+                try: video_info, from_cache = resolve_fn(track)
+                except Exception as e:
+                    print(f"Warm pool refill stopped: {e}")
+                    return added
+                if from_cache is False: self._record_spend(YOUTUBE_SEARCH_COST) # Only searches actually made count against the budget
+                if not video_info: continue
+                self._connect().execute('INSERT OR REPLACE INTO warm_pool (mood, track_id, video_id, title, expires_at) VALUES (?, ?, ?, ?, ?)',
+                                        (key, track['id'], video_info['id'], video_info.get('title'), time.time() + self.ttl))
+                pooled[track['id']] = video_info; added += 1
+        return added
+
+    def start(self, get_catalog, moods, resolve_fn, quota_ledger):
+        """Starts the background refiller thread (once per process)."""
+        if self._thread is not None: return
+
+        def run():
+            while not self._stop.wait(self.interval):
+                if not in_refill_window(self.hours) or not self._try_lease(): continue
+                try:
+                    added = self.refill(get_catalog(), moods, resolve_fn, quota_ledger)
+                    if added: print(f"Warm pool refilled with {added} tracks. Sizes: {self.sizes()}")
+                except Exception as e:
+                    print(f"Warning: Warm pool refill failed. Error: {e}")
+                finally:
+                    self._release_lease()
+
+        self._thread = threading.Thread(target=run, name='warm-pool', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()